@@ -0,0 +1,160 @@
+"""Semester attendance analytics over a room's presence history.
+
+History is copied out as columns (student code, start, end) and every
+metric is computed with whole-array NumPy operations, so a semester of
+a full class costs a handful of array passes rather than a Python loop
+per interval. Needs NumPy.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import numpy as np
+
+DAY = 86400
+LATE_GRACE = 300  # seconds after a slot starts before an arrival counts as late
+
+class Columns:
+    """Intervals and rings of one room within a window, as parallel arrays"""
+
+    def __init__(self, usernames, codes, starts, ends, ring_codes, ring_answered):
+        self.usernames = usernames  # Sorted; codes index into it
+        self.codes = codes
+        self.starts = starts
+        self.ends = ends
+        self.ring_codes = ring_codes
+        self.ring_answered = ring_answered
+
+def copy_history(history, start, end, now):
+    """Copy the columns of a history overlapping [start, end).
+
+    Call with the room's lock held. This only slices arrays, so writers
+    wait as little as possible; columns() does the rest afterwards.
+    """
+    # Same end-ordered scan as PresenceHistory.present_between()
+    first = bisect_right(history.ends, start)
+    last = bisect_right(history.ends, end + history.longest)
+    # Presence still in progress counts up to now
+    open_codes = array('l', map(history.code, history.open))
+    ring_first = bisect_left(history.ring_times, start)
+    ring_last = bisect_left(history.ring_times, end)
+    return (
+        list(history.names),
+        history.student_codes[first:last] + open_codes,
+        history.starts[first:last] + array('d', history.open.values()),
+        history.ends[first:last] + array('d', [min(now, end)]) * len(open_codes),
+        history.ring_codes[ring_first:ring_last],
+        history.ring_answered[ring_first:ring_last]
+    )
+
+def columns(copy, start, end):
+    """Build Columns from copy_history() output, clipped to [start, end)"""
+    names, codes, starts, ends, ring_codes, ring_answered = copy
+    codes = np.frombuffer(codes, dtype=np.dtype('l'))
+    starts = np.frombuffer(starts, dtype=np.float64)
+    ends = np.frombuffer(ends, dtype=np.float64)
+    ring_codes = np.frombuffer(ring_codes, dtype=np.dtype('l'))
+
+    # Renumber the students seen in the window densely, in username order
+    seen = np.unique(np.concatenate([codes, ring_codes]))
+    usernames = [names[code] for code in seen.tolist()]
+    order = np.argsort(np.array(usernames, dtype=str), kind='stable')
+    renumber = np.zeros(len(names), dtype=np.int64)
+    renumber[seen[order]] = np.arange(len(seen))
+
+    keep = (starts < end) & (ends > start)
+    return Columns(
+        [usernames[index] for index in order.tolist()],
+        renumber[codes[keep]],
+        np.maximum(starts[keep], start),
+        np.minimum(ends[keep], end),
+        renumber[ring_codes],
+        np.frombuffer(ring_answered, dtype=np.int8).astype(bool)
+    )
+
+def parse_slots(text):
+    """Parse "09:00-09:50,10:00-10:50" into [(start second, end second)] of the day"""
+    slots = []
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        begin, _, finish = item.partition('-')
+        begin, finish = (datetime.strptime(value.strip(), '%H:%M') for value in (begin, finish))
+        begin = begin.hour * 3600 + begin.minute * 60
+        finish = finish.hour * 3600 + finish.minute * 60
+        if finish <= begin:
+            raise ValueError(f"Slot {item} ends before it starts")
+        slots.append((begin, finish))
+    return sorted(slots)
+
+def run_lengths(matrix):
+    """Longest and trailing run of True per row of a boolean matrix"""
+    rows, columns = matrix.shape
+    padded = np.zeros((rows, columns + 2), dtype=np.int8)
+    padded[:, 1:-1] = matrix
+    steps = np.diff(padded, axis=1)
+    # Row-major order pairs each run's start with its end
+    run_rows, run_starts = np.nonzero(steps == 1)
+    _, run_ends = np.nonzero(steps == -1)
+    lengths = run_ends - run_starts
+    longest = np.zeros(rows, dtype=np.int64)
+    np.maximum.at(longest, run_rows, lengths)
+    current = np.zeros(rows, dtype=np.int64)
+    trailing = run_ends == columns
+    current[run_rows[trailing]] = lengths[trailing]
+    return longest, current
+
+def analyze(columns, slots, utc_offset):
+    """Per-student metrics over the class days in columns.
+
+    A class day is a local calendar day on which anyone in the room was
+    present. Late arrivals and slot overlap need timetable slots and are
+    None without them.
+    """
+    students = len(columns.usernames)
+    codes, starts, ends = columns.codes, columns.starts, columns.ends
+
+    days = np.floor((starts + utc_offset) / DAY).astype(np.int64)
+    class_days = np.unique(days)
+    day_index = np.searchsorted(class_days, days)
+    attended = np.zeros((students, len(class_days)), dtype=bool)
+    attended[codes, day_index] = True
+    days_attended = attended.sum(axis=1)
+    longest, current = run_lengths(attended)
+    seconds = np.bincount(codes, weights=ends - starts, minlength=students)
+
+    late = overlap = None
+    if slots:
+        slot_begins = np.array([begin for begin, _ in slots], dtype=np.float64)
+        slot_ends = np.array([finish for _, finish in slots], dtype=np.float64)
+        # Slots of each interval's own day, one column per slot
+        midnight = (class_days * DAY - utc_offset)[day_index][:, None]
+        begins, finishes = midnight + slot_begins, midnight + slot_ends
+        shared = np.clip(np.minimum(ends[:, None], finishes) - np.maximum(starts[:, None], begins), 0, None)
+        overlap = np.bincount(codes, weights=shared.sum(axis=1), minlength=students) / max(
+            len(class_days) * float((slot_ends - slot_begins).sum()), 1.0)
+
+        # First arrival per (student, day, slot) among intervals overlapping the slot
+        cell = (codes * len(class_days) + day_index)[:, None] * len(slots) + np.arange(len(slots))
+        first_arrival = np.full(students * len(class_days) * len(slots), np.inf)
+        touching = shared > 0
+        np.minimum.at(first_arrival, cell[touching], np.broadcast_to(starts[:, None], shared.shape)[touching])
+        first_arrival = first_arrival.reshape(students, len(class_days), len(slots))
+        slot_starts = (class_days * DAY - utc_offset)[:, None] + slot_begins
+        late = ((first_arrival > slot_starts + LATE_GRACE) & np.isfinite(first_arrival)).sum(axis=(1, 2))
+
+    rings = np.bincount(columns.ring_codes, minlength=students)
+    answered = np.bincount(columns.ring_codes, weights=columns.ring_answered, minlength=students)
+
+    report = {}
+    for index, username in enumerate(columns.usernames):
+        report[username] = {
+            'days_attended': int(days_attended[index]),
+            'attendance_pct': round(100.0 * days_attended[index] / len(class_days), 1) if len(class_days) else 0.0,
+            'current_streak': int(current[index]),
+            'longest_streak': int(longest[index]),
+            'minutes': round(seconds[index] / 60, 1),
+            'late_arrivals': None if late is None else int(late[index]),
+            'slot_overlap_pct': None if overlap is None else round(100.0 * overlap[index], 1),
+            'rings': int(rings[index]),
+            'rings_answered': int(answered[index]),
+            'ring_response_pct': round(100.0 * answered[index] / rings[index], 1) if rings[index] else None
+        }
+    return {'class_days': len(class_days), 'students': report}
@@ -3,99 +3,151 @@ from tkinter import messagebox
 import json
 import os
 import ctypes
+import time
+import socket
+import struct
 import threading
 import requests
-import platform
-import subprocess
+from urllib.parse import quote, urlparse
+
+from client import EventSender, ServerClient, error_message, run_in_background
+from spool import EventSpool
+from wifi import WifiMonitor
 
 # Server configuration
 SERVER_URL = "https://deadball.onrender.com"
 PING_INTERVAL = 30
-USER_FILE = "users.json"
+STREAM_TIMEOUT = 45  # seconds without data (keepalives included) before reconnecting
+STREAM_RECONNECT_DELAY = 5
+DEFAULT_ROOM = "default"
+SPOOL_DIR = os.path.join(os.path.expanduser("~"), ".attendance_spool")  # Unsent attendance survives restarts here
+UDP_HEARTBEAT = True  # Ping over UDP when the server offers it, else over HTTP
+UDP_ACK_TIMEOUT = 1  # seconds to wait for the server to answer a datagram
+UDP_RETRY_INTERVAL = 300  # seconds on HTTP before trying UDP again
+
+# Datagram layouts; must match udp_heartbeats.py on the server
+UDP_BEAT = struct.Struct("!2sB16sI")  # magic, version, session token, sequence number
+UDP_ACK = struct.Struct("!2sBBI")  # magic, version, result, sequence number
+UDP_MAGIC = b"AH"
+UDP_VERSION = 1
+UDP_ACK_OK = 0
 
 class AttendanceSystem:
     def __init__(self):
-        self.users = self.load_users()
         self.username = None
-        self.current_wifi = None
-        self.setup_wifi_checker()
+        self.room = DEFAULT_ROOM
+        self.wifi = WifiMonitor().start()
+        self.client = ServerClient(SERVER_URL)
+        self.sender = None  # Started at login, with that student's spool
+        self.credentials = None
+        self.udp_session = None  # (username, room, token, server address)
+        self.udp_seq = 0
+        self.udp_socket = None
+        self.udp_retry_at = 0
 
-    def load_users(self):
-        if os.path.exists(USER_FILE):
-            try:
-                with open(USER_FILE, "r") as file:
-                    return json.load(file)
-            except:
-                return {}
-        return {}
+    def register(self, username, password):
+        """Create a student account on the server; returns an error message or None.
+        Raises requests.RequestException if the server can't be reached."""
+        response = self.client.post(
+            "/register",
+            json={"username": username, "password": password, "type": "student"},
+            timeout=10
+        )
+        if response.status_code == 201:
+            return None
+        return error_message(response, "Registration failed")
 
-    def save_users(self):
-        with open(USER_FILE, "w") as file:
-            json.dump(self.users, file, indent=4)
+    def login(self, username, password):
+        """Log in on the server and keep the session token; returns an error message or None.
+        Raises requests.RequestException if the server can't be reached."""
+        response = self.client.post(
+            "/login",
+            json={"username": username, "password": password},
+            timeout=10
+        )
+        if response.status_code != 200:
+            return "Invalid username or password"
+        session = response.json()
+        if session.get("type") != "student":
+            return "This is not a student account"
+        self.client.token = session["token"]
+        self.username = session["username"]
+        # Kept to log in again when the session expires, so spooled events
+        # aren't stuck behind a rejected token
+        self.credentials = (username, password)
+        if self.sender is None:
+            spool_path = os.path.join(SPOOL_DIR, quote(self.username, safe="") + ".jsonl")
+            self.sender = EventSender(self.client, EventSpool(spool_path), reauthenticate=self.reauthenticate)
+        return None
 
-    def send_data(self, action, username=None, status=None):
+    def reauthenticate(self):
+        """Log in again with the remembered password; True if that worked"""
         try:
-            if action == "ping":
-                requests.post(
-                    f"{SERVER_URL}/ping",
-                    json={"type": "students", "username": username},
-                    timeout=5
-                )
-            elif action == "attendance":
-                requests.post(
-                    f"{SERVER_URL}/attendance",
-                    json={"username": username, "status": status},
-                    timeout=5
-                )
-            elif action == "left":
-                requests.post(
-                    f"{SERVER_URL}/attendance",
-                    json={"username": username, "status": "left"},
-                    timeout=5
-                )
-            elif action == "login":
-                requests.post(
-                    f"{SERVER_URL}/ping",
-                    json={"type": "students", "username": username},
-                    timeout=5
-                )
+            return self.login(*self.credentials) is None
         except requests.RequestException:
-            pass
+            return False
 
-    def setup_wifi_checker(self):
-        self.os_type = platform.system()
-        if self.os_type == "Windows":
-            self.check_wifi = self._check_wifi_windows
-        elif self.os_type == "Linux":
-            self.check_wifi = self._check_wifi_linux
+    def send_data(self, action, username=None, status=None):
+        """Queue an event for the sender thread, which ships them in batches; never blocks"""
+        if self.sender is None:
+            return
+        if action == "ping" and self.send_udp_ping(username):
+            return
+        if action in ("ping", "login"):
+            event = {"kind": "ping", "type": "students", "username": username}
+        elif action == "attendance":
+            event = {"kind": "attendance", "username": username, "status": status}
+        elif action == "left":
+            event = {"kind": "left", "username": username}
         else:
-            self.check_wifi = lambda: True
+            return
+        event["room"] = self.room
+        self.sender.send(event)
 
-    def _check_wifi_windows(self):
-        try:
-            result = subprocess.run(
-                ["netsh", "wlan", "show", "interfaces"],
-                capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            for line in result.stdout.splitlines():
-                if "SSID" in line and "BSSID" not in line:
-                    self.current_wifi = line.split(":")[1].strip()
-                    return True
+    def send_udp_ping(self, username):
+        """Heartbeat with one datagram; False means fall back to HTTP"""
+        if not UDP_HEARTBEAT or time.time() < self.udp_retry_at:
             return False
-        except:
-            return False
-
-    def _check_wifi_linux(self):
         try:
-            result = subprocess.run(
-                ["iwgetid", "-r"],
-                capture_output=True, text=True
-            )
-            self.current_wifi = result.stdout.strip()
-            return bool(self.current_wifi)
-        except:
+            session = self.udp_session
+            if session is None or session[:2] != (username, self.room):
+                session = self.udp_session = self.open_udp_session(username)
+            _, _, token, address = session
+            self.udp_seq += 1
+            self.udp_socket.sendto(UDP_BEAT.pack(UDP_MAGIC, UDP_VERSION, token, self.udp_seq), address)
+            # Skip late answers to earlier datagrams
+            while True:
+                magic, _, result, seq = UDP_ACK.unpack(self.udp_socket.recv(64))
+                if magic == UDP_MAGIC and seq == self.udp_seq:
+                    break
+            if result != UDP_ACK_OK:
+                self.udp_session = None  # The server forgot the session; reopen on the next ping
+            return result == UDP_ACK_OK
+        except (OSError, struct.error, ValueError, KeyError, requests.RequestException):
+            # No answer or no UDP support: stay on HTTP for a while
+            self.udp_session = None
+            self.udp_retry_at = time.time() + UDP_RETRY_INTERVAL
             return False
 
+    def open_udp_session(self, username):
+        response = self.client.post(
+            "/heartbeat_session",
+            json={"type": "students", "username": username, "room": self.room},
+            retries=0
+        )
+        response.raise_for_status()
+        session = response.json()
+        if self.udp_socket is None:
+            self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp_socket.settimeout(UDP_ACK_TIMEOUT)
+        self.udp_seq = 0
+        address = (urlparse(SERVER_URL).hostname, session["port"])
+        return username, self.room, bytes.fromhex(session["token"]), address
+
+    def check_wifi(self):
+        """Whether WiFi is connected, from the monitor's cached state"""
+        return self.wifi.connected
+
 class StudentClient:
     def __init__(self, system):
         self.system = system
@@ -111,7 +163,7 @@ class StudentClient:
 
     def setup_login_ui(self):
         self.root.title("Student Portal")
-        self.root.geometry("350x300")
+        self.root.geometry("350x340")
         self.root.resizable(False, False)
         
         # Main frame
@@ -131,9 +183,15 @@ class StudentClient:
         self.entry_password = tk.Entry(main_frame, show="*")
         self.entry_password.grid(row=2, column=1, pady=5, ipadx=20)
         
+        # Room
+        tk.Label(main_frame, text="Room:").grid(row=3, column=0, sticky="e", pady=5)
+        self.entry_room = tk.Entry(main_frame)
+        self.entry_room.insert(0, DEFAULT_ROOM)
+        self.entry_room.grid(row=3, column=1, pady=5, ipadx=20)
+        
         # Buttons
         btn_frame = tk.Frame(main_frame)
-        btn_frame.grid(row=3, column=0, columnspan=2, pady=15)
+        btn_frame.grid(row=4, column=0, columnspan=2, pady=15)
         
         tk.Button(btn_frame, text="Login", command=self.login, width=10, bg="#4CAF50", fg="white").pack(side="left", padx=5)
         tk.Button(btn_frame, text="Sign Up", command=self.show_signup, width=10, bg="#2196F3", fg="white").pack(side="left", padx=5)
@@ -177,14 +235,16 @@ class StudentClient:
             messagebox.showerror("Error", "Passwords don't match")
             return
             
-        if username in self.system.users:
-            messagebox.showerror("Error", "Username already exists")
-            return
-            
-        self.system.users[username] = password
-        self.system.save_users()
-        messagebox.showinfo("Success", "Account created successfully!")
-        self.signup_window.destroy()
+        run_in_background(self.root, lambda: self.system.register(username, password), self.signup_done)
+
+    def signup_done(self, error, connection_error):
+        if connection_error:
+            messagebox.showerror("Error", "Could not reach the server")
+        elif error:
+            messagebox.showerror("Error", error)
+        else:
+            messagebox.showinfo("Success", "Account created successfully!")
+            self.signup_window.destroy()
 
     def login(self):
         username = self.entry_username.get()
@@ -194,14 +254,19 @@ class StudentClient:
             messagebox.showwarning("Error", "Please enter both username and password")
             return
             
-        if username in self.system.users and self.system.users[username] == password:
+        run_in_background(self.root, lambda: self.system.login(username, password), self.login_done)
+
+    def login_done(self, error, connection_error):
+        if connection_error:
+            messagebox.showerror("Error", "Could not reach the server")
+        elif error is None:
             messagebox.showinfo("Success", "Login successful!")
-            self.system.username = username
+            self.system.room = self.entry_room.get().strip() or DEFAULT_ROOM
             self.root.destroy()
-            self.system.send_data("login", username)
+            self.system.send_data("login", self.system.username)
             self.start_attendance_timer()
         else:
-            messagebox.showerror("Error", "Invalid username or password")
+            messagebox.showerror("Error", error)
 
     def start_ping_thread(self):
         def ping():
@@ -230,6 +295,14 @@ class StudentClient:
         )
         self.status_label.pack(fill="x")
         
+        self.server_status_label = tk.Label(
+            status_frame,
+            text="Server record: Unknown",
+            font=("Arial", 10),
+            anchor="w"
+        )
+        self.server_status_label.pack(fill="x")
+        
         # Notification frame
         notification_frame = tk.Frame(self.attendance_window, padx=10, pady=5)
         notification_frame.pack(fill="x")
@@ -267,9 +340,19 @@ class StudentClient:
         )
         self.start_button.pack(pady=20)
         
-        # Start threads
+        # Start threads; WiFi changes arrive from the monitor instead of being polled
         threading.Thread(target=self.check_rings, daemon=True).start()
-        threading.Thread(target=self.check_wifi_status, daemon=True).start()
+        self.waiting_for_wifi = False
+        self.timer_started = False
+        self.system.wifi.add_listener(
+            lambda connected, ssid: self.attendance_window.after(0, self.show_wifi, connected, ssid)
+        )
+        if self.system.wifi.ready.is_set():
+            self.show_wifi(self.system.wifi.connected, self.system.wifi.ssid)
+        else:
+            # Until the monitor's first reading arrives, not connected only means not checked yet
+            self.status_label.config(text="Status: Checking WiFi...")
+            self.start_button.config(state=tk.DISABLED)
         
         self.attendance_window.mainloop()
 
@@ -293,52 +376,70 @@ class StudentClient:
             else:
                 self.timer_label.config(text="WiFi disconnected! Timer paused.", fg="red")
                 self.system.send_data("left", self.system.username)
-                self.check_wifi_reconnect()
+                self.waiting_for_wifi = True
         elif self.timer_started:
             self.timer_label.config(text="Attendance Marked Successfully!", fg="green")
             self.timer_started = False
             self.start_button.config(state=tk.NORMAL)
 
-    def check_wifi_reconnect(self):
-        if not self.system.check_wifi():
-            self.attendance_window.after(1000, self.check_wifi_reconnect)
+    def show_wifi(self, connected, ssid):
+        """Called on the main loop whenever the WiFi monitor sees a change"""
+        if connected:
+            self.status_label.config(text=f"Status: Connected to {ssid or 'network'}", fg="green")
         else:
+            self.status_label.config(text="Status: Not Connected to WiFi", fg="red")
+        if not self.timer_started:
+            self.start_button.config(state=tk.NORMAL)
+        if connected and self.waiting_for_wifi:
+            self.waiting_for_wifi = False
             self.timer_label.config(text="WiFi reconnected! Resuming timer.", fg="blue")
             self.update_timer()
 
     def check_rings(self):
+        """Keep one notification stream open and react to pushed events"""
         last_ring = ""
         while True:
             try:
-                response = requests.get(f"{SERVER_URL}/get_attendance", timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('last_ring') != last_ring:
-                        last_ring = data.get('last_ring')
-                        ring_students = data.get('ring_students', [])
-                        if self.system.username in ring_students:
-                            self.ring_label.config(
-                                text="RANDOM RING ALERT! Please mark attendance now!",
-                                fg="red"
-                            )
-                            self.attendance_window.bell()  # System beep
+                with self.system.client.get(
+                    "/events",
+                    params={"username": self.system.username, "room": self.system.room},
+                    stream=True,
+                    retries=0,
+                    timeout=(5, STREAM_TIMEOUT)
+                ) as response:
+                    event = None
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line.startswith("event:"):
+                            event = line[6:].strip()
+                        elif line.startswith("data:") and event:
+                            data = json.loads(line[5:])
+                            if event == "hello":
+                                self.show_server_status(data.get('status'))
+                                if data.get('ringed') and data.get('last_ring') != last_ring:
+                                    last_ring = data.get('last_ring')
+                                    self.show_ring_alert()
+                            elif event == "ring" and data.get('last_ring') != last_ring:
+                                last_ring = data.get('last_ring')
+                                self.show_ring_alert()
+                            elif event == "status":
+                                self.show_server_status(data)
+                            event = None
             except:
                 pass
-            threading.Event().wait(10)
+            threading.Event().wait(STREAM_RECONNECT_DELAY)
 
-    def check_wifi_status(self):
-        while True:
-            if self.system.check_wifi():
-                self.status_label.config(
-                    text=f"Status: Connected to {self.system.current_wifi}",
-                    fg="green"
-                )
-            else:
-                self.status_label.config(
-                    text="Status: Not Connected to WiFi",
-                    fg="red"
-                )
-            threading.Event().wait(5)
+    def show_ring_alert(self):
+        self.ring_label.config(
+            text="RANDOM RING ALERT! Please mark attendance now!",
+            fg="red"
+        )
+        self.attendance_window.bell()  # System beep
+
+    def show_server_status(self, info):
+        if info:
+            self.server_status_label.config(
+                text=f"Server record: {info.get('status', 'unknown').capitalize()}"
+            )
 
 if __name__ == "__main__":
     system = AttendanceSystem()
@@ -0,0 +1,383 @@
+"""Asyncio-native entry point for the attendance server.
+
+Serves the same routes as the Flask app in baderia.py through the same
+route logic, but as a plain ASGI application, so one process can hold
+tens of thousands of idle heartbeat and notification connections without
+a thread each. Heartbeat expiry and random rings run as timers on the
+event loop and log compaction as an async task.
+
+    python asgi_server.py            # needs uvicorn
+    uvicorn asgi_server:app --host 0.0.0.0 --port 5000
+"""
+import json
+import time
+import traceback
+import queue
+import asyncio
+from urllib.parse import parse_qs
+from werkzeug.http import parse_accept_header, parse_etags
+import baderia
+import metrics
+from rooms import DEFAULT_ROOM
+from scheduler import AsyncScheduler
+from storage import LogUnavailable
+from udp_heartbeats import HeartbeatProtocol
+
+MAX_BODY_BYTES = 1024 * 1024
+
+class BodyTooLarge(Exception):
+    pass
+
+class LoopStream:
+    """Notification stream that hands events from any thread to the event loop"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=baderia.STREAM_QUEUE_SIZE)
+
+    def put_nowait(self, item):
+        if self.queue.full():
+            raise queue.Full
+        self.loop.call_soon_threadsafe(self.deliver, item)
+
+    def deliver(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            pass  # Same as the Flask stream: the hello event resyncs the client
+
+class Request:
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = {
+            name: values[0]
+            for name, values in parse_qs(scope['query_string'].decode('latin-1')).items()
+        }
+        self.headers = {
+            name.decode('latin-1').lower(): value.decode('latin-1')
+            for name, value in scope['headers']
+        }
+
+    def session(self):
+        return baderia.authenticate(self.headers.get('authorization'))
+
+    def arg_int(self, name):
+        try:
+            return int(self.args[name])
+        except (KeyError, ValueError):
+            return None
+
+    async def body(self):
+        chunks = []
+        size = 0
+        while True:
+            message = await self.receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise BodyTooLarge(f"Request body over {MAX_BODY_BYTES} bytes")
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def data(self):
+        """JSON body as a dict, like baderia.request_data()"""
+        try:
+            data = json.loads(await self.body() or b'null')
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+class MeteredSend:
+    """Wraps send to record a request's metrics as its first body chunk goes out.
+
+    Like the Flask hooks, streams are timed to their first chunk and report
+    no response size.
+    """
+
+    def __init__(self, send, route, request):
+        self.send = send
+        self.route = route
+        self.request_bytes = int(request.headers.get('content-length') or 0)
+        self.start = time.perf_counter()
+        self.status = None
+
+    async def __call__(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif self.status is not None:
+            metrics.observe_request(
+                self.route,
+                time.perf_counter() - self.start,
+                self.status,
+                self.request_bytes,
+                0 if message.get('more_body') else len(message.get('body', b''))
+            )
+            self.status = None
+        await self.send(message)
+
+async def send_response(send, status, headers, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_json(send, payload, status):
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    await send_response(send, status, [('Content-Type', 'application/json')], body)
+
+async def register(request, send):
+    # Password hashing takes tens of milliseconds; keep it off the loop
+    data = await request.data()
+    await send_json(send, *await asyncio.to_thread(baderia.handle_register, data, request.session()))
+
+async def login(request, send):
+    data = await request.data()
+    await send_json(send, *await asyncio.to_thread(baderia.handle_login, data))
+
+async def import_roster(request, send):
+    # Parsing and waiting on hashes happen on a thread, which pulls the
+    # body from the loop a chunk at a time as the parser needs it
+    loop = asyncio.get_running_loop()
+
+    def chunks():
+        while True:
+            message = asyncio.run_coroutine_threadsafe(request.receive(), loop).result()
+            if message['type'] == 'http.disconnect':
+                raise baderia.UploadInterrupted
+            yield message.get('body', b'')
+            if not message.get('more_body'):
+                return
+
+    await send_json(send, *await asyncio.to_thread(baderia.handle_roster_import, chunks(), request.session()))
+
+async def ping(request, send):
+    # Heartbeats never wait on the disk, so they run right on the loop
+    await send_json(send, *baderia.handle_ping(await request.data(), request.session()))
+
+async def heartbeat_session(request, send):
+    await send_json(send, *baderia.handle_heartbeat_session(await request.data(), request.session()))
+
+async def update_attendance(request, send):
+    # Writes wait for their group commit, which must not stall the loop
+    data = await request.data()
+    await send_json(send, *await asyncio.to_thread(baderia.handle_attendance, data, request.session()))
+
+async def get_timetable(request, send):
+    await send_response(send, *baderia.read_timetable(
+        request.args.get('room') or DEFAULT_ROOM,
+        parse_etags(request.headers.get('if-none-match'))
+    ))
+
+async def update_timetable(request, send):
+    data = await request.data()
+    await send_json(send, *await asyncio.to_thread(baderia.handle_timetable_update, data, request.session()))
+
+async def ingest_batch(request, send):
+    data = await request.data()
+    await send_json(send, *await asyncio.to_thread(baderia.handle_ingest_batch, data, request.session()))
+
+async def get_attendance(request, send):
+    status, headers, body = baderia.read_attendance(
+        request.args.get('room') or DEFAULT_ROOM,
+        request.arg_int('since'),
+        parse_etags(request.headers.get('if-none-match')),
+        parse_accept_header(request.headers.get('accept-encoding'))
+    )
+    await send_response(send, status, headers, body)
+
+async def get_dashboard(request, send):
+    await send_response(send, *baderia.read_dashboard(
+        request.args.get('room') or DEFAULT_ROOM,
+        request.arg_int('since'),
+        request.arg_int('timetable_version'),
+        parse_etags(request.headers.get('if-none-match')),
+        parse_accept_header(request.headers.get('accept-encoding'))
+    ))
+
+async def roster(request, send):
+    await send_json(send, *baderia.read_roster(request.args, request.session()))
+
+async def report(request, send):
+    await send_json(send, *baderia.read_report(request.args, request.session()))
+
+async def export(request, send):
+    # Each page waits its turn for the room lock; read them off the loop
+    status, headers, chunks = baderia.read_export(request.args, request.session())
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    })
+    disconnect = asyncio.ensure_future(wait_for_disconnect(request.receive))
+    try:
+        while not disconnect.done():
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        disconnect.cancel()
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+async def get_analytics(request, send):
+    # Analytics can take a while on a cache miss; keep them off the loop
+    await send_response(send, *await asyncio.to_thread(baderia.read_analytics, request.args, request.session()))
+
+async def stats(request, send):
+    await send_json(send, *baderia.read_stats())
+
+async def get_metrics(request, send):
+    await send_response(send, *baderia.read_metrics())
+
+async def events(request, send):
+    username = request.args.get('username')
+    if not username:
+        await send_json(send, {"error": "Missing username"}, 400)
+        return
+    error = baderia.check_stream(username, request.session())
+    if error:
+        await send_json(send, *error)
+        return
+    room_name = request.args.get('room') or DEFAULT_ROOM
+
+    stream = LoopStream(asyncio.get_running_loop())
+    hello = baderia.open_stream(room_name, username, stream)
+    disconnect = asyncio.ensure_future(wait_for_disconnect(request.receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream; charset=utf-8')] + [
+                (name.lower().encode(), value.encode()) for name, value in baderia.SSE_HEADERS.items()
+            ]
+        })
+        chunk = baderia.format_event('hello', hello)
+        while True:
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            next_event = asyncio.ensure_future(stream.queue.get())
+            done, _ = await asyncio.wait(
+                {next_event, disconnect},
+                timeout=baderia.STREAM_KEEPALIVE,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect in done:
+                next_event.cancel()
+                return
+            if next_event in done:
+                chunk = baderia.format_event(*next_event.result())
+            else:
+                next_event.cancel()
+                chunk = ": keepalive\n\n"
+    finally:
+        disconnect.cancel()
+        baderia.close_stream(room_name, username, stream)
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+# path -> {method: handler}
+ROUTES = {
+    '/register': {'POST': register},
+    '/login': {'POST': login},
+    '/import_roster': {'POST': import_roster},
+    '/ping': {'POST': ping},
+    '/heartbeat_session': {'POST': heartbeat_session},
+    '/attendance': {'POST': update_attendance},
+    '/ingest_batch': {'POST': ingest_batch},
+    '/get_attendance': {'GET': get_attendance},
+    '/timetable': {'GET': get_timetable, 'POST': update_timetable},
+    '/dashboard': {'GET': get_dashboard},
+    '/roster': {'GET': roster},
+    '/report': {'GET': report},
+    '/export': {'GET': export},
+    '/analytics': {'GET': get_analytics},
+    '/stats': {'GET': stats},
+    '/metrics': {'GET': get_metrics},
+    '/events': {'GET': events}
+}
+
+async def compact_loop():
+    """Periodically compact the event log off the event loop"""
+    compacted_lsn = baderia.event_log.appended
+    while True:
+        await asyncio.sleep(baderia.SNAPSHOT_INTERVAL)
+        if baderia.event_log.appended != compacted_lsn:
+            lsn = baderia.event_log.appended
+            try:
+                with metrics.JOB_SECONDS.time('compact_state'):
+                    await asyncio.to_thread(baderia.event_log.compact, baderia.capture_state)
+                compacted_lsn = lsn
+            except Exception:
+                # Like a scheduler job: report it and try again next interval
+                traceback.print_exc()
+
+async def startup():
+    # Ring and expiry timers become loop timers instead of a scheduler thread
+    loop = asyncio.get_running_loop()
+    baderia.scheduler = AsyncScheduler(loop)
+    baderia.restore_state()
+    baderia.scheduler.call_later(0, baderia.expire_clients)
+    baderia.scheduler.call_later(baderia.SESSION_PURGE_INTERVAL, baderia.purge_sessions)
+    heartbeats = None
+    if baderia.UDP_HEARTBEAT_PORT:
+        heartbeats, _ = await loop.create_datagram_endpoint(
+            lambda: HeartbeatProtocol(baderia.heartbeat_sessions, baderia.handle_heartbeat_datagram),
+            local_addr=("0.0.0.0", baderia.UDP_HEARTBEAT_PORT)
+        )
+    return asyncio.ensure_future(compact_loop()), heartbeats
+
+async def lifespan(receive, send):
+    compaction = heartbeats = None
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            compaction, heartbeats = await startup()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if compaction:
+                compaction.cancel()
+            if heartbeats:
+                heartbeats.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    request = Request(scope, receive)
+    route = ROUTES.get(request.path)
+    handler = route.get(request.method) if route else None
+    # Unmatched paths and methods share one label, as in the Flask app
+    send = MeteredSend(send, request.path if handler else 'unmatched', request)
+    if route is None:
+        await send_json(send, {"error": "Not found"}, 404)
+    elif handler is None:
+        await send_json(send, {"error": "Method not allowed"}, 405)
+    else:
+        try:
+            await handler(request, send)
+        except BodyTooLarge as error:
+            await send_json(send, {"error": str(error)}, 413)
+        except LogUnavailable:
+            await send_json(send, {"error": "Could not save the change; try again"}, 503)
+
+if __name__ == "__main__":
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("asgi_server needs an ASGI server: pip install uvicorn")
+    uvicorn.run(app, host="0.0.0.0", port=baderia.PORT, backlog=4096, timeout_keep_alive=60)
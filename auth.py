@@ -0,0 +1,197 @@
+import os
+import hmac
+import time
+import sqlite3
+import hashlib
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+USER_TYPES = ('student', 'teacher')
+
+# scrypt cost: about 50 ms and 16 MB per hash, paid once per login
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+def hash_password(password, salt=None):
+    """Hash a password with a fresh salt, as "scrypt$n$r$p$salt$hash" """
+    salt = salt or secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+def check_password(password, encoded):
+    _, n, r, p, salt, digest = encoded.split('$')
+    # Hashes keep their own cost, so raising it later doesn't lock anyone out
+    candidate = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=int(n), r=int(r), p=int(p))
+    return hmac.compare_digest(candidate, bytes.fromhex(digest))
+
+# Hashes for bulk imports run here; scrypt releases the GIL, and the pool
+# bounds how many 16 MB hashes are in flight at once
+HASH_WORKERS = min(4, os.cpu_count() or 1)
+hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='password-hash')
+
+# Checked against for unknown usernames, so they take as long as known ones.
+# Timing it tells bulk imports what a hash costs on this host.
+started = time.perf_counter()
+DUMMY_HASH = hash_password(secrets.token_hex(8))
+HASH_SECONDS = time.perf_counter() - started
+
+def token_digest(token):
+    """Sessions are stored and looked up by a digest, so a leaked store holds no tokens"""
+    return hashlib.sha256(token.encode()).digest()
+
+class UserStore:
+    """Accounts in a SQLite database, one row per user keyed by username.
+
+    Signups are single-row inserts and logins single-row lookups on the
+    primary key, so neither touches other users. Login sessions are kept
+    here too, so they survive a restart.
+    """
+
+    def __init__(self, path):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            " username TEXT PRIMARY KEY, type TEXT NOT NULL, password TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " digest BLOB PRIMARY KEY, username TEXT NOT NULL, type TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self.lock = threading.Lock()
+
+    def add(self, username, password, user_type, password_hash=None):
+        """Create an account; False if the username is taken"""
+        password_hash = password_hash or hash_password(password)
+        try:
+            with self.lock:
+                self.db.execute(
+                    "INSERT INTO users (username, type, password, created) VALUES (?, ?, ?, ?)",
+                    (username, user_type, password_hash, time.time())
+                )
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def add_many(self, accounts):
+        """Create accounts from (username, user_type, password_hash) in one
+        transaction; get the usernames that were already taken"""
+        taken = set()
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                for username, user_type, password_hash in accounts:
+                    cursor = self.db.execute(
+                        "INSERT OR IGNORE INTO users (username, type, password, created) VALUES (?, ?, ?, ?)",
+                        (username, user_type, password_hash, now)
+                    )
+                    if cursor.rowcount == 0:
+                        taken.add(username)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return taken
+
+    def exists(self, username):
+        with self.lock:
+            return self.db.execute(
+                "SELECT 1 FROM users WHERE username = ?", (username,)
+            ).fetchone() is not None
+
+    def check(self, username, password):
+        """Get the type of a user if the password matches, else None"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT type, password FROM users WHERE username = ?", (username,)
+            ).fetchone()
+        # Hash outside the lock, so slow logins don't queue behind each other
+        if row is None:
+            check_password(password, DUMMY_HASH)
+            return None
+        return row[0] if check_password(password, row[1]) else None
+
+    def has_type(self, user_type):
+        with self.lock:
+            return self.db.execute(
+                "SELECT 1 FROM users WHERE type = ? LIMIT 1", (user_type,)
+            ).fetchone() is not None
+
+    def save_session(self, digest, session):
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO sessions (digest, username, type, expires) VALUES (?, ?, ?, ?)",
+                (digest, session.username, session.user_type, session.expires)
+            )
+
+    def load_sessions(self, now):
+        """Get (digest, Session) for every unexpired session"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT digest, username, type, expires FROM sessions WHERE expires > ?", (now,)
+            ).fetchall()
+        return [(digest, Session(username, user_type, expires)) for digest, username, user_type, expires in rows]
+
+    def delete_expired_sessions(self, now):
+        with self.lock:
+            self.db.execute("DELETE FROM sessions WHERE expires <= ?", (now,))
+
+class Session:
+    __slots__ = ('username', 'user_type', 'expires')
+
+    def __init__(self, username, user_type, expires):
+        self.username = username
+        self.user_type = user_type
+        self.expires = expires
+
+    @property
+    def client_type(self):
+        """The session's type as heartbeats name it: students or teachers"""
+        return self.user_type + 's'
+
+    @property
+    def is_teacher(self):
+        return self.user_type == 'teacher'
+
+class Sessions:
+    """Login sessions by token, so authenticating a request is one dict lookup.
+
+    Tokens are opaque random strings; the password is only hashed at login.
+    """
+
+    def __init__(self, store, lifetime):
+        self.store = store
+        self.lifetime = lifetime
+        self.sessions = dict(store.load_sessions(time.time()))
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def open(self, username, user_type):
+        """Start a session and return its token"""
+        token = secrets.token_urlsafe(32)
+        session = Session(username, user_type, time.time() + self.lifetime)
+        digest = token_digest(token)
+        self.store.save_session(digest, session)
+        self.sessions[digest] = session
+        return token
+
+    def get(self, token):
+        """Get the live session for a token, or None"""
+        session = self.sessions.get(token_digest(token))
+        if session is None or session.expires <= time.time():
+            return None
+        return session
+
+    def purge(self):
+        """Forget expired sessions"""
+        now = time.time()
+        for digest, session in list(self.sessions.items()):
+            if session.expires <= now:
+                self.sessions.pop(digest, None)
+        self.store.delete_expired_sessions(now)
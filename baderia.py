@@ -1,108 +1,1230 @@
-
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.http import quote_etag
+import io
+import os
+import csv
+import math
+import codecs
+import json
 import time
+import queue
 import threading
 import random
 from collections import defaultdict
 from datetime import datetime
+import metrics
+from auth import HASH_SECONDS, HASH_WORKERS, USER_TYPES, Sessions, UserStore, hash_password, hash_pool
+from heartbeats import HeartbeatTracker
+from response_cache import COMPRESSORS, ResponseCache, pick_encoding
+from rooms import DEFAULT_ROOM, Room
+from scheduler import Scheduler
+from storage import EventLog, LogUnavailable
+from student_store import Status
+from timetable import Timetable, parse_periods
+from udp_heartbeats import HeartbeatListener, HeartbeatSessions
 
-app = Flask(__name__)
+try:
+    import analytics  # Needs NumPy; only /analytics depends on it
+except ImportError:
+    analytics = None
 
-# Store attendance data
-attendance_data = {
-    'students': defaultdict(dict),
-    'last_ring': None,
-    'ring_students': []
-}
+app = Flask(__name__)
 
-# Store connected clients
-connected_clients = {
-    'students': {},
-    'teachers': {}
-}
+# Attendance state per room, created on first write
+rooms = {}
+rooms_lock = threading.Lock()
 
 # Configuration
 RING_INTERVAL = 300  # 5 minutes
+RING_MIN_DELAY = 120  # Random rings fire 2-10 minutes apart in each room
+RING_MAX_DELAY = 600
+CLIENT_TIMEOUT = 60  # seconds without a ping before a client counts as gone
+CLIENT_TYPES = ('students', 'teachers')
+STREAM_KEEPALIVE = 15  # seconds between keepalive comments on idle streams
+STREAM_QUEUE_SIZE = 100  # events buffered per stream before dropping
+BATCH_LIMIT = 1000  # events accepted per /ingest_batch request
+EVENT_ID_MAX_LENGTH = 64
+ROSTER_PAGE_SIZE = 100  # students per /roster page unless ?limit= says otherwise
+ROSTER_PAGE_LIMIT = 1000
+EVENT_MAX_AGE = 86400  # seconds back a replayed event's own timestamp is trusted
+DATA_DIR = os.environ.get('ATTENDANCE_DATA_DIR', 'attendance_state')
+SNAPSHOT_INTERVAL = 300  # seconds between log compactions
+COMPRESS_MIN_BYTES = 1024  # smaller attendance bodies are sent uncompressed
+REPORT_DEFAULT_DAYS = 7  # window of a /report without a start time
+EXPORT_PAGE_SIZE = 500  # rows read per turn of the room lock, and sent per chunk, by /export
+# Columns of each kind of /export
+EXPORT_COLUMNS = {
+    'status': ('username', 'status', 'last_update', 'period'),
+    'presence': ('username', 'start', 'end'),
+    'rings': ('username', 'time', 'answered')
+}
+EXPORT_FORMATS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')  # cells spreadsheets may evaluate
+PORT = int(os.environ.get('PORT', 5000))
+UDP_HEARTBEAT_PORT = int(os.environ.get('UDP_HEARTBEAT_PORT', 5001))  # 0 disables UDP heartbeats
+# 0 trusts the usernames clients send instead of requiring a login; for benchmarks only
+REQUIRE_AUTH = os.environ.get('ATTENDANCE_REQUIRE_AUTH', '1') != '0'
+SESSION_LIFETIME = 7 * 86400  # seconds a login stays valid
+SESSION_PURGE_INTERVAL = 3600  # seconds between sweeps of expired sessions
+IMPORT_HASH_BUDGET = 240  # seconds of hashing per upload, inside the dashboard's 300 s IMPORT_TIMEOUT
+# Rows per /import_roster upload, besides a header, so hashing them all fits the budget on this host
+IMPORT_ROW_LIMIT = max(100, min(10000, int(IMPORT_HASH_BUDGET * HASH_WORKERS / HASH_SECONDS) // 100 * 100))
+IMPORT_READ_SIZE = 64 * 1024  # bytes of an upload read at a time
 
-@app.route("/ping", methods=["POST"])
-def ping():
-    """Handle client heartbeats"""
-    data = request.json
-    client_type = data.get('type')
+# Store connected clients, keyed by (room, client type, username)
+connected_clients = HeartbeatTracker(CLIENT_TIMEOUT)
+
+# Tokens for clients that heartbeat over UDP instead of POST /ping
+heartbeat_sessions = HeartbeatSessions()
+
+# One thread runs ring, heartbeat expiry and compaction timers for all rooms
+scheduler = Scheduler()
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# Encoded /get_attendance bodies, shared by pollers until the room changes
+attendance_cache = ResponseCache()
+
+# Encoded /analytics results, per room, window and timetable slots
+analytics_cache = ResponseCache(max_entries=64)
+
+# Durable log of status changes and rings, opened by restore_state()
+event_log = None
+
+# Accounts and login sessions, opened by restore_state()
+users = None
+sessions = None
+
+# Open notification streams, per (room, student)
+subscribers = defaultdict(set)
+subscribers_lock = threading.Lock()
+
+# State gauges are read when /metrics is scraped, so they cost nothing per request
+metrics.REGISTRY.register(metrics.Gauge(
+    "attendance_connected_clients", "Clients with a live heartbeat", lambda: len(connected_clients)))
+metrics.REGISTRY.register(metrics.Gauge(
+    "attendance_present_students", "Students marked present, across rooms",
+    lambda: sum(len(room.students.present) for room in list(rooms.values()))))
+metrics.REGISTRY.register(metrics.Gauge(
+    "attendance_heartbeat_sessions", "Open UDP heartbeat sessions", lambda: len(heartbeat_sessions)))
+metrics.REGISTRY.register(metrics.Gauge(
+    "attendance_login_sessions", "Login sessions held in memory", lambda: len(sessions) if sessions else 0))
+metrics.REGISTRY.register(metrics.Gauge(
+    "attendance_rooms", "Rooms with attendance state", lambda: len(rooms)))
+metrics.REGISTRY.register(metrics.Gauge(
+    "attendance_open_streams", "Open notification streams",
+    lambda: sum(len(streams) for streams in list(subscribers.values()))))
+metrics.REGISTRY.register(metrics.Gauge(
+    "attendance_log_fsyncs_total", "Group commits flushed to disk",
+    lambda: event_log.fsyncs if event_log else 0, kind="counter"))
+metrics.REGISTRY.register(metrics.Gauge(
+    "attendance_cache_hits_total", "Attendance bodies served from cache",
+    lambda: attendance_cache.stats()['hits'], kind="counter"))
+metrics.REGISTRY.register(metrics.Gauge(
+    "attendance_cache_misses_total", "Attendance bodies encoded on a miss",
+    lambda: attendance_cache.stats()['misses'], kind="counter"))
+
+def get_room(name):
+    """Get a room by name, creating it and scheduling its rings on first use"""
+    room = rooms.get(name)
+    if room is None:
+        with rooms_lock:
+            room = rooms.get(name)
+            if room is None:
+                room = rooms[name] = Room(name)
+                schedule_ring(room)
+    return room
+
+def may_open_room(name, session):
+    """Whether a write may name a room: students only use rooms a teacher
+    has opened (and the default one), so clients can't grow state at will"""
+    return name in rooms or name == DEFAULT_ROOM or is_teacher(session)
+
+def read_room(name):
+    """Get the published snapshot of a room; unknown rooms read as empty"""
+    room = rooms.get(name) or Room(name)
+    return room.snapshot
+
+def notify(room, username, event, payload):
+    """Push an event to every open stream of a student in a room"""
+    with subscribers_lock:
+        streams = list(subscribers.get((room.name, username), ()))
+    for stream in streams:
+        try:
+            stream.put_nowait((event, payload))
+        except queue.Full:
+            pass  # Client isn't reading; it resyncs from the hello event on reconnect
+
+def format_event(event, payload):
+    """Encode an event in Server-Sent Events format"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+def record_event(room, event):
+    """Apply an event to a room and append it to the durable log.
+
+    Callers hold the room's write lock, via room.writing(), so the event's
+    seq and its position in the log agree.
+    """
+    room.apply(event)
+    if event_log:
+        event_log.append(dict(event, room=room.name))
+
+def commit_events():
+    """Wait until recorded events are on disk before answering a request"""
+    if event_log:
+        event_log.commit()
+
+def set_student_status(room, username, status, seq=None, at=None, event_id=None):
+    """Update a student's status and record it in the room's change log.
+
+    at is when the change happened on the client, for events replayed
+    late; it is kept between the student's previous change (and at most
+    EVENT_MAX_AGE ago) and now, so neither a skewed clock nor a stale
+    replay can reorder their history.
+    event_id is the client's idempotency key for the change.
+    """
+    now = time.time()
+    if at is not None:
+        record = room.students.get(username)
+        now = min(now, max(at, now - EVENT_MAX_AGE, record.last_update if record else 0))
+    period = room.timetable.active(now)
+    event = {
+        'kind': 'status',
+        'seq': room.next_seq() if seq is None else seq,
+        'username': username,
+        'status': status.label,
+        'last_update': now,
+        'period': period.label if period else None
+    }
+    if event_id:
+        event['id'] = event_id
+    record_event(room, event)
+    notify(room, username, 'status', room.students.get(username).to_json())
+
+def set_ring(room, selected):
+    """Publish a random ring to the selected students of a room"""
+    record_event(room, {
+        'kind': 'ring',
+        'seq': room.next_seq(),
+        'last_ring': datetime.now().isoformat(),
+        'ring_students': selected
+    })
+    metrics.RINGS.inc()
+    for username in selected:
+        notify(room, username, 'ring', {'last_ring': room.last_ring})
+
+# Route logic below is independent of the web framework, so the Flask app
+# here and the asyncio app in asgi_server.py share it and behave the same.
+
+LOGIN_REQUIRED = {"error": "Login required"}, 401
+NOT_ALLOWED = {"error": "Not allowed"}, 403
+UNKNOWN_ROOM = {"error": "Unknown room"}, 404
+
+def authenticate(authorization):
+    """Get the session for an Authorization header value, or None.
+
+    Only a dict lookup; passwords are checked once, at login.
+    """
+    scheme, _, token = (authorization or '').partition(' ')
+    if sessions is None or scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return sessions.get(token.strip())
+
+def identify(data, session):
+    """Get the (client type, username) a request acts as, or None without a login"""
+    if session:
+        return session.client_type, session.username
+    if REQUIRE_AUTH:
+        return None
+    return data.get('type'), data.get('username')
+
+def may_act_for(session, username):
+    """Whether a request may change a student's attendance; teachers may change anyone's"""
+    if session is None:
+        return not REQUIRE_AUTH
+    return session.is_teacher or session.username == username
+
+def is_teacher(session):
+    return session.is_teacher if session else not REQUIRE_AUTH
+
+def check_teacher(session):
+    """Get an error response unless a request comes from a teacher, else None"""
+    if REQUIRE_AUTH and session is None:
+        return LOGIN_REQUIRED
+    if not is_teacher(session):
+        return NOT_ALLOWED
+    return None
+
+def check_stream(username, session):
+    """Get an error response if a request may not watch a student's notifications, else None"""
+    if REQUIRE_AUTH and session is None:
+        return LOGIN_REQUIRED
+    if not may_act_for(session, username):
+        return NOT_ALLOWED
+    return None
+
+def handle_register(data, session=None):
+    """Create an account. Students sign themselves up; once a teacher
+    exists, only teachers can add more teachers."""
+    if users is None:
+        return {"error": "User store unavailable"}, 503
     username = data.get('username')
+    password = data.get('password')
+    user_type = data.get('type') or 'student'
+    if not isinstance(username, str) or not username.strip() or not isinstance(password, str) or not password:
+        return {"error": "Missing username or password"}, 400
+    if user_type not in USER_TYPES:
+        return {"error": "Invalid user type"}, 400
+    if user_type == 'teacher' and not (session and session.is_teacher) and users.has_type('teacher'):
+        return NOT_ALLOWED
+    if not users.add(username.strip(), password, user_type):
+        return {"error": "Username already exists"}, 409
+    return {"status": "registered"}, 201
+
+class UploadInterrupted(Exception):
+    """The client went away before sending the whole request body"""
+
+def text_lines(chunks):
+    """Split UTF-8 byte chunks into lines for csv.reader, as they arrive.
+
+    Raises UnicodeDecodeError on bytes that aren't UTF-8. A leading byte
+    order mark, as spreadsheet programs write, is dropped.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    pending = ''
+    for chunk in chunks:
+        *lines, pending = (pending + decoder.decode(chunk)).split('\n')
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+def read_roster_rows(rows, errors):
+    """Validate username,password[,type] rows, yielding (line, username, password, type)
+    for good ones and appending {line, username, error} to errors for the rest.
+
+    Raises ValueError past IMPORT_ROW_LIMIT rows.
+    """
+    seen = set()
+    for line, row in enumerate(rows, 1):
+        if line > IMPORT_ROW_LIMIT + 1:
+            raise ValueError(f"Uploads are limited to {IMPORT_ROW_LIMIT} rows")
+        if not any(field.strip() for field in row):
+            continue
+        if line == 1 and row[0].strip().lower() == 'username':
+            continue  # Header
+        username = row[0].strip()
+        password = row[1] if len(row) > 1 else ''
+        user_type = row[2].strip().lower() if len(row) > 2 and row[2].strip() else 'student'
+        error = None
+        if not username or not password:
+            error = "Missing username or password"
+        elif user_type not in USER_TYPES:
+            error = "Invalid user type"
+        elif username in seen:
+            error = "Username repeated in upload"
+        if error:
+            errors.append({"line": line, "username": username, "error": error})
+            continue
+        seen.add(username)
+        yield line, username, password, user_type
+
+def handle_roster_import(chunks, session=None):
+    """Create accounts from a CSV upload of username,password[,type] rows.
+
+    chunks iterates over the body's bytes, raising UploadInterrupted if
+    the client disconnects, which imports nothing. Rows are checked as they
+    arrive, and each accepted password is handed to the hash pool straight
+    away, so hashing overlaps reading the upload; then every new account
+    is written in one transaction. Rows with errors, including usernames
+    already taken, are reported by line and skipped; the others still go in.
+    Taken usernames are looked up before hashing, so uploading a roster
+    again costs no hashes for the accounts it already created.
+    """
+    if users is None:
+        return {"error": "User store unavailable"}, 503
+    error = check_teacher(session)
+    if error:
+        return error
+
+    errors = []
+    accepted = []
+    try:
+        for line, username, password, user_type in read_roster_rows(csv.reader(text_lines(chunks)), errors):
+            if users.exists(username):
+                errors.append({"line": line, "username": username, "error": "Username already exists"})
+                continue
+            accepted.append((line, username, user_type, hash_pool.submit(hash_password, password)))
+    except (UnicodeDecodeError, csv.Error, ValueError, UploadInterrupted) as error:
+        for _, _, _, pending in accepted:
+            pending.cancel()
+        if isinstance(error, UploadInterrupted):
+            return {"error": "Upload interrupted"}, 400
+        if isinstance(error, UnicodeDecodeError):
+            return {"error": "Roster must be UTF-8 CSV"}, 400
+        if isinstance(error, csv.Error):
+            return {"error": f"Invalid CSV: {error}"}, 400
+        return {"error": str(error)}, 413
+
+    # Wait for every hash before opening the transaction, which holds the
+    # user store's lock and so blocks logins until it commits
+    accounts = [(username, user_type, pending.result()) for _, username, user_type, pending in accepted]
+    taken = users.add_many(accounts)
+    errors.extend(
+        {"line": line, "username": username, "error": "Username already exists"}
+        for line, username, _, _ in accepted if username in taken
+    )
+    errors.sort(key=lambda error: error['line'])
+    return {"imported": len(accepted) - len(taken), "rejected": len(errors), "errors": errors}, 200
+
+def handle_login(data):
+    """Check a password and start a session; the token authenticates later requests"""
+    if users is None:
+        return {"error": "User store unavailable"}, 503
+    username = data.get('username')
+    password = data.get('password')
+    if not isinstance(username, str) or not isinstance(password, str):
+        return {"error": "Missing username or password"}, 400
+    user_type = users.check(username.strip(), password)
+    if user_type is None:
+        return {"error": "Invalid username or password"}, 401
+    return {"token": sessions.open(username.strip(), user_type), "type": user_type, "username": username.strip()}, 200
+
+def handle_ping(data, session=None):
+    """Handle client heartbeats"""
+    identity = identify(data, session)
+    if identity is None:
+        return LOGIN_REQUIRED
+    client_type, username = identity
+    room = data.get('room') or DEFAULT_ROOM
     
-    if client_type and username:
-        connected_clients[client_type][username] = time.time()
+    if client_type in CLIENT_TYPES and username:
+        connected_clients.beat((room, client_type, username))
         return {"status": "ok"}, 200
     return {"error": "Invalid data"}, 400
 
-@app.route("/attendance", methods=["POST"])
-def update_attendance():
+def handle_heartbeat_session(data, session=None):
+    """Open a UDP heartbeat session; counts as a ping itself"""
+    if not UDP_HEARTBEAT_PORT:
+        return {"error": "UDP heartbeats are disabled"}, 404
+    identity = identify(data, session)
+    if identity is None:
+        return LOGIN_REQUIRED
+    client_type, username = identity
+    room = data.get('room') or DEFAULT_ROOM
+    if not may_open_room(room, session):
+        return UNKNOWN_ROOM
+
+    if client_type in CLIENT_TYPES and username:
+        key = (room, client_type, username)
+        connected_clients.beat(key)
+        return {"token": heartbeat_sessions.open(key, session).hex(), "port": UDP_HEARTBEAT_PORT}, 200
+    return {"error": "Invalid data"}, 400
+
+def handle_heartbeat_datagram(result, key):
+    """Count a UDP heartbeat the same way as a /ping"""
+    metrics.HEARTBEAT_DATAGRAMS.inc(result)
+    if key is not None:
+        connected_clients.beat(key)
+
+def handle_attendance(data, session=None):
     """Update attendance status"""
-    data = request.json
-    username = data.get('username')
+    if REQUIRE_AUTH and session is None:
+        return LOGIN_REQUIRED
+    username = data.get('username') or (session.username if session else None)
     status = data.get('status')
     action = data.get('action')
+    room_name = data.get('room') or DEFAULT_ROOM
+    if not may_open_room(room_name, session):
+        return UNKNOWN_ROOM
+    room = get_room(room_name)
     
     if action == "random_ring":
-        present_students = [
-            student for student, info in attendance_data['students'].items() 
-            if info.get('status') == 'present'
-        ]
-        selected = random.sample(present_students, min(2, len(present_students)))
-        attendance_data['last_ring'] = datetime.now().isoformat()
-        attendance_data['ring_students'] = selected
+        if not is_teacher(session):
+            return NOT_ALLOWED
+        with room.writing():
+            selected = room.students.present.sample(2)
+            set_ring(room, selected)
+        commit_events()
         return {"status": "ring_sent", "students": selected}, 200
     
     if username and status:
-        attendance_data['students'][username] = {
-            'status': status,
-            'last_update': datetime.now().isoformat()
-        }
+        if not may_act_for(session, username):
+            return NOT_ALLOWED
+        status = Status.parse(status)
+        if status is None:
+            return {"error": "Invalid status"}, 400
+        with room.writing():
+            set_student_status(room, username, status)
+        commit_events()
         return {"status": "updated"}, 200
     return {"error": "Missing data"}, 400
 
+def handle_timetable_update(data, session=None):
+    """Replace a room's timetable"""
+    if REQUIRE_AUTH and session is None:
+        return LOGIN_REQUIRED
+    if not is_teacher(session):
+        return NOT_ALLOWED
+    room = get_room(data.get('room') or DEFAULT_ROOM)
+    try:
+        timetable = Timetable(parse_periods(data))
+    except ValueError as error:
+        return {"error": str(error)}, 400
+
+    with room.writing():
+        version = room.timetable.version + 1
+        # Timetables don't change attendance, so the room's seq stays put
+        record_event(room, {
+            'kind': 'timetable',
+            'seq': room.seq,
+            'version': version,
+            'periods': timetable.to_json()
+        })
+    commit_events()
+    return {"status": "updated", "version": version}, 200
+
+def read_timetable(room_name, if_none_match):
+    """Build a GET /timetable response as (status, headers, body)"""
+    room = rooms.get(room_name)
+    # Timetables are replaced, never changed, so no lock is needed to read one
+    timetable = room.timetable if room else Timetable()
+    etag = quote_etag(str(timetable.version))
+    if if_none_match.contains(str(timetable.version)):
+        return 304, [('ETag', etag)], b''
+    return 200, [('Content-Type', 'application/json'), ('ETag', etag)], timetable.body
+
+def check_batch_event(event):
+    """Validate one /ingest_batch event, returning an error message or None"""
+    if not isinstance(event, dict) or not event.get('username'):
+        return "Missing username"
+    kind = event.get('kind')
+    if kind == 'ping':
+        if event.get('type') not in CLIENT_TYPES:
+            return "Invalid client type"
+    elif kind == 'attendance':
+        if not event.get('status'):
+            return "Missing status"
+        if Status.parse(event['status']) is None:
+            return "Invalid status"
+    elif kind != 'left':
+        return "Unknown event kind"
+    if kind != 'ping':
+        event_id, at = event.get('id'), event.get('at')
+        if event_id is not None and (not isinstance(event_id, str) or len(event_id) > EVENT_ID_MAX_LENGTH):
+            return "Invalid id"
+        if at is not None and (isinstance(at, bool) or not isinstance(at, (int, float))):
+            return "Invalid time"
+    return None
+
+def handle_ingest_batch(data, session=None):
+    """Apply a batch of ping, attendance and left events in one pass"""
+    if REQUIRE_AUTH and session is None:
+        return LOGIN_REQUIRED
+    events = data.get('events')
+    if not isinstance(events, list):
+        return {"error": "Missing events"}, 400
+    if len(events) > BATCH_LIMIT:
+        return {"error": f"At most {BATCH_LIMIT} events per batch"}, 413
+
+    results = []
+    changes = defaultdict(list)
+    for event in events:
+        error = check_batch_event(event)
+        if not error and not may_act_for(session, event['username']):
+            error = "Not allowed"
+        if not error and event['kind'] == 'ping' and session and not session.is_teacher \
+                and event['type'] != session.client_type:
+            error = "Not allowed"
+        if error:
+            results.append({"error": error})
+            continue
+        # Events name their own room, falling back to the batch's room
+        room = event.get('room') or data.get('room') or DEFAULT_ROOM
+        if event['kind'] != 'ping' and not may_open_room(room, session):
+            results.append({"error": UNKNOWN_ROOM[0]['error']})
+            continue
+        if event['kind'] == 'ping':
+            connected_clients.beat((room, event['type'], event['username']))
+        else:
+            status = Status.LEFT if event['kind'] == 'left' else Status.parse(event['status'])
+            changes[room].append((len(results), event['username'], status, event.get('at'), event.get('id')))
+        results.append({"status": "ok"})
+
+    # Each room sees its part of the batch as a single change. Replays are
+    # recognized by event id under the write lock, so a batch retried while
+    # the first attempt is still running can't apply twice.
+    applied = False
+    for name, room_changes in changes.items():
+        room = get_room(name)
+        with room.writing():
+            seq = None
+            for index, username, status, at, event_id in room_changes:
+                if event_id and room.seen(event_id):
+                    results[index] = {"status": "duplicate"}
+                    continue
+                seq = seq or room.next_seq()
+                set_student_status(room, username, status, seq, at, event_id)
+                applied = True
+    if applied:
+        commit_events()
+
+    return {"results": results}, 200
+
+def encode_attendance(room, since):
+    """Encode a room snapshot, or its changes after since, as JSON bytes"""
+    return json.dumps({
+        'students': room.students.to_json(since),
+        'last_ring': room.last_ring,
+        'ring_students': room.ring_students,
+        'seq': room.seq,
+        'full': since is None
+    }, separators=(',', ':')).encode()
+
+def read_attendance(room_name, since, if_none_match, accept_encodings):
+    """Build a /get_attendance response as (status, headers, body).
+
+    if_none_match and accept_encodings are parsed werkzeug header values.
+    The ETag is weak: every encoding, and every since for the same seq,
+    shares it, so it only says nothing has changed since seq.
+    """
+    room = read_room(room_name)
+    seq = room.seq
+    etag = quote_etag(str(seq), weak=True)
+    if if_none_match.contains_weak(str(seq)):
+        return 304, [('ETag', etag), ('Vary', 'Accept-Encoding')], b''
+
+    # A cursor from the future means the server restarted, so resend everything
+    if since is not None and since > seq:
+        since = None
+    body = attendance_cache.get(
+        (room_name, since, None), seq,
+        lambda: encode_attendance(room, since)
+    )
+
+    headers = [('Content-Type', 'application/json'), ('ETag', etag), ('Vary', 'Accept-Encoding')]
+    encoding = pick_encoding(accept_encodings)
+    if encoding and len(body) >= COMPRESS_MIN_BYTES:
+        body = attendance_cache.get(
+            (room_name, since, encoding), seq,
+            lambda: COMPRESSORS[encoding](body)
+        )
+        headers.append(('Content-Encoding', encoding))
+    return 200, headers, body
+
+def read_dashboard(room_name, since, timetable_version, if_none_match, accept_encodings):
+    """Build a /dashboard response as (status, headers, body).
+
+    Answers the teacher dashboard's attendance and timetable polls in one
+    round trip: "attendance" is what /get_attendance returns for since,
+    and "timetable" is null if timetable_version is still current. The
+    ETag covers both, as weak W/"<seq>-<timetable version>", as for
+    /get_attendance.
+    """
+    room = rooms.get(room_name)
+    snapshot = read_room(room_name)
+    timetable = room.timetable if room else Timetable()
+    seq = snapshot.seq
+    tag = f"{seq}-{timetable.version}"
+    etag = quote_etag(tag, weak=True)
+    if if_none_match.contains_weak(tag):
+        return 304, [('ETag', etag), ('Vary', 'Accept-Encoding')], b''
+
+    if since is not None and since > seq:
+        since = None
+    # Both parts are already-encoded bodies; splice them rather than re-encode
+    attendance = attendance_cache.get(
+        (room_name, since, None), seq,
+        lambda: encode_attendance(snapshot, since)
+    )
+    current = timetable_version == timetable.version
+    body = b'{"attendance":%s,"timetable":%s}' % (attendance, b'null' if current else timetable.body)
+
+    headers = [('Content-Type', 'application/json'), ('ETag', etag), ('Vary', 'Accept-Encoding')]
+    encoding = pick_encoding(accept_encodings)
+    if encoding and len(body) >= COMPRESS_MIN_BYTES:
+        body = attendance_cache.get(
+            ('dashboard', room_name, since, current, encoding), (seq, timetable.version),
+            lambda: COMPRESSORS[encoding](body)
+        )
+        headers.append(('Content-Encoding', encoding))
+    return 200, headers, body
+
+def parse_time(value):
+    """Parse an ISO 8601 or epoch-seconds query value, or None if invalid"""
+    try:
+        return datetime.fromtimestamp(float(value)).timestamp()
+    except (ValueError, OverflowError, OSError):
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+def parse_window(args, default_end):
+    """Get (start, end, error) from start and end query parameters.
+
+    Times are ISO 8601 or epoch seconds; the window defaults to the week
+    before default_end.
+    """
+    end = parse_time(args['end']) if args.get('end') else default_end
+    start = parse_time(args['start']) if args.get('start') else None
+    if end is None or (args.get('start') and start is None):
+        return None, None, "Invalid time"
+    if start is None:
+        start = end - REPORT_DEFAULT_DAYS * 86400
+    if start >= end:
+        return None, None, "start must be before end"
+    return start, end, None
+
+def read_report(args, session=None):
+    """Report who was present in a room during a window, and for how long.
+
+    args holds the query parameters room, start and end.
+    """
+    error = check_teacher(session)
+    if error:
+        return error
+    now = time.time()
+    start, end, error = parse_window(args, now)
+    if error:
+        return {"error": error}, 400
+
+    room = rooms.get(args.get('room') or DEFAULT_ROOM)
+    present, seconds = [], {}
+    if room:
+        # History isn't part of the published snapshot; queries are quick
+        # enough to run under the write lock
+        with room.lock:
+            present = sorted(room.history.present_between(start, end))
+            seconds = room.history.seconds_between(start, end, now)
+    return {
+        'start': datetime.fromtimestamp(start).isoformat(),
+        'end': datetime.fromtimestamp(end).isoformat(),
+        'present': present,
+        'minutes': {username: round(total / 60, 1) for username, total in sorted(seconds.items())}
+    }, 200
+
+def parse_roster_cursor(cursor, sort):
+    """Get the position a /roster cursor continues after; raises ValueError"""
+    if sort == 'name':
+        return cursor
+    seq, _, username = cursor.partition(':')
+    return int(seq), username
+
+def read_roster(args, session=None):
+    """Get one page of a room's students, filtered and sorted.
+
+    args holds the query parameters room, status (a comma separated list),
+    prefix, sort ("name" or "updated", newest first), limit and cursor,
+    the "next" value of the previous page.
+    """
+    error = check_teacher(session)
+    if error:
+        return error
+    statuses = [Status.parse(name) for name in (args.get('status') or '').split(',') if name]
+    if None in statuses:
+        return {"error": "Invalid status"}, 400
+    statuses = statuses or list(Status)
+    sort = args.get('sort') or 'name'
+    if sort not in ('name', 'updated'):
+        return {"error": "sort must be name or updated"}, 400
+    prefix = args.get('prefix') or ''
+    try:
+        limit = int(args.get('limit') or ROSTER_PAGE_SIZE)
+        after = parse_roster_cursor(args['cursor'], sort) if args.get('cursor') else None
+    except ValueError:
+        return {"error": "Invalid limit or cursor"}, 400
+    if not 0 < limit <= ROSTER_PAGE_LIMIT:
+        return {"error": f"limit must be between 1 and {ROSTER_PAGE_LIMIT}"}, 400
+
+    room = rooms.get(args.get('room') or DEFAULT_ROOM)
+    page, more, total, seq = [], False, 0, 0
+    if room:
+        # The indexes live on the room's store, not its snapshot; a page
+        # reads only its own students, so it's quick enough for the lock
+        with room.lock:
+            page, more = room.students.query(statuses, prefix, sort, after, limit)
+            total = room.students.count(statuses, prefix)
+            seq = room.seq
+    next_cursor = None
+    if more:
+        username, record = page[-1]
+        next_cursor = username if sort == 'name' else f"{record.seq}:{username}"
+    return {
+        'students': [dict(record.to_json(), username=username) for username, record in page],
+        'total': total,
+        'next': next_cursor,
+        'seq': seq
+    }, 200
+
+def format_time(when):
+    return datetime.fromtimestamp(when).isoformat() if when is not None else None
+
+def export_pages(room, kind, start, end):
+    """Yield a room's export rows a page at a time.
+
+    The room lock is held only while a page is read, so writers never wait
+    on a slow download, and only one page is in memory at once. A change
+    made while an export runs may or may not be part of it.
+    """
+    if kind == 'status':
+        after, more = None, True
+        while more:
+            with room.lock:
+                page, more = room.students.query(list(Status), after=after, limit=EXPORT_PAGE_SIZE)
+            if page:
+                after = page[-1][0]
+            yield [
+                (username, Status(record.status).label, format_time(record.last_update), record.period)
+                for username, record in page
+            ]
+        return
+
+    read_page = room.history.intervals_between if kind == 'presence' else room.history.rings_between
+    position = None
+    while True:
+        with room.lock:
+            rows, position = read_page(start, end, position, EXPORT_PAGE_SIZE)
+        if kind == 'presence':
+            yield [(username, format_time(began), format_time(ended)) for username, began, ended in rows]
+        else:
+            yield [(username, format_time(when), answered) for username, when, answered in rows]
+        if position is None:
+            break
+    if kind == 'presence':
+        # Presences still in progress have no end yet
+        with room.lock:
+            still_open = room.history.open_before(end)
+        for offset in range(0, len(still_open), EXPORT_PAGE_SIZE):
+            yield [(username, format_time(began), None)
+                   for username, began in still_open[offset:offset + EXPORT_PAGE_SIZE]]
+
+def csv_cell(value):
+    """Quote a cell a spreadsheet would run as a formula, since students choose their usernames"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def encode_rows(rows, columns, output):
+    """Encode rows as CSV lines or as NDJSON objects keyed by column"""
+    if output == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows([csv_cell(value) for value in row] for row in rows)
+        return buffer.getvalue().encode()
+    return ''.join(
+        json.dumps(dict(zip(columns, row)), separators=(',', ':')) + '\n' for row in rows
+    ).encode()
+
+def read_export(args, session=None):
+    """Build an /export response as (status, headers, chunks), chunks an iterator of bytes.
+
+    args holds the query parameters room, kind ("status" for every
+    student's current status, "presence" for presence intervals or "rings"),
+    format ("csv" or "ndjson"), and start and end as for /report, which
+    bound presence and ring rows. Rows are streamed EXPORT_PAGE_SIZE at a
+    time, so memory stays flat however long the history.
+    """
+    denied = check_teacher(session)
+    if denied:
+        payload, status = denied
+        return status, [('Content-Type', 'application/json')], iter([json.dumps(payload).encode()])
+    kind = args.get('kind') or 'status'
+    output = args.get('format') or 'csv'
+    start, end, error = parse_window(args, time.time())
+    if kind not in EXPORT_COLUMNS:
+        error = "kind must be status, presence or rings"
+    elif output not in EXPORT_FORMATS:
+        error = "format must be csv or ndjson"
+    if error:
+        return 400, [('Content-Type', 'application/json')], iter([json.dumps({"error": error}).encode()])
+
+    room_name = args.get('room') or DEFAULT_ROOM
+    columns = EXPORT_COLUMNS[kind]
+    filename = ''.join(char if char.isalnum() or char in '-_' else '_' for char in room_name)
+
+    def generate():
+        if output == 'csv':
+            yield encode_rows([columns], columns, output)
+        room = rooms.get(room_name)
+        if room:
+            for rows in export_pages(room, kind, start, end):
+                if rows:
+                    yield encode_rows(rows, columns, output)
+
+    return 200, [
+        ('Content-Type', EXPORT_FORMATS[output]),
+        ('Content-Disposition', f'attachment; filename="{filename}-{kind}.{output}"')
+    ], generate()
+
+def read_analytics(args, session=None):
+    """Build an /analytics response as (status, headers, body).
+
+    args holds the query parameters room, start, end and slots, a comma
+    separated list of daily timetable slots like "09:00-09:50". Without
+    slots, the room's timetable supplies them: every distinct start and
+    end time among its periods, whatever the weekday.
+    """
+    denied = check_teacher(session)
+    if denied:
+        payload, status = denied
+        return status, [('Content-Type', 'application/json')], json.dumps(payload).encode()
+    if analytics is None:
+        return 501, [('Content-Type', 'application/json')], b'{"error":"Analytics need NumPy on the server"}'
+    now = time.time()
+    # Open-ended windows end on the next minute, so they share cache entries
+    start, end, error = parse_window(args, math.ceil(now / 60) * 60)
+    room_name = args.get('room') or DEFAULT_ROOM
+    room = rooms.get(room_name) or Room(room_name)
+    if args.get('slots'):
+        try:
+            slots = analytics.parse_slots(args['slots'])
+        except ValueError:
+            error = error or "Invalid slots"
+    else:
+        slots = sorted({(period.start, period.end) for day in room.timetable.days for period in day})
+    if error:
+        return 400, [('Content-Type', 'application/json')], json.dumps({"error": error}).encode()
+
+    # Results covering the present also go stale as time passes
+    version = (room.snapshot.seq, int(now // 60) if end > now else None)
+
+    def compute():
+        with room.lock:
+            copy = analytics.copy_history(room.history, start, end, now)
+        utc_offset = datetime.fromtimestamp(end).astimezone().utcoffset().total_seconds()
+        result = analytics.analyze(analytics.columns(copy, start, end), slots, utc_offset)
+        return json.dumps(dict(
+            result,
+            start=datetime.fromtimestamp(start).isoformat(),
+            end=datetime.fromtimestamp(end).isoformat(),
+            slots=[f"{begin // 3600:02d}:{begin % 3600 // 60:02d}-{finish // 3600:02d}:{finish % 3600 // 60:02d}"
+                   for begin, finish in slots]
+        ), separators=(',', ':')).encode()
+
+    body = analytics_cache.get((room_name, start, end, tuple(slots)), version, compute)
+    return 200, [('Content-Type', 'application/json')], body
+
+def read_stats():
+    """Report server counters"""
+    return {
+        'attendance_cache': attendance_cache.stats(),
+        'analytics_cache': analytics_cache.stats()
+    }, 200
+
+def read_metrics():
+    """Build a /metrics response as (status, headers, body)"""
+    return 200, [('Content-Type', metrics.CONTENT_TYPE)], metrics.REGISTRY.render().encode()
+
+def open_stream(room_name, username, stream):
+    """Subscribe a stream to a student's events and return its hello event.
+
+    stream is anything with put_nowait((event, payload)) that raises
+    queue.Full when the client has fallen behind.
+    """
+    with subscribers_lock:
+        subscribers[(room_name, username)].add(stream)
+
+    # Read after subscribing so a change in between arrives as an event
+    room = read_room(room_name)
+    record = room.students.get(username)
+    return {
+        'status': record.to_json() if record else None,
+        'last_ring': room.last_ring,
+        'ringed': username in room.ring_students
+    }
+
+def close_stream(room_name, username, stream):
+    key = (room_name, username)
+    with subscribers_lock:
+        subscribers[key].discard(stream)
+        if not subscribers[key]:
+            del subscribers[key]
+
+def request_data():
+    """Get the JSON body of the current Flask request as a dict"""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else {}
+
+def request_session():
+    """Get the login session of the current Flask request, or None"""
+    return authenticate(request.headers.get('Authorization'))
+
+@app.errorhandler(404)
+def not_found(error):
+    return {"error": "Not found"}, 404
+
+@app.errorhandler(405)
+def method_not_allowed(error):
+    return {"error": "Method not allowed"}, 405
+
+@app.errorhandler(LogUnavailable)
+def log_unavailable(error):
+    return {"error": "Could not save the change; try again"}, 503
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # Unmatched paths share one label so scanners can't grow the series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe_request(
+        route,
+        time.perf_counter() - g.request_start,
+        response.status_code,
+        request.content_length or 0,
+        response.content_length or 0  # Streams report nothing up front
+    )
+    return response
+
+@app.route("/register", methods=["POST"])
+def register():
+    return handle_register(request_data(), request_session())
+
+@app.route("/login", methods=["POST"])
+def login():
+    return handle_login(request_data())
+
+@app.route("/import_roster", methods=["POST"])
+def import_roster():
+    """Create accounts from a CSV body of username,password[,type] rows"""
+    def chunks():
+        try:
+            yield from iter(lambda: request.stream.read(IMPORT_READ_SIZE), b'')
+        except ClientDisconnected:
+            raise UploadInterrupted from None
+
+    return handle_roster_import(chunks(), request_session())
+
+@app.route("/ping", methods=["POST"])
+def ping():
+    return handle_ping(request_data(), request_session())
+
+@app.route("/heartbeat_session", methods=["POST"])
+def heartbeat_session():
+    return handle_heartbeat_session(request_data(), request_session())
+
+@app.route("/attendance", methods=["POST"])
+def update_attendance():
+    return handle_attendance(request_data(), request_session())
+
+@app.route("/timetable", methods=["GET"])
+def get_timetable():
+    """Get a room's weekly timetable; poll with If-None-Match"""
+    status, headers, body = read_timetable(request.args.get('room') or DEFAULT_ROOM, request.if_none_match)
+    return app.response_class(body, status=status, headers=headers)
+
+@app.route("/timetable", methods=["POST"])
+def update_timetable():
+    return handle_timetable_update(request_data(), request_session())
+
+@app.route("/ingest_batch", methods=["POST"])
+def ingest_batch():
+    return handle_ingest_batch(request_data(), request_session())
+
 @app.route("/get_attendance", methods=["GET"])
 def get_attendance():
-    """Get current attendance data"""
-    return jsonify({
-        'students': attendance_data['students'],
-        'last_ring': attendance_data['last_ring'],
-        'ring_students': attendance_data['ring_students']
-    })
+    """Get a room's attendance data, or only changes after ?since=<seq>"""
+    status, headers, body = read_attendance(
+        request.args.get('room') or DEFAULT_ROOM,
+        request.args.get('since', type=int),
+        request.if_none_match,
+        request.accept_encodings
+    )
+    return app.response_class(body, status=status, headers=headers)
 
-def cleanup_clients():
-    """Periodically clean up disconnected clients"""
-    while True:
-        current_time = time.time()
-        for client_type in ['students', 'teachers']:
-            for username, last_seen in list(connected_clients[client_type].items()):
-                if current_time - last_seen > 60:  # 1 minute timeout
-                    connected_clients[client_type].pop(username, None)
-                    if client_type == 'students':
-                        attendance_data['students'][username]['status'] = 'left'
-                        attendance_data['students'][username]['last_update'] = datetime.now().isoformat()
-        time.sleep(30)
-
-def start_random_rings():
-    """Start periodic random rings"""
-    while True:
-        time.sleep(random.randint(120, 600))  # 2-10 minutes
-        with app.app_context():
-            present_students = [
-                student for student, info in attendance_data['students'].items() 
-                if info.get('status') == 'present'
-            ]
-            if len(present_students) >= 2:
-                selected = random.sample(present_students, min(2, len(present_students)))
-                attendance_data['last_ring'] = datetime.now().isoformat()
-                attendance_data['ring_students'] = selected
+@app.route("/dashboard", methods=["GET"])
+def get_dashboard():
+    """Get a room's attendance changes after ?since=<seq> and its timetable
+    unless ?timetable_version=<version> is current, in one response"""
+    status, headers, body = read_dashboard(
+        request.args.get('room') or DEFAULT_ROOM,
+        request.args.get('since', type=int),
+        request.args.get('timetable_version', type=int),
+        request.if_none_match,
+        request.accept_encodings
+    )
+    return app.response_class(body, status=status, headers=headers)
+
+@app.route("/roster", methods=["GET"])
+def roster():
+    """Page through a room's students with ?status=, ?prefix=, ?sort=, ?limit= and ?cursor="""
+    return read_roster(request.args, request_session())
+
+@app.route("/report", methods=["GET"])
+def report():
+    """Get who was present in a room between ?start= and ?end=, and for how long"""
+    return read_report(request.args, request_session())
+
+@app.route("/export", methods=["GET"])
+def export():
+    """Stream a room's statuses, presence intervals or rings as CSV or NDJSON"""
+    status, headers, chunks = read_export(request.args, request_session())
+    return app.response_class(chunks, status=status, headers=headers)
+
+@app.route("/analytics", methods=["GET"])
+def get_analytics():
+    """Get per-student attendance metrics for a room over ?start= to ?end="""
+    status, headers, body = read_analytics(request.args, request_session())
+    return app.response_class(body, status=status, headers=headers)
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return read_stats()
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Expose server metrics in the Prometheus text format"""
+    status, headers, body = read_metrics()
+    return app.response_class(body, status=status, headers=headers)
+
+@app.route("/events", methods=["GET"])
+def events():
+    """Stream ring and status notifications for one student over SSE"""
+    username = request.args.get('username')
+    if not username:
+        return {"error": "Missing username"}, 400
+    error = check_stream(username, request_session())
+    if error:
+        return error
+    room_name = request.args.get('room') or DEFAULT_ROOM
+
+    stream = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    hello = open_stream(room_name, username, stream)
+
+    def generate():
+        try:
+            yield format_event('hello', hello)
+            while True:
+                try:
+                    event, payload = stream.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event, payload)
+        finally:
+            close_stream(room_name, username, stream)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
+def schedule_ring(room):
+    """Schedule the next random ring for a room"""
+    room.ring_job = scheduler.call_later(random.randint(RING_MIN_DELAY, RING_MAX_DELAY), ring_room, room)
+
+# Timer jobs re-arm in a finally: the scheduler only reports a job's
+# exception, so re-arming after the work would stop the timer for good
+
+def ring_room(room):
+    """Ring two present students of a room, then schedule the next ring"""
+    try:
+        with room.writing():
+            present = room.students.present
+            if len(present) >= 2:
+                set_ring(room, present.sample(2))
+    finally:
+        schedule_ring(room)
+
+def expire_clients():
+    """Mark clients gone once their heartbeat deadline passes, then re-arm"""
+    try:
+        for key in connected_clients.expire():
+            heartbeat_sessions.close(key)
+            room_name, client_type, username = key
+            # Pings can name any room; only rooms with state have anyone to mark
+            room = rooms.get(room_name)
+            if client_type == 'students' and room:
+                with room.writing():
+                    set_student_status(room, username, Status.LEFT)
+    finally:
+        # Nothing pending means nothing can expire before a fresh ping would
+        deadline = connected_clients.next_deadline()
+        delay = CLIENT_TIMEOUT if deadline is None else deadline - time.time()
+        scheduler.call_later(max(delay, 0), expire_clients)
+
+def purge_sessions():
+    """Drop expired login sessions, then re-arm"""
+    try:
+        sessions.purge()
+        heartbeat_sessions.purge()
+    finally:
+        scheduler.call_later(SESSION_PURGE_INTERVAL, purge_sessions)
+
+def capture_room(room):
+    # Taking the lock waits out any change whose event is already in the log
+    with room.lock:
+        data = room.capture()
+        # Events are logged under the room lock, so every event of this room
+        # up to here is in the capture and none after it; restore skips those
+        # the capture already holds, as history can't apply one twice
+        data['lsn'] = event_log.appended if event_log else 0
+        return data
+
+def capture_state():
+    """Build a JSON-ready snapshot of every room and the connected clients"""
+    return {
+        'rooms': {name: capture_room(room) for name, room in list(rooms.items())},
+        'connected_clients': [
+            [room_name, client_type, username, last_seen]
+            for (room_name, client_type, username), last_seen
+            in list(connected_clients.last_seen.items())
+        ]
+    }
+
+def restore_state():
+    """Open the user store, load the latest snapshot, replay the log tail and open the log for writing"""
+    global event_log, users, sessions
+    users = UserStore(os.path.join(DATA_DIR, 'users.db'))
+    sessions = Sessions(users, SESSION_LIFETIME)
+    event_log = EventLog(DATA_DIR)
+    snapshot, events = event_log.load()
+    captured = {}  # Room name -> lsn its snapshot covers
+    if snapshot:
+        for name, data in snapshot['rooms'].items():
+            get_room(name).restore(data)
+            captured[name] = data.get('lsn', snapshot['lsn'])
+        # Clients that stay silent after the restart expire on their old deadline;
+        # the tracker needs them in heartbeat order
+        for room_name, client_type, username, last_seen in sorted(
+            snapshot['connected_clients'], key=lambda client: client[3]
+        ):
+            connected_clients.beat((room_name, client_type, username), now=last_seen)
+    for event in events:
+        if event['lsn'] > captured.get(event['room'], 0):
+            get_room(event['room']).apply(event)
+    for room in rooms.values():
+        room.publish()
+    event_log.start()
+
+def compact_state(compacted_lsn=0):
+    """Compact the event log into a snapshot if anything was logged, then re-arm"""
+    try:
+        if event_log.appended != compacted_lsn:
+            lsn = event_log.appended
+            event_log.compact(capture_state)
+            compacted_lsn = lsn
+    finally:
+        scheduler.call_later(SNAPSHOT_INTERVAL, compact_state, compacted_lsn)
 
 if __name__ == "__main__":
-    # Start cleanup thread
-    threading.Thread(target=cleanup_clients, daemon=True).start()
+    # Load persisted attendance before serving anything
+    restore_state()
     
-    # Start random ring thread
-    threading.Thread(target=start_random_rings, daemon=True).start()
+    # Start timers for heartbeat expiry, log compaction and session expiry; rooms add their own rings
+    scheduler.call_later(0, expire_clients)
+    scheduler.call_later(SNAPSHOT_INTERVAL, compact_state, event_log.appended)
+    scheduler.call_later(SESSION_PURGE_INTERVAL, purge_sessions)
+    scheduler.start()
+
+    # Lightweight heartbeats arrive on their own UDP port next to the HTTP one
+    if UDP_HEARTBEAT_PORT:
+        HeartbeatListener(heartbeat_sessions, handle_heartbeat_datagram, "0.0.0.0", UDP_HEARTBEAT_PORT).start()
     
-    app.run(host="0.0.0.0", port=5000)
+    app.run(host="0.0.0.0", port=PORT)
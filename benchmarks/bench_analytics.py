@@ -0,0 +1,61 @@
+"""Time semester analytics for a whole class.
+
+Builds the same semester as bench_history.py, with rings, and times
+copying it out under the room lock, building columns and computing every
+metric, with and without timetable slots.
+
+Run from the repository root:
+
+    python benchmarks/bench_analytics.py [--students 1000] [--days 100]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+from bench_history import DAY, SEMESTER_START, build_history
+
+SLOTS = "09:00-09:50,10:00-10:50,14:00-14:50,15:00-15:50"
+
+def add_rings(history, students, days):
+    for day in range(days):
+        for ring in range(4):
+            when = SEMESTER_START + day * DAY + 9 * 3600 + ring * 1800
+            selected = random.sample(range(students), 2)
+            history.ring([f"student{number}" for number in selected], when)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    history = build_history(args.students, args.days)
+    add_rings(history, args.students, args.days)
+    end = SEMESTER_START + args.days * DAY
+    print(f"{len(history)} intervals, {len(history.ring_times)} ring selections")
+
+    for label, slots in (("without slots", []), ("with 4 slots", analytics.parse_slots(SLOTS))):
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            copy = analytics.copy_history(history, SEMESTER_START, end, end)
+        copied = (time.perf_counter() - start) / args.repeats
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            columns = analytics.columns(copy, SEMESTER_START, end)
+        loaded = (time.perf_counter() - start) / args.repeats
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            result = analytics.analyze(columns, slots, 0)
+        analyzed = (time.perf_counter() - start) / args.repeats
+        print(f"{label:>14}: copy under lock {copied * 1e3:.1f} ms, columns {loaded * 1e3:.0f} ms, "
+              f"analyze {analyzed * 1e3:.0f} ms "
+              f"({result['class_days']} class days, {len(result['students'])} students)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Time attendance table refreshes in the teacher dashboard.
+
+Compares rebuilding the Treeview on every poll, as the dashboard used to,
+with AttendanceTable applying only what changed, for a full listing and
+for a typical delta. Times are main loop time per refresh, summed over
+every slice. Needs a display (or Xvfb).
+
+Run from the repository root:
+
+    python benchmarks/bench_dashboard.py [--students 100 500 2000] [--changed 10]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tkinter as tk
+from tkinter import ttk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ndsir import AttendanceTable
+
+def listing(students, seed):
+    return {
+        f"student{number}": {'status': random.choice(('present', 'left')), 'last_update': seed + number}
+        for number in range(students)
+    }
+
+def rebuild(tree, students):
+    """The old refresh: delete every row and insert every student again"""
+    for row in tree.get_children():
+        tree.delete(row)
+    for student, info in students.items():
+        tree.insert("", tk.END, values=(student, info['status'].capitalize(), info['last_update']))
+
+def settle(root, table):
+    """Run the main loop until the table has applied everything queued"""
+    while table.refresh_seconds is not None:
+        root.update()
+
+def make_tree(root):
+    tree = ttk.Treeview(root, columns=("Student", "Status", "Last Update"), show="headings")
+    tree.pack()
+    return tree
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--changed", type=int, default=10, help="students changed per delta")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        sys.exit(f"No display: {error}")
+
+    for students in args.students:
+        full = listing(students, 0)
+        tree = make_tree(root)
+        rebuild(tree, full)
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            rebuild(tree, full)
+            root.update()
+        rebuilt = (time.perf_counter() - start) / args.rounds
+        tree.destroy()
+
+        table = AttendanceTable(root, make_tree(root))
+        table.update({'full': True, 'students': full})
+        settle(root, table)
+        initial = table.refresh_ms
+        delta_ms = []
+        for round_number in range(args.rounds):
+            changed = random.sample(sorted(full), min(args.changed, students))
+            table.update({'full': False, 'students': {
+                student: {'status': 'present', 'last_update': round_number} for student in changed
+            }})
+            settle(root, table)
+            delta_ms.append(table.refresh_ms)
+        table.update({'full': True, 'students': listing(students, 1)})
+        settle(root, table)
+        resync = table.refresh_ms
+        table.tree.destroy()
+
+        print(f"{students:>5} students: rebuild {rebuilt * 1e3:7.1f} ms | "
+              f"diffed: first load {initial:7.1f} ms, {args.changed}-row delta "
+              f"{sum(delta_ms) / len(delta_ms):5.2f} ms, full resync {resync:7.1f} ms")
+    root.destroy()
+
+if __name__ == "__main__":
+    main()
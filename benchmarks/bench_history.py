@@ -0,0 +1,74 @@
+"""Time presence history queries over a semester of intervals.
+
+Builds a room where every student attends two sessions on each school
+day, then times "who was present during this class" and "presence
+minutes per student this week" queries, plus a capture and restore.
+
+Run from the repository root:
+
+    python benchmarks/bench_history.py [--students 1000] [--days 100]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import PresenceHistory
+from student_store import Status
+
+DAY = 86400
+SEMESTER_START = 1767225600.0  # Some Monday; only differences matter
+
+def build_history(students, days):
+    history = PresenceHistory()
+    for day in range(days):
+        for session_start in (9 * 3600, 14 * 3600):
+            base = SEMESTER_START + day * DAY + session_start
+            # Students arrive and leave at scattered times around each session
+            events = []
+            for number in range(students):
+                arrive = base + random.uniform(-300, 600)
+                events.append((arrive, f"student{number}", Status.PRESENT))
+                events.append((arrive + random.uniform(1800, 5400), f"student{number}", Status.LEFT))
+            for when, username, status in sorted(events):
+                history.record(username, status, when)
+    return history
+
+def time_query(query, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = query()
+    return (time.perf_counter() - start) / repeats, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    history = build_history(args.students, args.days)
+    print(f"{len(history)} intervals recorded in {time.perf_counter() - start:.2f}s")
+
+    middle = SEMESTER_START + args.days // 2 * DAY
+    class_start, class_end = middle + 10 * 3600, middle + 10 * 3600 + 50 * 60
+    cost, present = time_query(lambda: history.present_between(class_start, class_end), args.repeats)
+    print(f"present during one class: {cost * 1e3:.2f} ms ({len(present)} students)")
+
+    week_end = middle + 7 * DAY
+    cost, totals = time_query(lambda: history.seconds_between(middle, week_end, week_end), args.repeats)
+    print(f"minutes per student over a week: {cost * 1e3:.2f} ms ({len(totals)} students)")
+
+    start = time.perf_counter()
+    snapshot = history.capture()
+    captured = time.perf_counter() - start
+    start = time.perf_counter()
+    PresenceHistory().restore(snapshot)
+    print(f"capture {captured:.2f}s, restore {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
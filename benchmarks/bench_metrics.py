@@ -0,0 +1,66 @@
+"""Measure what the /metrics instrumentation costs on the hot path.
+
+Times the bare instruments, then runs pings, attendance updates and
+attendance reads through the Flask app and reports the instruments'
+share of each request. Timing whole requests with the instruments on and
+off is left out: run-to-run noise there is larger than the difference.
+The event log is not opened, so no disk time dilutes the share.
+
+Run from the repository root:
+
+    python benchmarks/bench_metrics.py [--requests 5000] [--rounds 3]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import baderia
+import metrics
+
+# route -> (request maker, room writes per request)
+REQUESTS = {
+    '/ping': (lambda client, i: client.post('/ping', json={'type': 'students', 'username': f's{i % 500}'}), 0),
+    '/attendance': (lambda client, i: client.post('/attendance', json={'username': f's{i % 500}', 'status': 'present'}), 1),
+    '/get_attendance': (lambda client, i: client.get('/get_attendance'), 0),
+}
+
+def instrument_cost(calls):
+    """Seconds per observe_request() and per lock wait observation"""
+    start = time.perf_counter()
+    for i in range(calls):
+        metrics.observe_request('/bench', 0.0003, 200, 40, 20)
+    per_request = (time.perf_counter() - start) / calls
+    start = time.perf_counter()
+    for i in range(calls):
+        metrics.LOCK_WAIT_SECONDS.observe(0.000001)
+    return per_request, (time.perf_counter() - start) / calls
+
+def run(client, make_request, count):
+    start = time.perf_counter()
+    for i in range(count):
+        make_request(client, i)
+    return (time.perf_counter() - start) / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    per_request, per_lock_wait = instrument_cost(100000)
+    print(f"observe_request: {per_request * 1e6:.2f} us, lock wait observation: {per_lock_wait * 1e6:.2f} us")
+
+    baderia.REQUIRE_AUTH = False  # Post as any student, without logging in
+    client = baderia.app.test_client()
+    for route, (make_request, writes) in REQUESTS.items():
+        run(client, make_request, args.requests // 10)  # Warm up
+        elapsed = min(run(client, make_request, args.requests) for _ in range(args.rounds))
+        cost = per_request + writes * per_lock_wait
+        print(f"{route:>16}: {elapsed * 1e6:7.1f} us per request, {cost * 1e6:.2f} us instrumentation "
+              f"({cost / elapsed:.1%})")
+
+if __name__ == "__main__":
+    main()
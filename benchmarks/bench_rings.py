@@ -0,0 +1,99 @@
+"""Measure random ring cost against class size and check sampling uniformity.
+
+Rings must pick two distinct present students, each equally likely, even
+after students leave and the index swaps members around. A chi-square
+test over the pick counts fails (exits non-zero) if uniform picks would
+give counts that skewed with probability under --alpha.
+
+Run from the repository root:
+
+    python benchmarks/bench_rings.py [--sizes 50 5000 50000] [--draws 200000] [--alpha 0.001]
+"""
+import os
+import sys
+import math
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from student_store import Status, StudentStore
+
+def build_store(count):
+    """Enroll count students with two thirds of them present and churned"""
+    store = StudentStore()
+    for i in range(count):
+        store.set(f"student{i}", Status.PRESENT, 0.0, i)
+    for i in range(0, count, 3):
+        store.set(f"student{i}", Status.LEFT, 0.0, count + i)
+    return store
+
+def ring_cost(store, rings):
+    start = time.perf_counter()
+    for _ in range(rings):
+        store.present.sample(2)
+    return (time.perf_counter() - start) / rings
+
+def chi_square(store, draws):
+    """Chi-square statistic of how often each present student was picked,
+    and the number of rings that weren't two distinct present students.
+
+    Who is present comes from the records, not the index being sampled,
+    so a student the index failed to drop counts as an invalid pick.
+    """
+    counts = {username: 0 for username, record in store.items() if record.status == Status.PRESENT}
+    invalid = 0
+    for _ in range(draws):
+        picked = store.present.sample(2)
+        if len(set(picked)) != 2 or not all(username in counts for username in picked):
+            invalid += 1
+            continue
+        for username in picked:
+            counts[username] += 1
+    expected = draws * 2 / len(counts)
+    return sum((seen - expected) ** 2 / expected for seen in counts.values()), len(counts) - 1, invalid
+
+def chi_square_p_value(statistic, freedom):
+    """Upper tail probability of a chi-square statistic.
+
+    Wilson-Hilferty: the cube root of chi-square over its degrees of
+    freedom is close to normal, plenty accurate at a few hundred degrees.
+    """
+    mean = 1 - 2 / (9 * freedom)
+    z = ((statistic / freedom) ** (1 / 3) - mean) / math.sqrt(2 / (9 * freedom))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 5000, 50000])
+    parser.add_argument("--rings", type=int, default=100000)
+    parser.add_argument("--draws", type=int, default=200000)
+    parser.add_argument("--alpha", type=float, default=0.001,
+                        help="fail if uniform picks would look this skewed less often than this")
+    parser.add_argument("--seed", type=int, help="seed the picks, to rerun a failure")
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    for count in args.sizes:
+        store = build_store(count)
+        cost = ring_cost(store, args.rings)
+        print(f"{count:>7} enrolled, {len(store.present):>6} present: {cost * 1e6:.2f} us per ring")
+
+    # build_store() churns the class, so members have been swapped around
+    store = build_store(300)
+    statistic, freedom, invalid = chi_square(store, args.draws)
+    p_value = chi_square_p_value(statistic, freedom)
+    print(f"uniformity over {freedom + 1} present students: chi-square {statistic:.1f} "
+          f"with {freedom} degrees of freedom, p = {p_value:.3f}")
+    if invalid:
+        print(f"FAIL: {invalid} rings weren't two distinct present students")
+    if p_value < args.alpha:
+        print(f"FAIL: picks aren't uniform (p < {args.alpha})")
+    if invalid or p_value < args.alpha:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark the attendance event log: group commit throughput and startup replay.
+
+Run from the repository root:
+
+    python benchmarks/bench_storage.py [--events 100000] [--writers 32]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import importlib
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import baderia
+from storage import EventLog
+
+def status_event(seq):
+    return {
+        'kind': 'status',
+        'room': f"room{seq % 50}",
+        'seq': seq,
+        'username': f"student{seq % 5000}",
+        'status': 'present' if seq % 3 else 'left',
+        'last_update': 1767258000.0
+    }
+
+def write_log(directory, events, writers):
+    """Append events from concurrent writers that each wait for their commit"""
+    log = EventLog(directory)
+    log.start()
+    per_writer = events // writers
+    counter = iter(range(1, per_writer * writers + 1))
+    lock = threading.Lock()
+
+    def writer():
+        for _ in range(per_writer):
+            with lock:
+                seq = next(counter)
+            log.append(status_event(seq))
+            log.commit()
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return log, per_writer * writers, elapsed
+
+def time_restore(directory):
+    """Time a cold start of the server state from the given data directory"""
+    importlib.reload(baderia)
+    baderia.DATA_DIR = directory
+    start = time.perf_counter()
+    baderia.restore_state()
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(len(room.students) for room in baderia.rooms.values())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--writers", type=int, default=32)
+    parser.add_argument("--tail", type=int, default=5000, help="events logged after the snapshot")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="attendance-bench-")
+    try:
+        log, written, elapsed = write_log(directory, args.events, args.writers)
+        print(f"append+commit: {written} events from {args.writers} writers in {elapsed:.2f}s "
+              f"({written / elapsed:,.0f} events/s, {log.fsyncs} fsyncs, "
+              f"{written / max(log.fsyncs, 1):.1f} events per fsync)")
+
+        elapsed, students = time_restore(directory)
+        print(f"startup, full replay of {written} events: {elapsed * 1000:.1f} ms ({students} students)")
+
+        # Compact everything but a short tail into a snapshot, then restart again
+        baderia.event_log.compact(baderia.capture_state)
+        for seq in range(written + 1, written + args.tail + 1):
+            baderia.event_log.append(status_event(seq))
+        baderia.event_log.commit()
+        elapsed, students = time_restore(directory)
+        print(f"startup, snapshot + {args.tail} event tail: {elapsed * 1000:.1f} ms ({students} students)")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
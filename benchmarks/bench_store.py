@@ -0,0 +1,81 @@
+"""Compare the old dict-of-ISO-strings student layout with StudentStore.
+
+Run from the repository root:
+
+    python benchmarks/bench_store.py [--students 10000 100000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from collections import defaultdict, OrderedDict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from student_store import Status, StudentStore
+
+class DictLayout:
+    """The previous layout: nested dicts with ISO strings plus a change log"""
+
+    def __init__(self):
+        self.students = defaultdict(dict)
+        self.changes = OrderedDict()
+
+    def set(self, username, status, seq):
+        self.students[username] = {
+            'status': status,
+            'last_update': datetime.now().isoformat()
+        }
+        self.changes[username] = seq
+        self.changes.move_to_end(username)
+
+    def to_json(self):
+        return self.students
+
+class StoreLayout:
+    def __init__(self):
+        self.students = StudentStore()
+
+    def set(self, username, status, seq):
+        self.students.set(username, Status.parse(status), time.time(), seq)
+
+    def to_json(self):
+        return self.students.to_json()
+
+def measure(layout_class, count):
+    names = [f"student{i}" for i in range(count)]
+
+    tracemalloc.start()
+    layout = layout_class()
+    for seq, username in enumerate(names, 1):
+        layout.set(username, 'present', seq)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for seq, username in enumerate(names, count + 1):
+        layout.set(username, 'left', seq)
+    updates = count / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    json.dumps(layout.to_json())
+    encode = time.perf_counter() - start
+    return memory, updates, encode
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'layout':<8} {'students':>9} {'memory':>10} {'bytes/student':>14} {'updates/s':>12} {'full encode':>12}")
+    for count in args.students:
+        for name, layout_class in (("dict", DictLayout), ("store", StoreLayout)):
+            memory, updates, encode = measure(layout_class, count)
+            print(f"{name:<8} {count:>9} {memory / 2**20:>8.1f}MB {memory / count:>14.0f} "
+                  f"{updates:>12,.0f} {encode * 1000:>10.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Time "which period is on now" lookups against timetable size.
+
+Run from the repository root:
+
+    python benchmarks/bench_timetable.py [--periods 8 64 512] [--lookups 200000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timetable import Period, Timetable, WEEKDAYS
+
+def build_timetable(per_day):
+    """per_day back-to-back periods on every weekday, filling the day"""
+    length = 86400 // per_day
+    return Timetable([
+        Period(weekday, number * length, (number + 1) * length - 60, f"subject{number}")
+        for weekday in range(len(WEEKDAYS))
+        for number in range(per_day)
+    ])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--periods", type=int, nargs="+", default=[8, 64, 512])
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+
+    moments = [1767225600 + random.uniform(0, 7 * 86400) for _ in range(args.lookups)]
+    for per_day in args.periods:
+        timetable = build_timetable(per_day)
+        start = time.perf_counter()
+        active = sum(timetable.active(moment) is not None for moment in moments)
+        cost = (time.perf_counter() - start) / args.lookups
+        print(f"{per_day:>4} periods a day: {cost * 1e6:.2f} us per lookup ({active / args.lookups:.0%} in a period)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Measure what watching the WiFi connection costs the student client.
+
+Compares the old approach, running iwgetid (netsh on Windows) on every
+check, at the rate the client used to check (once a second from the
+timer, once a second while waiting to reconnect, every 5 seconds for the
+status line), with WifiMonitor keeping the state cached. Reports process
+spawns and CPU seconds (this process and its children) per minute.
+
+Run from the repository root:
+
+    python benchmarks/bench_wifi.py [--seconds 20] [--checks-per-second 2.2]
+"""
+import os
+import sys
+import time
+import argparse
+import platform
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wifi import WifiMonitor
+
+def legacy_check():
+    """The check animesh.py used to run on every call"""
+    try:
+        if platform.system() == "Windows":
+            result = subprocess.run(
+                ["netsh", "wlan", "show", "interfaces"],
+                capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW
+            )
+            return any("SSID" in line and "BSSID" not in line for line in result.stdout.splitlines())
+        return bool(subprocess.run(["iwgetid", "-r"], capture_output=True, text=True).stdout.strip())
+    except OSError:
+        return False
+
+def cpu_seconds():
+    """CPU time of this process and its finished children"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def measure(run, seconds):
+    cpu = cpu_seconds()
+    spawns = run(seconds)
+    return spawns * 60 / seconds, (cpu_seconds() - cpu) * 60 / seconds
+
+def run_legacy(rate):
+    def run(seconds):
+        spawns = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            legacy_check()
+            spawns += 1
+            time.sleep(1 / rate)
+        return spawns
+    return run
+
+def run_monitor(seconds):
+    monitor = WifiMonitor().start()
+    # Callers now only read the cached value, which costs nothing to measure
+    time.sleep(seconds)
+    return monitor.spawns
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--checks-per-second", type=float, default=2.2,
+                        help="old checks a second; 1.2 while connected, 2.2 while waiting to reconnect")
+    args = parser.parse_args()
+
+    for label, run in (("subprocess per check", run_legacy(args.checks_per_second)),
+                       ("WifiMonitor", run_monitor)):
+        spawns, cpu = measure(run, args.seconds)
+        print(f"{label:>20}: {spawns:6.1f} spawns/min, {cpu * 1000:7.1f} ms CPU/min")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""Load generator and latency benchmark for the attendance server.
+
+Simulates N students behaving like animesh.py's StudentClient (login ping,
+periodic pings and attendance changes coalesced into /ingest_batch posts
+like client.EventSender, an open /events notification stream) and M
+teachers behaving like ndsir.py's TeacherDashboard (delta polling of
+/dashboard with If-None-Match, occasional random rings). For each
+student count it starts a fresh local server, runs the load, and reports
+per-route throughput, p50/p95/p99 latency and error rate, ring delivery
+latency and server RSS as JSON, so runs of different versions can be
+diffed.
+
+Run from the repository root:
+
+    python benchmarks/loadgen.py --students 100 500 2000 --duration 30 --output run.json
+    python benchmarks/loadgen.py --server asgi --ping-interval 5
+    python benchmarks/loadgen.py --url http://127.0.0.1:5000 --students 200   # existing server
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'flask': [sys.executable, 'baderia.py'],
+    'asgi': [sys.executable, 'asgi_server.py']
+}
+
+BATCH_WINDOW = 0.5  # client.BATCH_WINDOW
+
+class HttpError(Exception):
+    pass
+
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client, enough for the attendance routes"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def send(self, method, path, body=None, headers=None):
+        if self.writer is None:
+            await self.connect()
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}"]
+        payload = b''
+        if body is not None:
+            payload = json.dumps(body).encode()
+            lines += ["Content-Type: application/json", f"Content-Length: {len(payload)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + payload)
+        await self.writer.drain()
+
+    async def read_head(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HttpError("connection closed")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def request(self, method, path, body=None, headers=None):
+        """Send a request and read the whole response; returns (status, headers, body)"""
+        try:
+            await self.send(method, path, body, headers)
+            status, response_headers = await self.read_head()
+            if response_headers.get('transfer-encoding') == 'chunked':
+                data = b''
+                while True:
+                    size = int((await self.reader.readline()).strip(), 16)
+                    chunk = await self.reader.readexactly(size + 2)
+                    if size == 0:
+                        break
+                    data += chunk[:-2]
+            elif 'content-length' in response_headers:
+                data = await self.reader.readexactly(int(response_headers['content-length']))
+            elif status == 304:
+                data = b''
+            else:
+                data = await self.reader.read()
+                self.close()
+            if response_headers.get('connection', '').lower() == 'close':
+                self.close()
+            return status, response_headers, data
+        except (OSError, asyncio.IncompleteReadError, HttpError, ValueError):
+            self.close()
+            raise
+
+class Recorder:
+    """Latency samples and error counts per route"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.ring_latencies = []
+        # The ring event can beat the ring's own HTTP response, so whichever
+        # side sees a student second computes the delivery latency
+        self.rings_sent = {}
+        self.rings_received = {}
+
+    def ring_sent(self, username, sent):
+        received = self.rings_received.pop(username, None)
+        if received is not None and received >= sent:
+            self.ring_latencies.append((received - sent) * 1000)
+        else:
+            self.rings_sent[username] = sent
+
+    def ring_received(self, username):
+        received = time.perf_counter()
+        sent = self.rings_sent.pop(username, None)
+        if sent is not None:
+            self.ring_latencies.append((received - sent) * 1000)
+        else:
+            self.rings_received[username] = received
+
+    async def call(self, connection, route, method, path, body=None, headers=None):
+        start = time.perf_counter()
+        try:
+            status, response_headers, data = await connection.request(method, path, body, headers)
+        except Exception:
+            self.errors[route] += 1
+            return None, None, None
+        self.latencies[route].append((time.perf_counter() - start) * 1000)
+        if status >= 400:
+            self.errors[route] += 1
+        return status, response_headers, data
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+class Batcher:
+    """Follow client.EventSender: queue events and post them together to
+    /ingest_batch every batch window, dropping a ping while one is queued"""
+
+    def __init__(self, recorder, connection, window):
+        self.recorder = recorder
+        self.connection = connection
+        self.window = window
+        self.events = []
+        self.ready = asyncio.Event()
+
+    def send(self, event):
+        if event['kind'] == 'ping' and any(queued['kind'] == 'ping' for queued in self.events):
+            return
+        if event['kind'] != 'ping':
+            event = dict(event, id=uuid.uuid4().hex, at=time.time())
+        self.events.append(event)
+        self.ready.set()
+
+    async def run(self, stop):
+        while not stop.is_set():
+            await self.ready.wait()
+            await asyncio.sleep(self.window)
+            events, self.events = self.events, []
+            self.ready.clear()
+            status, _, _ = await self.recorder.call(
+                self.connection, '/ingest_batch', 'POST', '/ingest_batch', {'events': events}
+            )
+            if status != 200:
+                # Kept for the next batch, as the sender does
+                self.events[:0] = events
+                self.ready.set()
+
+async def student(recorder, host, port, username, args, stop):
+    """Follow StudentClient: login ping, attendance, stream, periodic pings"""
+    await asyncio.sleep(random.uniform(0, args.ramp))
+    batcher = Batcher(recorder, Connection(host, port), args.batch_window)
+    sender = asyncio.ensure_future(batcher.run(stop))
+    stream = asyncio.ensure_future(listen(recorder, host, port, username, stop))
+    batcher.send({'kind': 'ping', 'type': 'students', 'username': username})
+    batcher.send({'kind': 'attendance', 'username': username, 'status': 'present'})
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), args.ping_interval * random.uniform(0.9, 1.1))
+        except asyncio.TimeoutError:
+            pass
+        if stop.is_set():
+            break
+        batcher.send({'kind': 'ping', 'type': 'students', 'username': username})
+        # WiFi drops out now and then, like update_timer's "left" then back to present
+        if random.random() < args.churn:
+            batcher.send({'kind': 'left', 'username': username})
+            batcher.send({'kind': 'attendance', 'username': username, 'status': 'present'})
+    sender.cancel()
+    stream.cancel()
+    batcher.connection.close()
+
+async def listen(recorder, host, port, username, stop):
+    """Hold the /events stream open, timing ring delivery"""
+    connection = Connection(host, port)
+    try:
+        await connection.send('GET', f"/events?username={username}")
+        status, _ = await connection.read_head()
+        if status != 200:
+            recorder.errors['/events'] += 1
+            return
+        while not stop.is_set():
+            line = await connection.reader.readline()
+            if not line:
+                recorder.errors['/events'] += 1
+                return
+            if line.startswith(b"event: ring"):
+                recorder.ring_received(username)
+    except (OSError, ValueError, IndexError):
+        recorder.errors['/events'] += 1
+    finally:
+        connection.close()
+
+async def teacher(recorder, host, port, args, stop):
+    """Follow TeacherDashboard: /dashboard delta polls every few seconds, occasional rings"""
+    connection = Connection(host, port)
+    seq = version = None
+    next_ring = time.monotonic() + args.ring_interval
+    while not stop.is_set():
+        params = []
+        headers = {}
+        if seq is not None:
+            params.append(f"since={seq}")
+        if version is not None:
+            params.append(f"timetable_version={version}")
+            if seq is not None:
+                headers['If-None-Match'] = f'"{seq}-{version}"'
+        path = '/dashboard' + ('?' + '&'.join(params) if params else '')
+        status, _, data = await recorder.call(connection, '/dashboard', 'GET', path, headers=headers)
+        if status == 200:
+            data = json.loads(data)
+            seq = data['attendance'].get('seq')
+            if data['timetable'] is not None:
+                version = data['timetable'].get('version')
+
+        if args.ring_interval and time.monotonic() >= next_ring:
+            next_ring += args.ring_interval
+            sent = time.perf_counter()
+            status, _, data = await recorder.call(connection, '/attendance (ring)', 'POST', '/attendance', {'action': 'random_ring'})
+            if status == 200:
+                for username in json.loads(data).get('students', []):
+                    recorder.ring_sent(username, sent)
+        try:
+            await asyncio.wait_for(stop.wait(), args.update_interval)
+        except asyncio.TimeoutError:
+            pass
+    connection.close()
+
+def server_rss(pid):
+    """Resident memory of a process in MB, from /proc where available"""
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process(pid).memory_info().rss / 2**20, 1)
+    except Exception:
+        return None
+
+async def run_step(host, port, students, args):
+    recorder = Recorder()
+    stop = asyncio.Event()
+    tasks = [
+        asyncio.ensure_future(student(recorder, host, port, f"load{number}", args, stop))
+        for number in range(students)
+    ]
+    tasks += [asyncio.ensure_future(teacher(recorder, host, port, args, stop)) for _ in range(args.teachers)]
+
+    # Let everyone log in before measuring steady state
+    await asyncio.sleep(args.ramp)
+    recorder.latencies.clear()
+    recorder.errors.clear()
+    recorder.ring_latencies.clear()
+    start = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return recorder, elapsed
+
+def summarize(recorder, elapsed):
+    routes = {}
+    for route in sorted(set(recorder.latencies) | set(recorder.errors)):
+        samples = recorder.latencies[route]
+        attempts = len(samples) + recorder.errors[route] if route != '/events' else len(samples)
+        routes[route] = {
+            'requests': len(samples),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'errors': recorder.errors[route],
+            'error_rate': round(recorder.errors[route] / attempts, 4) if attempts else None,
+            'p50_ms': percentile(samples, 0.50),
+            'p95_ms': percentile(samples, 0.95),
+            'p99_ms': percentile(samples, 0.99)
+        }
+    return routes
+
+def start_server(kind, port, data_dir):
+    # Simulated clients post as any student instead of logging in
+    env = dict(os.environ, PORT=str(port), ATTENDANCE_DATA_DIR=data_dir, ATTENDANCE_REQUIRE_AUTH='0')
+    process = subprocess.Popen(
+        SERVERS[kind], cwd=REPO, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    # Wait until it answers
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            asyncio.run(Connection('127.0.0.1', port).request('GET', '/stats'))
+            return process
+        except Exception:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit(f"{kind} server did not start on port {port}")
+
+def raise_file_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=REPO, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--teachers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per step")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which students log in")
+    parser.add_argument("--ping-interval", type=float, default=30, help="PING_INTERVAL in animesh.py")
+    parser.add_argument("--batch-window", type=float, default=BATCH_WINDOW, help="BATCH_WINDOW in client.py")
+    parser.add_argument("--update-interval", type=float, default=5, help="UPDATE_INTERVAL in ndsir.py")
+    parser.add_argument("--ring-interval", type=float, default=10, help="seconds between teacher rings, 0 for none")
+    parser.add_argument("--churn", type=float, default=0.05, help="chance per ping of a left/present flap")
+    parser.add_argument("--server", choices=sorted(SERVERS), default='flask')
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    raise_file_limit()
+    report = {
+        'revision': git_revision(),
+        'server': 'external' if args.url else args.server,
+        'config': {name: value for name, value in vars(args).items() if name not in ('output', 'students')},
+        'steps': []
+    }
+    for students in args.students:
+        process = data_dir = None
+        if args.url:
+            parts = urlsplit(args.url)
+            host, port = parts.hostname, parts.port or 80
+        else:
+            data_dir = tempfile.mkdtemp(prefix="attendance-load-")
+            host, port = '127.0.0.1', args.port
+            process = start_server(args.server, port, data_dir)
+        try:
+            recorder, elapsed = asyncio.run(run_step(host, port, students, args))
+            step = {
+                'students': students,
+                'teachers': args.teachers,
+                'seconds': round(elapsed, 2),
+                'routes': summarize(recorder, elapsed),
+                'ring_delivery_ms': {
+                    'count': len(recorder.ring_latencies),
+                    'p50': percentile(recorder.ring_latencies, 0.50),
+                    'p95': percentile(recorder.ring_latencies, 0.95),
+                    'p99': percentile(recorder.ring_latencies, 0.99)
+                },
+                'server_rss_mb': server_rss(process.pid) if process else None
+            }
+            report['steps'].append(step)
+            print(f"{students} students: " + ", ".join(
+                f"{route} p95 {stats['p95_ms']}ms err {stats['errors']}"
+                for route, stats in step['routes'].items()
+            ), file=sys.stderr)
+        finally:
+            if process:
+                process.terminate()
+                process.wait()
+            if data_dir:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""Check that the Flask app and the asyncio app in asgi_server.py behave the same.
+
+Replays one scripted session of pings, attendance updates, batches, rings,
+delta and conditional reads and notification streams against each app,
+starting from fresh state with the same random seed, and diffs status
+codes, key headers and JSON bodies. Timestamps are masked. Exits non-zero
+on any difference.
+
+Run from the repository root:
+
+    python benchmarks/parity_check.py
+"""
+import os
+import sys
+import json
+import gzip
+import random
+import asyncio
+import importlib
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import baderia
+import asgi_server
+from auth import Session, Sessions, UserStore
+
+# Bearer headers for the tokens handed out by earlier /login steps
+TEACHER = {'Authorization': 'Bearer {token:tess}'}
+STUDENT = {'Authorization': 'Bearer {token:asha}'}
+
+# (method, path, query, headers, JSON body or raw bytes); "{seq}" in a header or query
+# value is replaced with the seq from the previous response, "{token:name}"
+# with the token name last logged in with
+SESSION = [
+    ('POST', '/register', {}, {}, {'username': 'tess', 'password': 'chalk', 'type': 'teacher'}),
+    ('POST', '/register', {}, {}, {'username': 'mallory', 'password': 'x', 'type': 'teacher'}),
+    ('POST', '/register', {}, {}, {'username': 'asha', 'password': 'pencil'}),
+    ('POST', '/register', {}, {}, {'username': 'asha', 'password': 'again'}),
+    ('POST', '/register', {}, {}, {'username': 'asha'}),
+    ('POST', '/login', {}, {}, {'username': 'tess', 'password': 'chalk'}),
+    ('POST', '/login', {}, {}, {'username': 'asha', 'password': 'pencil'}),
+    ('POST', '/login', {}, {}, {'username': 'asha', 'password': 'wrong'}),
+    ('POST', '/login', {}, {}, {'username': 'nobody', 'password': 'pencil'}),
+    ('POST', '/register', {}, STUDENT, {'username': 'mallory', 'password': 'x', 'type': 'teacher'}),
+    ('POST', '/import_roster', {}, TEACHER,
+     b'username,password,type\r\nnina,pw1\r\nomar,pw2,Teacher\r\n,nopw\r\nnina,again\r\n'
+     b'asha,x\r\n\r\npat,pw,robot\r\n"quinn, jr",pw3'),
+    ('POST', '/import_roster', {}, STUDENT, b'zed,pw\n'),
+    ('POST', '/import_roster', {}, {}, b'zed,pw\n'),
+    ('POST', '/import_roster', {}, TEACHER, b'zed,\xff\xfe\n'),
+    ('POST', '/login', {}, {}, {'username': 'quinn, jr', 'password': 'pw3'}),
+    ('GET', '/get_attendance', {}, {}, None),
+    ('POST', '/ping', {}, STUDENT, {'type': 'teachers', 'username': 'tess'}),
+    ('POST', '/ping', {}, {}, {'type': 'students', 'username': 'asha'}),
+    ('POST', '/ping', {}, {'Authorization': 'Bearer forged'}, {'type': 'students', 'username': 'asha'}),
+    ('POST', '/attendance', {}, STUDENT, {'status': 'present'}),
+    ('POST', '/attendance', {}, STUDENT, {'username': 'ben', 'status': 'present'}),
+    ('POST', '/attendance', {}, STUDENT, {'action': 'random_ring'}),
+    ('POST', '/attendance', {}, {}, {'username': 'ben', 'status': 'present'}),
+    ('POST', '/ingest_batch', {}, STUDENT, {'events': [
+        {'kind': 'ping', 'type': 'students', 'username': 'asha'},
+        {'kind': 'ping', 'type': 'teachers', 'username': 'asha'},
+        {'kind': 'left', 'username': 'ben'}
+    ]}),
+    ('GET', '/events', {'username': 'ben'}, STUDENT, None),
+    ('GET', '/events', {'username': 'asha'}, {}, None),
+    ('POST', '/timetable', {}, STUDENT, {'timetable': {'09:00-09:50': 'Maths'}}),
+    ('POST', '/ping', {}, TEACHER, {'type': 'students', 'username': 'asha'}),
+    ('POST', '/ping', {}, TEACHER, {'type': 'robots', 'username': 'asha'}),
+    ('POST', '/ping', {}, TEACHER, None),
+    ('POST', '/attendance', {}, TEACHER, {'username': 'asha', 'status': 'present'}),
+    ('POST', '/attendance', {}, TEACHER, {'username': 'ben', 'status': 'present', 'room': 'lab'}),
+    ('POST', '/attendance', {}, TEACHER, {'username': 'ben', 'status': 'sleeping'}),
+    ('POST', '/attendance', {}, TEACHER, {'username': 'ben'}),
+    ('POST', '/ingest_batch', {}, TEACHER, {'events': [
+        {'kind': 'ping', 'type': 'students', 'username': 'chen'},
+        {'kind': 'attendance', 'username': 'chen', 'status': 'present'},
+        {'kind': 'attendance', 'username': 'dev', 'status': 'present'},
+        {'kind': 'left', 'username': 'asha'},
+        {'kind': 'dance', 'username': 'eve'},
+        {'username': ''}
+    ]}),
+    ('POST', '/ingest_batch', {}, TEACHER, {'events': 'nope'}),
+    ('POST', '/ingest_batch', {}, TEACHER, {'events': [
+        {'kind': 'attendance', 'username': 'fay', 'status': 'present', 'id': 'fay-1', 'at': 1},
+        {'kind': 'left', 'username': 'fay', 'id': 'fay-2', 'at': 2},
+        {'kind': 'left', 'username': 'fay', 'id': 'fay-2', 'at': 2},
+        {'kind': 'left', 'username': 'fay', 'id': 7},
+        {'kind': 'left', 'username': 'fay', 'at': 'noon'}
+    ]}),
+    ('POST', '/ingest_batch', {}, TEACHER, {'events': [
+        {'kind': 'attendance', 'username': 'fay', 'status': 'present', 'id': 'fay-1', 'at': 1},
+        {'kind': 'left', 'username': 'fay', 'id': 'fay-2', 'at': 2}
+    ]}),
+    ('GET', '/get_attendance', {}, {}, None),
+    ('GET', '/get_attendance', {}, {'If-None-Match': '"{seq}"'}, None),
+    ('GET', '/get_attendance', {'since': '1'}, {}, None),
+    ('GET', '/get_attendance', {'since': '999'}, {}, None),
+    ('GET', '/get_attendance', {'since': 'x'}, {}, None),
+    ('POST', '/attendance', {}, TEACHER, {'action': 'random_ring'}),
+    ('GET', '/get_attendance', {'room': 'lab'}, {}, None),
+    ('GET', '/get_attendance', {'room': 'nowhere'}, {}, None),
+    ('GET', '/get_attendance', {'room': ''}, {}, None),
+    ('GET', '/events', {}, TEACHER, None),
+    ('GET', '/events', {'username': 'chen'}, TEACHER, None),
+    ('GET', '/get_attendance', {}, {'Accept-Encoding': 'gzip'}, None),
+    ('POST', '/timetable', {}, TEACHER, {'timetable': {'mon-fri 09:00-09:50': 'Maths', '10:00-10:50': 'Art'}}),
+    ('POST', '/timetable', {}, TEACHER, {'timetable': {'09:00-10:00': 'Maths', '09:30-10:30': 'Art'}}),
+    ('POST', '/timetable', {}, TEACHER, {'periods': [{'day': 'someday', 'start': '09:00', 'end': '10:00', 'subject': 'Art'}]}),
+    ('GET', '/timetable', {}, {}, None),
+    ('GET', '/timetable', {}, {'If-None-Match': '"1"'}, None),
+    ('GET', '/timetable', {'room': 'lab'}, {}, None),
+    ('GET', '/timetable', {'room': ''}, {}, None),
+    ('GET', '/analytics', {'start': '0'}, TEACHER, None),
+    ('GET', '/analytics', {'start': '0', 'slots': '08:00-08:30'}, TEACHER, None),
+    ('GET', '/analytics', {}, STUDENT, None),
+    ('DELETE', '/timetable', {}, {}, None),
+    ('GET', '/roster', {'limit': '5'}, TEACHER, None),
+    ('GET', '/roster', {'limit': '5', 'cursor': 'bulk11'}, TEACHER, None),
+    ('GET', '/roster', {'status': 'left,absent', 'sort': 'updated', 'limit': '2'}, TEACHER, None),
+    ('GET', '/roster', {'status': 'present', 'prefix': 'bulk5', 'sort': 'updated', 'cursor': '1:bulk0'}, TEACHER, None),
+    ('GET', '/roster', {'prefix': 'c', 'room': 'lab'}, TEACHER, None),
+    ('GET', '/roster', {'status': 'asleep'}, TEACHER, None),
+    ('GET', '/roster', {'sort': 'updated', 'cursor': 'x'}, TEACHER, None),
+    ('GET', '/roster', {'limit': '0'}, TEACHER, None),
+    ('GET', '/dashboard', {}, {}, None),
+    ('GET', '/dashboard', {'since': '{seq}', 'timetable_version': '1'}, {}, None),
+    ('GET', '/dashboard', {'since': '999', 'timetable_version': 'x', 'room': 'lab'}, {'Accept-Encoding': 'gzip'}, None),
+    ('GET', '/dashboard', {}, {'If-None-Match': '"{seq}-1"'}, None),
+    ('GET', '/dashboard', {'room': ''}, {}, None),
+    ('POST', '/attendance', {}, STUDENT, {'status': 'present', 'room': 'nowhere'}),
+    ('POST', '/ingest_batch', {}, STUDENT, {'events': [
+        {'kind': 'attendance', 'username': 'asha', 'status': 'present', 'room': 'nowhere'},
+        {'kind': 'ping', 'type': 'students', 'username': 'asha', 'room': 'nowhere'},
+        {'kind': 'attendance', 'username': 'asha', 'status': 'present', 'room': 'lab'}
+    ]}),
+    ('GET', '/roster', {}, STUDENT, None),
+    ('GET', '/report', {}, {}, None),
+    ('GET', '/report', {'start': '0'}, TEACHER, None),
+    ('GET', '/export', {}, STUDENT, None),
+    ('POST', '/attendance', {}, TEACHER, {'username': '=HYPERLINK("http://x")', 'status': 'present'}),
+    ('GET', '/export', {}, TEACHER, None),
+    ('GET', '/export', {'format': 'ndjson', 'kind': 'status'}, TEACHER, None),
+    ('GET', '/export', {'format': 'ndjson', 'kind': 'presence', 'start': '0'}, TEACHER, None),
+    ('GET', '/export', {'format': 'ndjson', 'kind': 'rings', 'start': '0'}, TEACHER, None),
+    ('GET', '/export', {'kind': 'presence', 'room': 'nowhere'}, TEACHER, None),
+    ('GET', '/export', {'kind': 'grades'}, TEACHER, None),
+    ('GET', '/export', {'format': 'xlsx'}, TEACHER, None),
+]
+
+def fresh_state():
+    importlib.reload(baderia)
+    importlib.reload(asgi_server)
+    random.seed(1234)
+    baderia.users = UserStore(':memory:')
+    baderia.sessions = Sessions(baderia.users, baderia.SESSION_LIFETIME)
+    setup = Session('setup', 'teacher', float('inf'))
+    for number in range(60):
+        baderia.handle_attendance({'username': f'bulk{number}', 'status': 'present'}, setup)
+
+def mask(value):
+    """Replace timestamps and tokens so runs at different times compare equal"""
+    if isinstance(value, dict):
+        return {
+            key: '<time>' if key in ('last_update', 'last_ring', 'start', 'end', 'time') and item
+            else '<token>' if key == 'token' else mask(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [mask(item) for item in value]
+    return value
+
+def summarize(status, headers, body):
+    headers = {name.lower(): value for name, value in headers}
+    if headers.get('content-encoding') == 'gzip':
+        body = gzip.decompress(body)
+    content_type = headers.get('content-type', '').split(';')[0]
+    if content_type == 'text/event-stream':
+        # Only the hello event is compared; the stream itself never ends
+        body = mask(json.loads(body.split(b'\n')[1][len(b'data: '):]))
+    elif content_type == 'application/x-ndjson':
+        body = [mask(json.loads(line)) for line in body.splitlines()]
+    elif content_type == 'text/csv':
+        # Rows carry timestamps; compare the header and the row count
+        lines = body.decode().splitlines()
+        body = {'header': lines[0], 'rows': len(lines) - 1}
+    elif body:
+        body = mask(json.loads(body))
+    return {
+        'status': status,
+        'content_type': content_type,
+        'etag': headers.get('etag'),
+        'content_encoding': headers.get('content-encoding'),
+        'body': body
+    }
+
+def fill(value, seq, tokens):
+    value = value.replace('{seq}', str(seq))
+    for name, token in tokens.items():
+        value = value.replace(f'{{token:{name}}}', token)
+    return value
+
+def remember_token(body, tokens):
+    """Keep the token of a /login response under its username, unmasked"""
+    if isinstance(body, dict) and 'token' in body:
+        tokens[body['username']] = body['token']
+
+def run_flask():
+    fresh_state()
+    client = baderia.app.test_client()
+    results = []
+    seq = 0
+    tokens = {}
+    for method, path, query, headers, body in SESSION:
+        query = {name: fill(value, seq, tokens) for name, value in query.items()}
+        headers = {name: fill(value, seq, tokens) for name, value in headers.items()}
+        payload = {'data': body} if isinstance(body, bytes) else {'json': body}
+        response = client.open(path, method=method, query_string=query, headers=headers,
+                               buffered=False, **payload)
+        if response.mimetype == 'text/event-stream':
+            data = next(response.response)
+            data = data.encode() if isinstance(data, str) else data
+            response.close()
+        else:
+            data = response.get_data()
+            if path == '/login' and response.status_code == 200:
+                remember_token(json.loads(data), tokens)
+        result = summarize(response.status_code, response.headers.items(), data)
+        seq = result['body'].get('seq', seq) if isinstance(result['body'], dict) else seq
+        results.append(result)
+    return results
+
+async def call_asgi(method, path, query, headers, body):
+    """Run one request through the ASGI app, returning its body; only the
+    first chunk of a notification stream, which never ends"""
+    if isinstance(body, bytes):
+        payload = body
+    elif body is not None:
+        payload = json.dumps(body).encode()
+    else:
+        payload = b''
+    if body is not None and not isinstance(body, bytes):
+        headers = dict(headers, **{'Content-Type': 'application/json'})
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': urlencode(query).encode(),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    }
+    requested = []
+    disconnected = asyncio.Event()
+
+    async def receive():
+        if not requested:
+            requested.append(True)
+            return {'type': 'http.request', 'body': payload, 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    start = {}
+    chunks = []
+    first_chunk = asyncio.Event()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            start.update(message)
+        else:
+            chunks.append(message.get('body', b''))
+            first_chunk.set()
+
+    task = asyncio.ensure_future(asgi_server.app(scope, receive, send))
+    await first_chunk.wait()
+    headers = [(name.decode(), value.decode()) for name, value in start['headers']]
+    if dict(headers).get('content-type', '').startswith('text/event-stream'):
+        disconnected.set()
+        await task
+        return start['status'], headers, chunks[0]
+    await task
+    return start['status'], headers, b''.join(chunks)
+
+def run_asgi():
+    fresh_state()
+    results = []
+    seq = 0
+    tokens = {}
+
+    async def session():
+        nonlocal seq
+        for method, path, query, headers, body in SESSION:
+            query = {name: fill(value, seq, tokens) for name, value in query.items()}
+            headers = {name: fill(value, seq, tokens) for name, value in headers.items()}
+            status, response_headers, data = await call_asgi(method, path, query, headers, body)
+            if path == '/login' and status == 200:
+                remember_token(json.loads(data), tokens)
+            result = summarize(status, response_headers, data)
+            seq = result['body'].get('seq', seq) if isinstance(result['body'], dict) else seq
+            results.append(result)
+
+    asyncio.run(session())
+    return results
+
+def main():
+    flask_results = run_flask()
+    asgi_results = run_asgi()
+    failures = 0
+    for step, flask_result, asgi_result in zip(SESSION, flask_results, asgi_results):
+        if flask_result != asgi_result:
+            failures += 1
+            print(f"DIFF {step[0]} {step[1]} {step[2]}")
+            print(f"  flask: {flask_result}")
+            print(f"  asgi:  {asgi_result}")
+    print(f"{len(SESSION) - failures}/{len(SESSION)} requests behave the same")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Concurrency stress test for the attendance state engine.
+
+Hammers one room with attendance writers, batch writers, pings, rings and
+heartbeat expiry while readers poll full and delta /get_attendance. Checks
+that every delta applied to the full read it was based on matches the next
+full read at the same seq, and that the final state and the present index
+agree with what the writers sent. Exits non-zero on any violation.
+
+Run from the repository root:
+
+    python benchmarks/stress_state.py [--seconds 10] [--writers 8] [--readers 8]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import baderia
+from student_store import Status
+
+ROOM = 'stress'
+
+def writer(number, students, stop, final, use_batches):
+    client = baderia.app.test_client()
+    names = [f"w{number}-s{i}" for i in range(students)]
+    while not stop.is_set():
+        username = random.choice(names)
+        status = random.choice(('present', 'left'))
+        if use_batches:
+            response = client.post('/ingest_batch', json={'room': ROOM, 'events': [
+                {'kind': 'ping', 'type': 'students', 'username': username},
+                {'kind': 'attendance', 'username': username, 'status': status}
+            ]})
+        else:
+            response = client.post('/attendance', json={'room': ROOM, 'username': username, 'status': status})
+        assert response.status_code == 200, response.data
+        final[username] = status
+
+def ringer(stop, rings):
+    client = baderia.app.test_client()
+    while not stop.is_set():
+        response = client.post('/attendance', json={'room': ROOM, 'action': 'random_ring'})
+        assert response.status_code == 200, response.data
+        rings.append(response.get_json()['students'])
+        time.sleep(0.001)
+
+def reader(stop, stats, errors):
+    client = baderia.app.test_client()
+    while not stop.is_set():
+        base = client.get('/get_attendance', query_string={'room': ROOM}).get_json()
+        delta = client.get('/get_attendance', query_string={'room': ROOM, 'since': base['seq']}).get_json()
+        full = client.get('/get_attendance', query_string={'room': ROOM}).get_json()
+        stats['reads'] += 3
+        if full['seq'] != delta['seq']:
+            continue  # A write landed in between; nothing to compare
+        merged = dict(base['students'])
+        merged.update(delta['students'])
+        stats['checks'] += 1
+        if merged != full['students']:
+            errors.append(f"delta from seq {base['seq']} to {delta['seq']} does not match the full read")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--students", type=int, default=200, help="students per writer")
+    args = parser.parse_args()
+
+    # Writers post as whoever they like; logins are not what's being stressed
+    baderia.REQUIRE_AUTH = False
+
+    # Short heartbeat timeout so expiry runs concurrently with everything else
+    baderia.connected_clients.timeout = 0.05
+    baderia.scheduler.call_later(0, baderia.expire_clients)
+    baderia.scheduler.start()
+
+    stop = threading.Event()
+    final = {}
+    rings = []
+    stats = {'reads': 0, 'checks': 0}
+    errors = []
+    threads = [
+        threading.Thread(target=writer, args=(i, args.students, stop, final, i % 2 == 1))
+        for i in range(args.writers)
+    ]
+    threads += [threading.Thread(target=reader, args=(stop, stats, errors)) for _ in range(args.readers)]
+    threads.append(threading.Thread(target=ringer, args=(stop, rings)))
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    # Let pending heartbeats expire, then freeze expiry to compare final state
+    time.sleep(0.2)
+    room = baderia.rooms[ROOM]
+    with room.lock:
+        present = {username for username, record in room.students.items() if record.status == Status.PRESENT}
+        if set(room.students.present.members) != present:
+            errors.append("present index disagrees with student records")
+        for position, username in enumerate(room.students.present.members):
+            if room.students.present.positions[username] != position:
+                errors.append(f"present index position of {username} is stale")
+        for username, status in final.items():
+            record = room.students.get(username)
+            # Expiry may flip a present student to left, never the other way round
+            if status == 'left' and record.status != Status.LEFT:
+                errors.append(f"{username} should be left")
+        if room.snapshot.seq != room.seq:
+            errors.append("published snapshot lags the room")
+    if any(len(ring) != len(set(ring)) for ring in rings):
+        errors.append("a ring picked the same student twice")
+
+    print(f"seq {room.seq}, {len(room.students)} students, {stats['reads']} reads, "
+          f"{stats['checks']} delta checks, {len(rings)} rings")
+    for error in errors[:20]:
+        print("FAIL:", error)
+    if errors:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""HTTP plumbing shared by the student app (animesh.py) and the teacher dashboard (ndsir.py).
+
+Each app keeps one ServerClient, whose keep-alive session reuses pooled
+connections to the server instead of opening a new TLS connection per
+ping or poll, and sends writes through one EventSender thread, so neither
+UI thread waits on the network.
+"""
+import time
+import uuid
+import random
+import threading
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = 4  # connections kept open; an app has at most a stream, a poll and a write in flight
+RETRIES = 3
+RETRY_STATUSES = {429, 502, 503, 504}  # overloaded or restarting; worth asking again
+BACKOFF_BASE = 0.5  # seconds before the first retry, doubling after each
+BACKOFF_MAX = 60
+BATCH_WINDOW = 0.5  # seconds to gather queued events into one /ingest_batch request
+MAX_QUEUED_EVENTS = 1000
+SPOOL_BATCH = 200  # spooled events replayed per request once the server is back
+
+def backoff(attempt):
+    """Seconds to wait before retry number attempt (from 0).
+
+    Full jitter: anywhere up to the exponential cap, so clients that failed
+    together, say when the server restarted, don't all come back together.
+    """
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def error_message(response, default):
+    """Get the error a failed response carries, or default"""
+    try:
+        return response.json().get("error", default)
+    except ValueError:
+        return default
+
+def run_in_background(root, work, done):
+    """Run work() on a thread, then done(result, error) on the Tk main loop.
+
+    error is the requests.RequestException work() raised, else None.
+    """
+    def run():
+        try:
+            result, error = work(), None
+        except requests.RequestException as exception:
+            result, error = None, exception
+        root.after(0, done, result, error)
+
+    threading.Thread(target=run, daemon=True).start()
+
+class ServerClient:
+    """Requests to the attendance server over one pooled keep-alive session"""
+
+    def __init__(self, server_url):
+        self.server_url = server_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.token = None  # Session token from /login, sent on every request once set
+
+    def request(self, method, path, retries=RETRIES, timeout=5, headers=None, **kwargs):
+        """Send a request, retrying failed connections and overload responses
+        with jittered backoff. Raises requests.RequestException once retries
+        run out; any other response is returned as is.
+        """
+        headers = dict(headers or {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        for attempt in range(retries + 1):
+            try:
+                response = self.session.request(
+                    method, self.server_url + path, headers=headers, timeout=timeout, **kwargs
+                )
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+                response.close()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries:
+                    raise
+            time.sleep(backoff(attempt))
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+class EventSender:
+    """Ships queued events to /ingest_batch from one background thread.
+
+    send() never blocks: events wait in a queue bounded at max_events,
+    where the oldest are dropped first, and go out together every
+    BATCH_WINDOW. A ping for a student and room that already has one
+    waiting is dropped, since one covers the other. When a batch can't be
+    delivered its events go back to the front of the queue and the sender
+    backs off before trying again.
+
+    With a spool, every event other than a ping is stamped with an id and
+    the time, and the sender thread writes it to the spool before sending;
+    spooled events are replayed in order, SPOOL_BATCH at a time, until the
+    server has answered for all of them.
+
+    reauthenticate, if given, is called from the sender thread when the
+    server rejects the session token, and should log in again.
+    """
+
+    def __init__(self, client, spool=None, max_events=MAX_QUEUED_EVENTS, reauthenticate=None):
+        self.client = client
+        self.spool = spool
+        self.reauthenticate = reauthenticate
+        self.max_events = max_events
+        self.events = deque()
+        self.pings = set()  # (username, room) of queued pings
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.dropped = 0
+        if spool is not None and len(spool):
+            self.ready.set()  # Left over from the last run
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def send(self, event):
+        """Queue an event with kind, username and room"""
+        if self.spool is not None and event["kind"] != "ping":
+            event = dict(event, id=uuid.uuid4().hex, at=time.time())
+        with self.lock:
+            if event["kind"] == "ping":
+                key = (event["username"], event["room"])
+                if key in self.pings:
+                    return
+                self.pings.add(key)
+            self.events.append(event)
+            self.trim()
+        self.ready.set()
+
+    def trim(self):
+        while len(self.events) > self.max_events:
+            event = self.events.popleft()
+            if event["kind"] == "ping":
+                self.pings.discard((event["username"], event["room"]))
+            self.dropped += 1
+
+    def run(self):
+        failures = 0
+        while True:
+            self.ready.wait()
+            time.sleep(BATCH_WINDOW)
+            with self.lock:
+                events = list(self.events)
+                self.events.clear()
+                self.pings.clear()
+                self.ready.clear()
+            spooled = []
+            if self.spool is not None:
+                # On disk before it's sent, off the UI thread
+                self.spool.append([event for event in events if event["kind"] != "ping"])
+                events = [event for event in events if event["kind"] == "ping"]
+                spooled = self.spool.head(SPOOL_BATCH)
+            if self.deliver(spooled + events):
+                failures = 0
+                if spooled:
+                    self.spool.ack(len(spooled))
+                    if len(self.spool):
+                        self.ready.set()  # Keep draining without waiting for new events
+                continue
+
+            with self.lock:
+                # Newer pings already cover the failed batch's
+                for event in reversed(events):
+                    if event["kind"] == "ping":
+                        key = (event["username"], event["room"])
+                        if key in self.pings:
+                            continue
+                        self.pings.add(key)
+                    self.events.appendleft(event)
+                self.trim()
+            self.ready.set()
+            time.sleep(backoff(failures))
+            failures += 1
+
+    def deliver(self, events):
+        """Post a batch; False if it should be tried again later.
+
+        A batch counts as delivered only once the server answers 200 with
+        a result for every event. A result that is an error, say for a
+        student the login may not act for, is final: sending it again
+        would be refused again. Anything else, including a server error or
+        an expired login, keeps the batch for another try.
+        """
+        try:
+            response = self.client.post("/ingest_batch", json={"events": events}, retries=0)
+            if response.status_code == 404:
+                return self.deliver_one_by_one(events)
+            if response.status_code == 401:
+                self.renew_login()
+                return False
+            if response.status_code != 200:
+                return False
+            results = response.json().get("results")
+            return isinstance(results, list) and len(results) == len(events)
+        except (requests.RequestException, ValueError, AttributeError):
+            return False
+
+    def renew_login(self):
+        if self.reauthenticate is not None:
+            self.reauthenticate()
+
+    def deliver_one_by_one(self, events):
+        """Send events to a server that predates /ingest_batch; False if any should be tried again"""
+        for event in events:
+            if event["kind"] == "ping":
+                response = self.client.post("/ping", json={
+                    "type": event["type"],
+                    "username": event["username"],
+                    "room": event["room"]
+                }, retries=0)
+            else:
+                response = self.client.post("/attendance", json={
+                    "username": event["username"],
+                    "status": event.get("status", "left"),
+                    "room": event["room"]
+                }, retries=0)
+            if response.status_code == 401:
+                self.renew_login()
+                return False
+            if response.status_code >= 500 or response.status_code in RETRY_STATUSES:
+                return False
+        return True
@@ -0,0 +1,52 @@
+import time
+import threading
+from collections import deque
+
+class HeartbeatTracker:
+    """Track client heartbeats and expire clients that stop sending them.
+
+    Every client shares the same timeout, so deadlines are created in
+    increasing order and a plain FIFO queue is already sorted by deadline.
+    A heartbeat appends one entry in O(1). Entries superseded by a later
+    heartbeat are skipped when they reach the front of the queue.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.last_seen = {}
+        self.deadlines = deque()
+        self.lock = threading.Lock()
+
+    def beat(self, key, now=None):
+        """Record a heartbeat from a client"""
+        if now is None:
+            now = time.time()
+        with self.lock:
+            self.last_seen[key] = now
+            self.deadlines.append((now + self.timeout, key))
+
+    def __contains__(self, key):
+        return key in self.last_seen
+
+    def __len__(self):
+        return len(self.last_seen)
+
+    def next_deadline(self):
+        """Get the earliest pending deadline, or None when idle"""
+        with self.lock:
+            return self.deadlines[0][0] if self.deadlines else None
+
+    def expire(self, now=None):
+        """Remove and return the clients whose deadline has passed"""
+        if now is None:
+            now = time.time()
+        expired = []
+        with self.lock:
+            while self.deadlines and self.deadlines[0][0] <= now:
+                _, key = self.deadlines.popleft()
+                last_seen = self.last_seen.get(key)
+                # Stale entry if the client pinged again since
+                if last_seen is not None and last_seen + self.timeout <= now:
+                    del self.last_seen[key]
+                    expired.append(key)
+        return expired
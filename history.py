@@ -0,0 +1,201 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from student_store import Status
+
+RING_RESPONSE_WINDOW = 600  # seconds a ringed student has to mark present
+
+class StudentIntervals:
+    """One student's closed presence intervals, ordered by start time"""
+    __slots__ = ('starts', 'ends', 'totals')
+
+    def __init__(self):
+        self.starts = array('d')
+        self.ends = array('d')
+        self.totals = array('d')  # Seconds present up to and including each interval
+
+    def add(self, start, end):
+        index = bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+        self.totals.insert(index, 0.0)
+        # Appends only touch the last total; an out-of-order close redoes the tail
+        total = self.totals[index - 1] if index else 0.0
+        for position in range(index, len(self.starts)):
+            total += self.ends[position] - self.starts[position]
+            self.totals[position] = total
+
+    def seconds_between(self, start, end):
+        """Seconds present within [start, end)"""
+        # Intervals never overlap, so those starting in the window are a contiguous run
+        first = bisect_left(self.starts, start)
+        last = bisect_left(self.starts, end)
+        seconds = 0.0
+        if last > first:
+            seconds = self.totals[last - 1] - (self.totals[first - 1] if first else 0.0)
+            # The last one may run past the window
+            seconds -= max(self.ends[last - 1] - end, 0.0)
+        # The one before the window may run into it
+        if first:
+            seconds += max(min(self.ends[first - 1], end) - start, 0.0)
+        return seconds
+
+class PresenceHistory:
+    """Append-only record of when each student of a room was present.
+
+    Every present -> left/absent transition closes an interval. Intervals
+    are kept twice: per student, ordered by start with running totals, so
+    presence time over any window is two binary searches per student; and
+    for the whole room, ordered by end, so "who was present during a
+    window" only scans intervals ending inside it (plus the longest
+    interval's length past it) instead of the whole semester.
+
+    Rings are kept per selected student, with whether the student marked
+    present within RING_RESPONSE_WINDOW of the ring.
+
+    The room-wide columns name students by a small int code rather than
+    by username, so analytics can copy them out as plain arrays.
+    """
+
+    def __init__(self):
+        self.open = {}  # username -> start of the presence still in progress
+        self.students = {}  # username -> StudentIntervals
+        self.ends = array('d')
+        self.starts = array('d')  # Parallel to ends
+        self.student_codes = array('l')  # Parallel to ends
+        self.longest = 0.0
+        self.ring_times = array('d')
+        self.ring_codes = array('l')  # Parallel to ring_times
+        self.ring_answered = array('b')  # Parallel to ring_times
+        self.unanswered = {}  # username -> index of their latest ring awaiting an answer
+        self.names = []  # Student code -> username
+        self.codes = {}  # Username -> student code
+
+    def __len__(self):
+        return len(self.ends)
+
+    def code(self, username):
+        code = self.codes.get(username)
+        if code is None:
+            code = self.codes[username] = len(self.names)
+            self.names.append(username)
+        return code
+
+    def record(self, username, status, when):
+        """Note a status change of a student at epoch time when"""
+        if status == Status.PRESENT:
+            self.open.setdefault(username, when)
+            index = self.unanswered.pop(username, None)
+            if index is not None and when - self.ring_times[index] <= RING_RESPONSE_WINDOW:
+                self.ring_answered[index] = 1
+        else:
+            start = self.open.pop(username, None)
+            if start is not None:
+                self.close(username, start, max(when, start))
+
+    def close(self, username, start, end):
+        intervals = self.students.get(username)
+        if intervals is None:
+            intervals = self.students[username] = StudentIntervals()
+        intervals.add(start, end)
+        # Ends arrive in clock order, except after the clock steps back
+        index = bisect_right(self.ends, end)
+        self.ends.insert(index, end)
+        self.starts.insert(index, start)
+        self.student_codes.insert(index, self.code(username))
+        self.longest = max(self.longest, end - start)
+
+    def ring(self, usernames, when):
+        """Note a ring of the selected students at epoch time when"""
+        for username in usernames:
+            self.unanswered[username] = len(self.ring_times)
+            self.ring_times.append(when)
+            self.ring_codes.append(self.code(username))
+            self.ring_answered.append(0)
+
+    def present_between(self, start, end):
+        """Usernames present at any moment within [start, end)"""
+        # An interval overlapping the window ends after its start, and can't
+        # end later than the longest interval past the window's end
+        first = bisect_right(self.ends, start)
+        last = bisect_right(self.ends, end + self.longest)
+        present = {
+            self.names[self.student_codes[index]]
+            for index in range(first, last)
+            if self.starts[index] < end
+        }
+        present.update(username for username, opened in self.open.items() if opened < end)
+        return present
+
+    def seconds_between(self, start, end, now):
+        """Seconds each student was present within [start, end), up to now"""
+        totals = {}
+        for username, intervals in self.students.items():
+            seconds = intervals.seconds_between(start, end)
+            if seconds:
+                totals[username] = seconds
+        for username, opened in self.open.items():
+            seconds = max(min(now, end) - max(opened, start), 0.0)
+            if seconds:
+                totals[username] = totals.get(username, 0.0) + seconds
+        return totals
+
+    def intervals_between(self, start, end, position, count):
+        """Closed intervals overlapping [start, end), read a page at a time.
+
+        Scans count intervals from position (None for the first page) and
+        returns (rows, position), rows as (username, start, end) and
+        position None once the window is done.
+        """
+        # Same end-ordered scan as present_between()
+        first = bisect_right(self.ends, start)
+        last = bisect_right(self.ends, end + self.longest)
+        index = first if position is None else max(position, first)
+        stop = min(index + count, last)
+        rows = [
+            (self.names[self.student_codes[index]], self.starts[index], self.ends[index])
+            for index in range(index, stop)
+            if self.starts[index] < end
+        ]
+        return rows, stop if stop < last else None
+
+    def open_before(self, end):
+        """Presences still in progress that started before end, as (username, start)"""
+        return [(username, opened) for username, opened in self.open.items() if opened < end]
+
+    def rings_between(self, start, end, position, count):
+        """Rings within [start, end) as (username, time, answered), paged like intervals_between()"""
+        index = bisect_left(self.ring_times, start) if position is None else position
+        last = bisect_left(self.ring_times, end)
+        stop = min(index + count, last)
+        rows = [
+            (self.names[self.ring_codes[index]], self.ring_times[index], bool(self.ring_answered[index]))
+            for index in range(index, stop)
+        ]
+        return rows, stop if stop < last else None
+
+    def capture(self):
+        """Build a JSON-ready copy of the history"""
+        return {
+            'open': self.open.copy(),
+            # In end order, so restoring only ever appends
+            'closed': [
+                [self.names[code], self.starts[index], self.ends[index]]
+                for index, code in enumerate(self.student_codes)
+            ],
+            'rings': [
+                [self.names[code], self.ring_times[index], self.ring_answered[index]]
+                for index, code in enumerate(self.ring_codes)
+            ],
+            'unanswered': self.unanswered.copy()
+        }
+
+    def restore(self, snapshot):
+        """Load history saved by capture()"""
+        self.open = dict(snapshot['open'])
+        for username, start, end in snapshot['closed']:
+            self.close(username, start, end)
+        for username, when, answered in snapshot.get('rings', ()):
+            self.ring_times.append(when)
+            self.ring_codes.append(self.code(username))
+            self.ring_answered.append(answered)
+        self.unanswered = dict(snapshot.get('unanswered', {}))
@@ -0,0 +1,162 @@
+import time
+import bisect
+import threading
+from collections import defaultdict
+
+# Seconds; tuned for handlers that normally finish in well under 10ms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in pairs) + "}"
+
+def format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count, optionally split by labels"""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self.lock:
+            values = list(self.values.items())
+        for label_values, value in values:
+            yield f"{self.name}{format_labels(self.labels, label_values)} {format_value(value)}"
+
+class Gauge:
+    """Value read from a callback at scrape time, so the hot path pays nothing.
+
+    The callback returns a number, or a dict of label values tuple -> number.
+    """
+
+    def __init__(self, name, help, callback, labels=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.labels = labels
+        self.kind = kind
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        value = self.callback()
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        for label_values, value in values:
+            yield f"{self.name}{format_labels(self.labels, label_values)} {format_value(value)}"
+
+class Histogram:
+    """Bucketed distribution, optionally split by labels"""
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, *label_values):
+        return Timer(self, label_values)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self.lock:
+            series = [(label_values, list(counts)) for label_values, counts in self.series.items()]
+        for label_values, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = format_labels(self.labels, label_values, [("le", format_value(float(bound)))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {format_value(counts[-2])}"
+            yield f"{self.name}_count{labels} {counts[-1]}"
+
+class Timer:
+    __slots__ = ('histogram', 'label_values', 'start')
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        """Add a metric, replacing any earlier one of the same name"""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Encode every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Instruments updated on the hot path; gauges are registered by the server
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "attendance_request_seconds", "Time to produce a response, by route", labels=("route",)))
+REQUESTS = REGISTRY.register(Counter(
+    "attendance_requests_total", "Responses sent, by route and status", labels=("route", "status")))
+REQUEST_BYTES = REGISTRY.register(Histogram(
+    "attendance_request_bytes", "Request body size, by route", SIZE_BUCKETS, labels=("route",)))
+RESPONSE_BYTES = REGISTRY.register(Histogram(
+    "attendance_response_bytes", "Response body size, by route", SIZE_BUCKETS, labels=("route",)))
+HEARTBEAT_DATAGRAMS = REGISTRY.register(Counter(
+    "attendance_heartbeat_datagrams_total", "UDP heartbeats received, by result", labels=("result",)))
+RINGS = REGISTRY.register(Counter(
+    "attendance_rings_total", "Random rings sent"))
+JOB_SECONDS = REGISTRY.register(Histogram(
+    "attendance_job_seconds", "Duration of background jobs, by job", labels=("job",)))
+LOCK_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "attendance_room_lock_wait_seconds", "Time writers waited for a room's lock",
+    (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0)))
+
+def observe_request(route, seconds, status, request_bytes, response_bytes):
+    """Record one handled request"""
+    REQUEST_SECONDS.observe(seconds, route)
+    REQUESTS.inc(route, status)
+    REQUEST_BYTES.observe(request_bytes, route)
+    RESPONSE_BYTES.observe(response_bytes, route)
@@ -1,12 +1,99 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import os
+import time
 import threading
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from client import ServerClient, backoff, error_message, run_in_background
 
 # Configuration
 SERVER_URL = "https://deadball.onrender.com"
 UPDATE_INTERVAL = 5  # seconds
+TABLE_SLICE = 200  # table rows changed per main loop turn, so big refreshes don't freeze the window
+DEFAULT_ROOM = "default"
+EXPORT_KINDS = ("status", "presence", "rings")
+EXPORT_CHUNK_BYTES = 64 * 1024  # bytes written to disk per read of an export download
+IMPORT_CHUNK_BYTES = 16 * 1024  # bytes of a roster upload sent between progress updates
+IMPORT_TIMEOUT = 300  # seconds to wait for an import's answer; the server sizes its row limit to fit
+
+class AttendanceTable:
+    """Keeps the attendance Treeview in step with /get_attendance responses.
+
+    Rows are remembered by student as (item id, values shown), so a delta
+    only touches the rows it names and unchanged values are never rewritten;
+    selection and scroll position survive because rows are changed in place
+    rather than rebuilt. Changes are applied TABLE_SLICE at a time between
+    main loop turns, so even a full listing of a large class doesn't freeze
+    the window.
+    """
+
+    def __init__(self, root, tree):
+        self.root = root
+        self.tree = tree
+        self.rows = {}
+        self.pending = {}  # student -> info from the server, None to remove the row
+        self.applying = None  # [(student, info)] being applied a slice at a time
+        self.refresh_seconds = None  # main loop time of the refresh in progress, None when idle
+        self.refresh_ms = None  # main loop time the last refresh took, over all its slices
+        self.highlighted = set()
+
+    def update(self, data):
+        """Queue a full listing or delta from /get_attendance"""
+        students = data.get('students', {})
+        if data.get('full', True):
+            # A full listing supersedes anything not yet shown; rows missing from it go
+            self.applying = None
+            self.pending = dict.fromkeys(self.rows.keys() - students.keys())
+        self.pending.update(students)
+        if self.refresh_seconds is None:
+            self.refresh_seconds = 0.0
+            self.apply_slice()
+
+    def apply_slice(self):
+        start = time.perf_counter()
+        if self.applying is None:
+            self.applying = list(self.pending.items())
+            self.pending = {}
+        batch = self.applying[:TABLE_SLICE]
+        del self.applying[:TABLE_SLICE]
+        for student, info in batch:
+            self.apply(student, info)
+        if not self.applying:
+            self.applying = None
+        self.refresh_seconds += time.perf_counter() - start
+        if self.applying or self.pending:
+            self.root.after(1, self.apply_slice)  # Let input and redraws in between slices
+        else:
+            self.refresh_ms = self.refresh_seconds * 1000
+            self.refresh_seconds = None
+
+    def apply(self, student, info):
+        row = self.rows.get(student)
+        if info is None:
+            if row:
+                self.tree.delete(row[0])
+                del self.rows[student]
+                self.highlighted.discard(student)
+            return
+        values = (student, info.get('status', 'absent').capitalize(), info.get('last_update', ''))
+        if row is None:
+            self.rows[student] = (self.tree.insert("", tk.END, values=values), values)
+        elif row[1] != values:
+            self.tree.item(row[0], values=values)
+            self.rows[student] = (row[0], values)
+
+    def highlight(self, students):
+        """Highlight the rows of rung students, touching only rows that change"""
+        students = set(students)
+        for student in self.highlighted - students:
+            if student in self.rows:
+                self.tree.item(self.rows[student][0], tags=())
+        for student in students - self.highlighted:
+            if student in self.rows:
+                self.tree.item(self.rows[student][0], tags=('highlight',))
+        self.highlighted = students & self.rows.keys()
 
 class TeacherDashboard:
     def __init__(self, root):
@@ -28,17 +115,22 @@ class TeacherDashboard:
         self.password_entry = tk.Entry(self.login_frame, show="*")
         self.password_entry.grid(row=2, column=1, padx=5, pady=5)
         
+        tk.Label(self.login_frame, text="Room:").grid(row=3, column=0, padx=5, pady=5)
+        self.room_entry = tk.Entry(self.login_frame)
+        self.room_entry.insert(0, DEFAULT_ROOM)
+        self.room_entry.grid(row=3, column=1, padx=5, pady=5)
+        
         tk.Button(
             self.login_frame, 
             text="Login", 
             command=self.login
-        ).grid(row=3, column=0, pady=10, sticky="e")
+        ).grid(row=4, column=0, pady=10, sticky="e")
         
         tk.Button(
             self.login_frame, 
             text="Register", 
             command=self.register
-        ).grid(row=3, column=1, pady=10, sticky="w")
+        ).grid(row=4, column=1, pady=10, sticky="w")
         
         # Main Frame (hidden initially)
         self.main_frame = tk.Frame(self.root)
@@ -57,6 +149,11 @@ class TeacherDashboard:
         self.notebook.add(self.timetable_tab, text="Timetable")
         self.setup_timetable_tab()
         
+        # Analytics Tab
+        self.analytics_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.analytics_tab, text="Analytics")
+        self.setup_analytics_tab()
+        
         # Student Management Tab
         self.student_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.student_tab, text="Student Management")
@@ -71,8 +168,14 @@ class TeacherDashboard:
         )
         self.status_bar.pack(fill=tk.X)
         
-        # Start update thread
-        threading.Thread(target=self.update_data, daemon=True).start()
+        self.client = ServerClient(SERVER_URL)
+        self.attendance_seq = None
+        self.room = DEFAULT_ROOM
+        self.dashboard_endpoint = True  # False once the server turns out to predate /dashboard
+        
+        # Timetable of the room, refetched only when its version changes
+        self.timetable = []
+        self.timetable_version = None
 
     def login(self):
         username = self.username_entry.get()
@@ -82,25 +185,29 @@ class TeacherDashboard:
             messagebox.showwarning("Error", "Please enter both username and password")
             return
             
-        try:
-            response = requests.post(
-                f"{SERVER_URL}/login",
-                json={"username": username, "password": password},
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('type') == 'teacher':
-                    self.login_frame.pack_forget()
-                    self.main_frame.pack(fill=tk.BOTH, expand=True)
-                    self.update_status("Connected")
-                else:
-                    messagebox.showerror("Error", "Students must use the student portal")
-            else:
-                messagebox.showerror("Error", data.get('error', 'Login failed'))
-        except requests.RequestException:
+        run_in_background(self.root, lambda: self.client.post(
+            "/login",
+            json={"username": username, "password": password},
+            timeout=10
+        ), self.login_done)
+
+    def login_done(self, response, error):
+        if error:
             messagebox.showerror("Error", "Could not connect to server")
+        elif response.status_code != 200:
+            messagebox.showerror("Error", error_message(response, 'Login failed'))
+        elif response.json().get('type') == 'teacher':
+            self.client.token = response.json()['token']
+            self.room = self.room_entry.get().strip() or DEFAULT_ROOM
+            self.attendance_seq = None  # Resync from scratch for the chosen room
+            self.timetable_version = None
+            self.login_frame.pack_forget()
+            self.main_frame.pack(fill=tk.BOTH, expand=True)
+            self.update_status("Connected")
+            # Polling starts once the room is known, so no poll for another room can land after
+            threading.Thread(target=self.update_data, daemon=True).start()
+        else:
+            messagebox.showerror("Error", "Students must use the student portal")
 
     def register(self):
         username = self.username_entry.get()
@@ -110,37 +217,44 @@ class TeacherDashboard:
             messagebox.showwarning("Error", "Please enter both username and password")
             return
             
-        try:
-            response = requests.post(
-                f"{SERVER_URL}/register",
-                json={
-                    "username": username,
-                    "password": password,
-                    "type": "teacher"
-                },
-                timeout=5
-            )
-            
-            if response.status_code == 201:
-                messagebox.showinfo("Success", "Teacher registered successfully!")
-            else:
-                messagebox.showerror("Error", response.json().get('error', 'Registration failed'))
-        except requests.RequestException:
+        run_in_background(self.root, lambda: self.client.post(
+            "/register",
+            json={
+                "username": username,
+                "password": password,
+                "type": "teacher"
+            },
+            timeout=10
+        ), self.register_done)
+
+    def register_done(self, response, error):
+        if error:
             messagebox.showerror("Error", "Could not connect to server")
+        elif response.status_code == 201:
+            messagebox.showinfo("Success", "Teacher registered successfully!")
+        else:
+            messagebox.showerror("Error", error_message(response, 'Registration failed'))
 
     def update_status(self, message, color="black"):
         self.status_bar.config(text=f"Status: {message}", fg=color)
 
     def setup_attendance_tab(self):
         # Attendance Treeview
-        self.tree = ttk.Treeview(self.attendance_tab, columns=("Student", "Status", "Last Update"), show="headings")
+        table_frame = tk.Frame(self.attendance_tab)
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.tree = ttk.Treeview(table_frame, columns=("Student", "Status", "Last Update"), show="headings")
         self.tree.heading("Student", text="Student")
         self.tree.heading("Status", text="Status")
         self.tree.heading("Last Update", text="Last Update")
         self.tree.column("Student", width=250)
         self.tree.column("Status", width=150)
         self.tree.column("Last Update", width=250)
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.tree.tag_configure('highlight', background='yellow')
+        table_scroll = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=table_scroll.set)
+        table_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.table = AttendanceTable(self.root, self.tree)
         
         # Random Ring Section
         ring_frame = tk.Frame(self.attendance_tab)
@@ -180,6 +294,148 @@ class TeacherDashboard:
             pady=5
         ).pack(pady=10)
 
+    def setup_analytics_tab(self):
+        # Date range and timetable slots to analyze
+        range_frame = tk.Frame(self.analytics_tab)
+        range_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        today = datetime.now().date()
+        tk.Label(range_frame, text="From:").grid(row=0, column=0, padx=5)
+        self.analytics_from = tk.Entry(range_frame, width=12)
+        self.analytics_from.insert(0, (today - timedelta(days=7)).isoformat())
+        self.analytics_from.grid(row=0, column=1, padx=5)
+        
+        tk.Label(range_frame, text="To:").grid(row=0, column=2, padx=5)
+        self.analytics_to = tk.Entry(range_frame, width=12)
+        self.analytics_to.insert(0, (today + timedelta(days=1)).isoformat())
+        self.analytics_to.grid(row=0, column=3, padx=5)
+        
+        tk.Label(range_frame, text="Slots:").grid(row=0, column=4, padx=5)
+        self.analytics_slots = tk.Entry(range_frame, width=30)
+        self.analytics_slots.grid(row=0, column=5, padx=5)
+        
+        tk.Button(
+            range_frame,
+            text="Load",
+            command=lambda: threading.Thread(target=self.load_analytics, daemon=True).start()
+        ).grid(row=0, column=6, padx=5)
+        
+        # Exports cover the same date range, except current status
+        self.export_kind = ttk.Combobox(range_frame, values=EXPORT_KINDS, state="readonly", width=9)
+        self.export_kind.set(EXPORT_KINDS[0])
+        self.export_kind.grid(row=0, column=7, padx=5)
+        
+        tk.Button(
+            range_frame,
+            text="Export...",
+            command=self.export_records
+        ).grid(row=0, column=8, padx=5)
+        
+        self.export_label = tk.Label(self.analytics_tab, anchor=tk.W)
+        self.export_label.pack(fill=tk.X, padx=10)
+        
+        columns = ("Student", "Attendance %", "Days", "Streak", "Best Streak",
+                   "Minutes", "Late", "Slot %", "Rings Answered")
+        self.analytics_tree = ttk.Treeview(self.analytics_tab, columns=columns, show="headings")
+        for column in columns:
+            self.analytics_tree.heading(column, text=column)
+            self.analytics_tree.column(column, width=180 if column == "Student" else 90)
+        self.analytics_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    def load_analytics(self):
+        try:
+            response = self.client.get(
+                "/analytics",
+                params={
+                    "room": self.room,
+                    "start": self.analytics_from.get().strip(),
+                    "end": self.analytics_to.get().strip(),
+                    "slots": self.analytics_slots.get().strip()
+                },
+                timeout=30
+            )
+            data = response.json()
+        except (requests.RequestException, ValueError):
+            self.root.after(0, messagebox.showerror, "Error", "Could not connect to server")
+            return
+        if response.status_code != 200:
+            self.root.after(0, messagebox.showerror, "Error", data.get("error", "Could not load analytics"))
+            return
+        self.root.after(0, self.update_analytics_table, data)
+
+    def export_records(self):
+        """Download an /export of the room, writing it to disk as it streams in"""
+        kind = self.export_kind.get()
+        path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            initialfile=f"{self.room}-{kind}.csv",
+            filetypes=[("CSV", "*.csv"), ("NDJSON", "*.ndjson")]
+        )
+        if not path:
+            return
+        params = {
+            "room": self.room,
+            "kind": kind,
+            "format": "ndjson" if path.endswith(".ndjson") else "csv",
+            "start": self.analytics_from.get().strip(),
+            "end": self.analytics_to.get().strip()
+        }
+        self.show_export_progress(f"Exporting {kind}...")
+        
+        def work():
+            """Get (error, bytes written); error is None on success"""
+            written = 0
+            with self.client.get("/export", params=params, stream=True, timeout=30) as response:
+                if response.status_code != 200:
+                    return error_message(response, "Export failed"), written
+                try:
+                    with open(path, "wb") as file:
+                        for chunk in response.iter_content(EXPORT_CHUNK_BYTES):
+                            file.write(chunk)
+                            written += len(chunk)
+                            self.root.after(0, self.show_export_progress,
+                                            f"Exporting {kind}: {written // 1024} KB")
+                except OSError as error:
+                    return f"Could not write {path}: {error.strerror}", written
+            return None, written
+        
+        run_in_background(self.root, work, lambda result, error: self.export_done(result, error, path))
+
+    def export_done(self, result, error, path):
+        if error:
+            self.show_export_progress("Export failed")
+            messagebox.showerror("Error", "Could not connect to server")
+            return
+        failure, written = result
+        if failure:
+            self.show_export_progress("Export failed")
+            messagebox.showerror("Error", failure)
+        else:
+            self.show_export_progress(f"Exported {written // 1024} KB to {path}")
+
+    def show_export_progress(self, text):
+        self.export_label.config(text=text)
+
+    def update_analytics_table(self, data):
+        for row in self.analytics_tree.get_children():
+            self.analytics_tree.delete(row)
+        
+        def show(value):
+            return "-" if value is None else value
+        
+        for student, metrics in data.get('students', {}).items():
+            self.analytics_tree.insert("", tk.END, values=(
+                student,
+                metrics['attendance_pct'],
+                f"{metrics['days_attended']}/{data.get('class_days', 0)}",
+                metrics['current_streak'],
+                metrics['longest_streak'],
+                metrics['minutes'],
+                show(metrics['late_arrivals']),
+                show(metrics['slot_overlap_pct']),
+                f"{metrics['rings_answered']}/{metrics['rings']}"
+            ))
+
     def setup_student_tab(self):
         # Student Registration
         reg_frame = tk.LabelFrame(self.student_tab, text="Register New Student", padx=10, pady=10)
@@ -200,78 +456,133 @@ class TeacherDashboard:
             padx=10,
             pady=5
         ).grid(row=2, columnspan=2, pady=10)
+        
+        # Bulk import from a CSV of username,password[,type] rows
+        import_frame = tk.LabelFrame(self.student_tab, text="Import Roster", padx=10, pady=10)
+        import_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        tk.Label(
+            import_frame,
+            text="CSV with username,password rows; an optional third column sets the type (student or teacher)"
+        ).pack(anchor=tk.W)
+        
+        self.import_button = tk.Button(
+            import_frame,
+            text="Choose CSV...",
+            command=self.import_roster,
+            padx=10,
+            pady=5
+        )
+        self.import_button.pack(anchor=tk.W, pady=5)
+        
+        self.import_progress = ttk.Progressbar(import_frame, maximum=100)
+        self.import_progress.pack(fill=tk.X, pady=5)
+        self.import_label = tk.Label(import_frame, anchor=tk.W)
+        self.import_label.pack(fill=tk.X)
+        
+        self.import_errors = tk.Text(import_frame, height=8, wrap=tk.NONE)
+        self.import_errors.pack(fill=tk.BOTH, expand=True)
 
     def update_data(self):
+        failures = 0
         while True:
             try:
-                # Update attendance
-                response = requests.get(f"{SERVER_URL}/get_attendance", timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
-                    self.root.after(0, self.update_attendance_table, data)
-                
-                # Update timetable
-                response = requests.get(f"{SERVER_URL}/timetable", timeout=5)
-                if response.status_code == 200:
-                    timetable = response.json()
-                    timetable_text = "Timetable:\n"
-                    for time, subject in timetable.items():
-                        timetable_text += f"{time}: {subject}\n"
-                    self.root.after(0, self.update_timetable_display, timetable_text)
-                
-                self.update_status("Connected", "blue")
+                if self.dashboard_endpoint:
+                    self.poll_dashboard()
+                else:
+                    self.poll_attendance()
+                    self.poll_timetable()
+                failures = 0
+                if self.table.refresh_ms is None:
+                    self.update_status("Connected", "blue")
+                else:
+                    self.update_status(f"Connected (table refresh {self.table.refresh_ms:.1f} ms)", "blue")
             except requests.RequestException:
+                failures += 1
                 self.update_status("Connection Error", "red")
+            except (ValueError, KeyError, TypeError, AttributeError):
+                # A malformed body; keep polling rather than let the thread die
+                failures += 1
+                self.update_status("Unexpected response from server", "red")
             
-            threading.Event().wait(UPDATE_INTERVAL)
+            # Back off while the server is unreachable, jittered so dashboards
+            # don't all come back at once
+            threading.Event().wait(UPDATE_INTERVAL + (backoff(failures) if failures else 0))
 
-    def update_attendance_table(self, data):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-            
-        for student, info in data.get('students', {}).items():
-            status = info.get('status', 'absent').capitalize()
-            last_update = info.get('last_update', '')
-            self.tree.insert("", tk.END, values=(student, status, last_update))
+    def poll_dashboard(self):
+        """Fetch attendance changes and, if it changed, the timetable in one round trip"""
+        params = {'room': self.room}
+        headers = {}
+        if self.attendance_seq is not None:
+            params['since'] = self.attendance_seq
+        if self.timetable_version is not None:
+            params['timetable_version'] = self.timetable_version
+            if self.attendance_seq is not None:
+                headers['If-None-Match'] = f'"{self.attendance_seq}-{self.timetable_version}"'
+        response = self.client.get("/dashboard", params=params, headers=headers, retries=0)
+        if response.status_code == 404:
+            # Server predates /dashboard
+            self.dashboard_endpoint = False
+            self.poll_attendance()
+            self.poll_timetable()
+        elif response.status_code == 200:
+            data = response.json()
+            self.show_attendance(data['attendance'])
+            if data['timetable'] is not None:
+                self.show_timetable(data['timetable'])
+
+    def poll_attendance(self):
+        """Fetch only what changed since last poll"""
+        params = {'room': self.room}
+        headers = {}
+        if self.attendance_seq is not None:
+            params['since'] = self.attendance_seq
+            headers['If-None-Match'] = f'"{self.attendance_seq}"'
+        response = self.client.get("/get_attendance", params=params, headers=headers, retries=0)
+        if response.status_code == 200:
+            self.show_attendance(response.json())
+
+    def poll_timetable(self):
+        """Fetch the timetable when its version changes"""
+        headers = {}
+        if self.timetable_version is not None:
+            headers['If-None-Match'] = f'"{self.timetable_version}"'
+        response = self.client.get("/timetable", params={'room': self.room}, headers=headers, retries=0)
+        if response.status_code == 200:
+            self.show_timetable(response.json())
+
+    def show_attendance(self, data):
+        self.attendance_seq = data.get('seq')
+        self.root.after(0, self.table.update, data)
+
+    def show_timetable(self, timetable):
+        self.timetable = timetable.get('periods', [])
+        self.timetable_version = timetable.get('version')
+        timetable_text = "Timetable:\n"
+        for period in self.timetable:
+            timetable_text += f"{period['day'].capitalize()} {period['start']}-{period['end']}: {period['subject']}\n"
+        self.root.after(0, self.update_timetable_display, timetable_text)
 
     def update_timetable_display(self, text):
         self.timetable_text.delete(1.0, tk.END)
         self.timetable_text.insert(tk.END, text)
 
     def trigger_random_ring(self):
-        try:
-            response = requests.post(
-                f"{SERVER_URL}/attendance",
-                json={"action": "random_ring"},
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                selected = data.get('students', [])
-                names_text = "\n".join(selected)
-                self.random_names_label.config(text=names_text)
-                
-                # Highlight selected students
-                for item in self.tree.get_children():
-                    values = self.tree.item(item)['values']
-                    if values and values[0] in selected:
-                        self.tree.tag_configure('highlight', background='yellow')
-                        self.tree.item(item, tags=('highlight',))
-                    else:
-                        self.tree.item(item, tags=())
-        except requests.RequestException:
+        run_in_background(self.root, lambda: self.client.post(
+            "/attendance",
+            json={"action": "random_ring", "room": self.room}
+        ), self.random_ring_done)
+
+    def random_ring_done(self, response, error):
+        if error:
             messagebox.showerror("Error", "Could not connect to server")
+        elif response.status_code == 200:
+            selected = response.json().get('students', [])
+            names_text = "\n".join(selected)
+            self.random_names_label.config(text=names_text)
+            self.table.highlight(selected)
 
     def edit_timetable(self):
-        # Get current timetable
-        try:
-            response = requests.get(f"{SERVER_URL}/timetable", timeout=5)
-            if response.status_code == 200:
-                current_timetable = response.json()
-        except:
-            current_timetable = {}
-        
         # Create edit dialog
         edit_window = tk.Toplevel(self.root)
         edit_window.title("Edit Timetable")
@@ -281,9 +592,10 @@ class TeacherDashboard:
         edit_text = tk.Text(edit_window, height=20, width=40)
         edit_text.pack(padx=10, pady=10)
         
-        # Populate with current timetable
-        for time, subject in current_timetable.items():
-            edit_text.insert(tk.END, f"{time}={subject}\n")
+        # Populate with current timetable, one "day HH:MM-HH:MM=subject" per line;
+        # days may be ranges like mon-fri, and no day means every day
+        for period in self.timetable:
+            edit_text.insert(tk.END, f"{period['day']} {period['start']}-{period['end']}={period['subject']}\n")
         
         # Save button
         tk.Button(
@@ -301,20 +613,19 @@ class TeacherDashboard:
                 time, subject = line.split('=', 1)
                 timetable[time.strip()] = subject.strip()
         
-        try:
-            response = requests.post(
-                f"{SERVER_URL}/timetable",
-                json={"timetable": timetable},
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                messagebox.showinfo("Success", "Timetable updated successfully!")
-                window.destroy()
-            else:
-                messagebox.showerror("Error", "Failed to update timetable")
-        except requests.RequestException:
+        run_in_background(self.root, lambda: self.client.post(
+            "/timetable",
+            json={"timetable": timetable, "room": self.room}
+        ), lambda response, error: self.save_timetable_done(response, error, window))
+
+    def save_timetable_done(self, response, error, window):
+        if error:
             messagebox.showerror("Error", "Could not connect to server")
+        elif response.status_code == 200:
+            messagebox.showinfo("Success", "Timetable updated successfully!")
+            window.destroy()
+        else:
+            messagebox.showerror("Error", error_message(response, "Failed to update timetable"))
 
     def register_student(self):
         username = self.new_student_user.get()
@@ -324,14 +635,81 @@ class TeacherDashboard:
             messagebox.showwarning("Error", "Please enter both username and password")
             return
             
-        try:
-            # In a real system, we'd have proper student registration endpoint
-            # For this demo, we'll just show a success message
+        run_in_background(self.root, lambda: self.client.post(
+            "/register",
+            json={"username": username, "password": password, "type": "student"},
+            timeout=10
+        ), lambda response, error: self.register_student_done(response, error, username))
+
+    def register_student_done(self, response, error, username):
+        if error:
+            messagebox.showerror("Error", "Could not connect to server")
+        elif response.status_code == 201:
             messagebox.showinfo("Success", f"Student {username} registered!")
             self.new_student_user.delete(0, tk.END)
             self.new_student_pass.delete(0, tk.END)
-        except:
-            messagebox.showerror("Error", "Registration failed")
+        else:
+            messagebox.showerror("Error", error_message(response, 'Registration failed'))
+
+    def import_roster(self):
+        """Upload a roster CSV to /import_roster, streaming it from disk"""
+        path = filedialog.askopenfilename(filetypes=[("CSV", "*.csv"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError as error:
+            messagebox.showerror("Error", f"Could not read {path}: {error.strerror}")
+            return
+        self.import_button.config(state=tk.DISABLED)
+        self.import_errors.delete(1.0, tk.END)
+        self.show_import_progress(0, size)
+        
+        def body():
+            sent = 0
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(IMPORT_CHUNK_BYTES), b""):
+                    yield chunk
+                    sent += len(chunk)
+                    self.root.after(0, self.show_import_progress, sent, size)
+        
+        def work():
+            # Retrying would need the file read again from the start
+            response = self.client.post(
+                "/import_roster",
+                data=body(),
+                headers={"Content-Type": "text/csv"},
+                retries=0,
+                timeout=IMPORT_TIMEOUT
+            )
+            try:
+                return response.status_code, response.json()
+            except ValueError:
+                return response.status_code, {}
+        
+        run_in_background(self.root, work, self.import_roster_done)
+
+    def show_import_progress(self, sent, size):
+        self.import_progress["value"] = 100 * sent / size if size else 100
+        if sent < size:
+            self.import_label.config(text=f"Uploading: {sent // 1024} of {size // 1024} KB")
+        else:
+            self.import_label.config(text="Uploaded; creating accounts...")
+
+    def import_roster_done(self, result, error):
+        self.import_button.config(state=tk.NORMAL)
+        if error:
+            self.import_label.config(text="Import failed")
+            messagebox.showerror("Error", "Could not connect to server")
+            return
+        status_code, data = result
+        if status_code != 200:
+            self.import_label.config(text="Import failed")
+            messagebox.showerror("Error", data.get("error", "Import failed"))
+            return
+        self.import_label.config(text=f"Imported {data['imported']} accounts, rejected {data['rejected']} rows")
+        for failure in data["errors"]:
+            self.import_errors.insert(tk.END, f"Line {failure['line']} ({failure['username']}): {failure['error']}\n")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,84 @@
+import gzip
+import zlib
+import time
+import threading
+from collections import OrderedDict
+
+# Content encodings the cache can produce, in order of preference
+COMPRESSORS = {
+    'gzip': lambda body: gzip.compress(body, compresslevel=6),
+    'deflate': lambda body: zlib.compress(body, 6)
+}
+
+class ResponseCache:
+    """Encoded response bodies shared by every reader of the same state version.
+
+    Entries are keyed by what varies between responses (room, delta cursor,
+    content encoding) and remember the version they were built from; a
+    lookup with a newer version re-encodes, so writers invalidate entries
+    just by bumping the version. Concurrent misses on one key wait for a
+    single encoding instead of each doing their own.
+    """
+
+    def __init__(self, max_entries=1024, stripes=64):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (version, body), least recently used first
+        self.entries_lock = threading.Lock()
+        self.stripes = [threading.Lock() for _ in range(stripes)]
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+        self.encoded_bytes = 0
+
+    def lookup(self, key, version):
+        with self.entries_lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get(self, key, version, encode):
+        """Get the body for key at version, calling encode() only on a miss"""
+        body = self.lookup(key, version)
+        if body is not None:
+            return body
+
+        with self.stripes[hash(key) % len(self.stripes)]:
+            # Another reader may have encoded it while this one waited
+            body = self.lookup(key, version)
+            if body is not None:
+                return body
+            start = time.perf_counter()
+            body = encode()
+            elapsed = time.perf_counter() - start
+
+            with self.entries_lock:
+                self.entries[key] = (version, body)
+                self.entries.move_to_end(key)
+                if len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                self.misses += 1
+                self.encode_seconds += elapsed
+                self.encoded_bytes += len(body)
+        return body
+
+    def stats(self):
+        with self.entries_lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'encode_seconds': self.encode_seconds,
+                'encoded_bytes': self.encoded_bytes,
+                'entries': len(self.entries)
+            }
+
+def pick_encoding(accept_encoding):
+    """Choose a content encoding the client accepts, or None for identity"""
+    for encoding in COMPRESSORS:
+        if accept_encoding[encoding]:
+            return encoding
+    return None
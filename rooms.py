@@ -0,0 +1,134 @@
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from history import PresenceHistory
+from metrics import LOCK_WAIT_SECONDS
+from student_store import Status, StudentStore
+from timetable import Timetable, parse_periods
+
+DEFAULT_ROOM = 'default'
+EVENT_ID_LIMIT = 50000  # client event ids remembered per room for deduplicating replays
+
+class RoomSnapshot:
+    """Immutable view of a room as of one committed change"""
+    __slots__ = ('seq', 'students', 'last_ring', 'ring_students')
+
+    def __init__(self, seq, students, last_ring, ring_students):
+        self.seq = seq
+        self.students = students
+        self.last_ring = last_ring
+        self.ring_students = ring_students
+
+class Room:
+    """Attendance state of one classroom, independent of every other room.
+
+    seq is bumped on every change in the room and serves as its delta
+    cursor and ETag, so a busy room never invalidates another room's reads.
+
+    Writers change the room inside writing(), which serializes them on the
+    room's lock and publishes a fresh RoomSnapshot when they finish.
+    Readers only ever use the published snapshot, a single attribute read,
+    so they never take the lock or see a half-applied change.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.students = StudentStore()
+        self.history = PresenceHistory()
+        self.timetable = Timetable()
+        self.last_ring = None
+        self.ring_students = []
+        self.seq = 0
+        # Ids of the latest client events applied, oldest first, so a replayed
+        # event is recognized; bounded, as clients only replay recent ones
+        self.event_ids = OrderedDict()
+        self.ring_job = None
+        self.lock = threading.Lock()
+        self.publish()
+
+    @contextmanager
+    def writing(self):
+        """Hold the room's write lock and publish a snapshot on the way out"""
+        waiting = time.perf_counter()
+        with self.lock:
+            LOCK_WAIT_SECONDS.observe(time.perf_counter() - waiting)
+            try:
+                yield self
+            finally:
+                self.publish()
+
+    def publish(self):
+        """Replace the snapshot readers see; call with the lock held"""
+        self.snapshot = RoomSnapshot(
+            self.seq,
+            self.students.view(),
+            self.last_ring,
+            tuple(self.ring_students)
+        )
+
+    def next_seq(self):
+        """Advance the room's change sequence"""
+        self.seq += 1
+        return self.seq
+
+    def seen(self, event_id):
+        """Whether a client event with this id was already applied"""
+        return event_id in self.event_ids
+
+    def remember(self, event_id):
+        self.event_ids[event_id] = None
+        if len(self.event_ids) > EVENT_ID_LIMIT:
+            self.event_ids.popitem(last=False)
+
+    def apply(self, event):
+        """Apply a status, ring or timetable event to the room"""
+        if event['kind'] == 'status':
+            status = Status.parse(event['status'])
+            self.students.set(event['username'], status, event['last_update'], event['seq'], event.get('period'))
+            self.history.record(event['username'], status, event['last_update'])
+            if event.get('id'):
+                self.remember(event['id'])
+        elif event['kind'] == 'ring':
+            self.last_ring = event['last_ring']
+            self.ring_students = event['ring_students']
+            self.history.ring(self.ring_students, datetime.fromisoformat(self.last_ring).timestamp())
+        elif event['kind'] == 'timetable':
+            self.timetable = Timetable(parse_periods(event), event['version'])
+        self.seq = max(self.seq, event['seq'])
+
+    def capture(self):
+        """Build a JSON-ready snapshot of the room; call with the lock held"""
+        return {
+            'seq': self.seq,
+            # Kept in change order so delta reads keep working after a load
+            'students': [
+                [username, Status(record.status).label, record.last_update, record.seq, record.period]
+                for username, record in list(self.students.items())
+            ],
+            'last_ring': self.last_ring,
+            'ring_students': self.ring_students,
+            'history': self.history.capture(),
+            'event_ids': list(self.event_ids),
+            'timetable': {'version': self.timetable.version, 'periods': self.timetable.to_json()}
+        }
+
+    def restore(self, snapshot):
+        """Load the room from a snapshot made by capture()"""
+        # Rows from before periods were tagged have no period
+        for username, status, last_update, seq, *period in snapshot['students']:
+            self.students.set(username, Status.parse(status), last_update, seq, *period)
+        self.seq = snapshot['seq']
+        self.last_ring = snapshot['last_ring']
+        self.ring_students = snapshot['ring_students']
+        self.event_ids = OrderedDict.fromkeys(snapshot.get('event_ids', ()))
+        if 'timetable' in snapshot:
+            self.timetable = Timetable(parse_periods(snapshot['timetable']), snapshot['timetable']['version'])
+        if 'history' in snapshot:
+            self.history.restore(snapshot['history'])
+        else:
+            # Snapshot from before history was kept: start from who is present now
+            for username, status, last_update, *_ in snapshot['students']:
+                self.history.record(username, Status.parse(status), last_update)
+        self.publish()
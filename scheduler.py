@@ -0,0 +1,100 @@
+import heapq
+import time
+import itertools
+import threading
+import traceback
+from metrics import JOB_SECONDS
+
+def run_job(job):
+    """Run a due job, timing it and reporting any error"""
+    with JOB_SECONDS.time(job.callback.__name__):
+        try:
+            job.callback(*job.args)
+        except Exception:
+            traceback.print_exc()
+
+class Job:
+    """A callback scheduled to run once at a given time"""
+    __slots__ = ('when', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class Scheduler:
+    """Run timed jobs for any number of rooms from a single thread.
+
+    Jobs sit in a min-heap ordered by due time, so scheduling and picking
+    the next job are O(log n) and an idle scheduler sleeps until exactly
+    the next due time. Cancelled jobs are dropped when they surface.
+    Jobs should be short; anything slow delays every job behind it.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()  # Breaks ties between jobs due at the same time
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def __len__(self):
+        return len(self.heap)
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) after delay seconds; returns a cancellable Job"""
+        job = Job(time.time() + delay, callback, args)
+        with self.condition:
+            heapq.heappush(self.heap, (job.when, next(self.counter), job))
+            # Wake the runner if this job is now the earliest
+            if self.heap[0][2] is job:
+                self.condition.notify()
+        return job
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+                    delay = self.heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self.condition.wait(delay)
+                _, _, job = heapq.heappop(self.heap)
+
+            if not job.cancelled:
+                run_job(job)
+
+class AsyncScheduler:
+    """Scheduler with the same call_later() interface, run on an asyncio loop.
+
+    Jobs become loop timers instead of occupying a thread, and may be
+    scheduled from any thread. Jobs run on the loop, so they must not block.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def call_later(self, delay, callback, *args):
+        job = Job(time.time() + delay, callback, args)
+        self.loop.call_soon_threadsafe(self.arm, job)
+        return job
+
+    def arm(self, job):
+        self.loop.call_later(max(job.when - time.time(), 0), self.run_due, job)
+
+    def run_due(self, job):
+        if not job.cancelled:
+            run_job(job)
+
+    def start(self):
+        pass  # Jobs run as soon as the loop does
@@ -0,0 +1,77 @@
+"""Durable outbox of attendance events for the student client.
+
+Events that change a student's record ("attendance" and "left") are
+appended to a JSON-lines file before they are sent, and dropped from it
+only once the server has answered for them, so neither an outage nor a
+restart of the client loses them. Each carries an id, by which the server
+recognizes replays, and the time it happened on the client.
+"""
+import os
+import json
+
+# A student makes a few of these an hour, so this is days of outage; past
+# it the oldest go first
+MAX_SPOOLED_EVENTS = 5000
+
+class EventSpool:
+    """Pending events, oldest first, mirrored in memory and on disk.
+
+    Only the sender thread uses a spool, so it takes no lock.
+    """
+
+    def __init__(self, path, max_events=MAX_SPOOLED_EVENTS):
+        self.path = path
+        self.max_events = max_events
+        self.dropped = 0
+        self.events = []
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        try:
+            with open(path) as file:
+                for line in file:
+                    try:
+                        self.events.append(json.loads(line))
+                    except ValueError:
+                        pass  # A line torn by a crash mid-write
+        except FileNotFoundError:
+            pass
+        # Start from a clean file, so a torn line can't swallow the next append
+        self.file = None
+        self.rewrite()
+
+    def __len__(self):
+        return len(self.events)
+
+    def append(self, events):
+        """Write events to disk, with one fsync for the lot"""
+        if not events:
+            return
+        self.file.write(''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.events.extend(events)
+        if len(self.events) > self.max_events:
+            excess = len(self.events) - self.max_events
+            del self.events[:excess]
+            self.dropped += excess
+            self.rewrite()
+
+    def head(self, count):
+        """The oldest count events, to send next"""
+        return self.events[:count]
+
+    def ack(self, count):
+        """Forget the oldest count events, which the server has answered for"""
+        del self.events[:count]
+        self.rewrite()
+
+    def rewrite(self):
+        """Replace the file with the pending events"""
+        if self.file:
+            self.file.close()
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as file:
+            file.writelines(json.dumps(event, separators=(',', ':')) + '\n' for event in self.events)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, self.path)
+        self.file = open(self.path, 'a')
@@ -0,0 +1,189 @@
+import os
+import json
+import glob
+import time
+import threading
+
+WRITE_RETRY_DELAY = 1  # seconds between attempts to write the log after a failure
+
+class LogUnavailable(Exception):
+    """The log couldn't be written, so a change isn't durable (yet)"""
+
+class EventLog:
+    """Append-only, segmented event log with group commit and snapshots.
+
+    Events are JSON lines, each stamped with a log sequence number (lsn)
+    that orders it against snapshots. Appends only buffer in memory; a single writer
+    thread flushes everything buffered with one write and one fsync, so
+    concurrent requests waiting in commit() share the cost of each fsync.
+    If a write fails, say on a full disk, waiting commits raise
+    LogUnavailable and the writer retries in a fresh segment until it
+    succeeds.
+
+    compact() rotates to a new segment, saves a snapshot of the state and
+    deletes the segments the snapshot covers. On startup load() returns the
+    latest snapshot and only the events logged after it.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        os.makedirs(directory, exist_ok=True)
+
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()  # Held while a segment is written or swapped
+        self.buffer = []
+        self.appended = 0  # lsn of the last event handed to append()
+        self.durable = 0  # lsn of the last event known to be on disk
+        self.fsyncs = 0
+        self.error = None  # OSError of the last write, until one succeeds
+        self.segment = None
+        self.segment_number = 0
+        self.writer = None
+
+    def segments(self):
+        """List the log segment paths, oldest first"""
+        paths = glob.glob(os.path.join(self.directory, "events.*.log"))
+        return sorted(paths, key=lambda path: int(path.split(".")[-2]))
+
+    def load(self):
+        """Read the latest snapshot and the events logged after it"""
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as file:
+                snapshot = json.load(file)
+        since = snapshot['lsn'] if snapshot else 0
+
+        events = []
+        last = since
+        for path in self.segments():
+            with open(path, "r") as file:
+                for line in file:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        break  # Torn write at the tail of a crashed segment
+                    # A write retried after a failure repeats lsns the failed
+                    # segment may already hold
+                    if event['lsn'] > last:
+                        events.append(event)
+                        last = event['lsn']
+
+        # New events continue the sequence where the files left off
+        self.appended = self.durable = last
+        return snapshot, events
+
+    def start(self):
+        """Open a fresh segment and start the group commit writer"""
+        segments = self.segments()
+        if segments:
+            self.segment_number = int(segments[-1].split(".")[-2]) + 1
+        self.segment = self.open_segment(self.segment_number)
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def open_segment(self, number):
+        path = os.path.join(self.directory, f"events.{number}.log")
+        return open(path, "a", encoding="utf-8")
+
+    def append(self, event):
+        """Queue an event for the next group commit"""
+        with self.condition:
+            self.appended += 1
+            line = json.dumps(dict(event, lsn=self.appended), separators=(",", ":")) + "\n"
+            self.buffer.append(line)
+            self.condition.notify_all()
+
+    def commit(self):
+        """Block until every event appended so far is on disk.
+
+        Raises LogUnavailable if the log can't be written meanwhile.
+        """
+        with self.condition:
+            target = self.appended
+            while self.durable < target:
+                if self.error:
+                    raise LogUnavailable(str(self.error)) from self.error
+                self.condition.wait()
+
+    def write_loop(self):
+        while True:
+            with self.condition:
+                while not self.buffer:
+                    self.condition.wait()
+
+            with self.write_lock:
+                with self.condition:
+                    lines = self.buffer
+                    self.buffer = []
+                    target = self.appended
+
+                try:
+                    if self.segment is None:
+                        self.segment_number += 1
+                        self.segment = self.open_segment(self.segment_number)
+                    # Everything that piles up during the fsync goes out in the next round
+                    self.segment.write("".join(lines))
+                    self.segment.flush()
+                    os.fsync(self.segment.fileno())
+                    error = None
+                except OSError as exception:
+                    error = exception
+                    self.abandon_segment()
+
+            with self.condition:
+                if error:
+                    # Put the lines back for the next attempt
+                    self.buffer[:0] = lines
+                    self.error = error
+                else:
+                    self.durable = target
+                    self.error = None
+                    self.fsyncs += 1
+                self.condition.notify_all()
+            if error:
+                time.sleep(WRITE_RETRY_DELAY)
+
+    def abandon_segment(self):
+        """Close a segment a write failed on; the retry goes to a new one,
+        so it never lands after a half-written line. Call with write_lock held."""
+        try:
+            self.segment.close()
+        except OSError:
+            pass
+        self.segment = None
+
+    def rotate(self):
+        """Switch appends to a new segment; returns the closed segment paths"""
+        with self.write_lock:
+            closed = self.segments()
+            if self.segment is not None:
+                self.segment.close()
+            self.segment_number += 1
+            self.segment = self.open_segment(self.segment_number)
+        return closed
+
+    def compact(self, capture):
+        """Snapshot capture() and drop the log segments it supersedes.
+
+        capture is called after rotation, so every event in the closed
+        segments is already reflected in the snapshot it returns. Events
+        are applied before they are appended, so one logged after the
+        recorded lsn may also be in the snapshot; capture() should record
+        how far each part of it got, so load can skip what it already holds.
+        """
+        closed = self.rotate()
+        with self.condition:
+            lsn = self.appended
+        snapshot = capture()
+        snapshot['lsn'] = lsn
+
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(snapshot, file, separators=(",", ":"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        for path in closed:
+            os.remove(path)
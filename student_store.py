@@ -0,0 +1,349 @@
+import heapq
+import random
+from array import array
+from enum import IntEnum
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from itertools import chain, islice, takewhile
+
+SORTED_BLOCK_SIZE = 512  # keys per block of a SortedIndex; blocks split at twice this
+
+class Status(IntEnum):
+    """Attendance status, stored as a small int and sent as its lowercase name"""
+    ABSENT = 0
+    PRESENT = 1
+    LEFT = 2
+
+    @classmethod
+    def parse(cls, name):
+        """Get the status for a client-supplied name, or None if unknown"""
+        try:
+            return cls[str(name).upper()]
+        except KeyError:
+            return None
+
+    @property
+    def label(self):
+        return self.name.lower()
+
+# Labels by status value, for encoding records without building a Status each time
+STATUS_LABELS = tuple(status.label for status in Status)
+
+class StudentRecord:
+    """One student's latest status.
+
+    Records are never mutated once stored; an update replaces the record,
+    so a reference handed out earlier keeps describing the same moment.
+    """
+    __slots__ = ('status', 'last_update', 'seq', 'period')
+
+    def __init__(self, status, last_update, seq, period=None):
+        self.status = status
+        self.last_update = last_update  # Epoch seconds
+        self.seq = seq
+        self.period = period  # Timetable period the change happened in, if any
+
+    def to_json(self):
+        return {
+            'status': STATUS_LABELS[self.status],
+            'last_update': datetime.fromtimestamp(self.last_update).isoformat(),
+            'period': self.period
+        }
+
+class PresentIndex:
+    """Set of present students with O(1) updates and O(k) random sampling.
+
+    Members live in a list with a username -> position map. Removal swaps
+    the last member into the freed slot, so the list never has holes and
+    sampling can pick uniformly from it directly.
+    """
+
+    def __init__(self):
+        self.members = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, username):
+        return username in self.positions
+
+    def add(self, username):
+        if username not in self.positions:
+            self.positions[username] = len(self.members)
+            self.members.append(username)
+
+    def discard(self, username):
+        position = self.positions.pop(username, None)
+        if position is None:
+            return
+        last = self.members.pop()
+        if position < len(self.members):
+            self.members[position] = last
+            self.positions[last] = position
+
+    def sample(self, k):
+        """Pick up to k distinct present students uniformly at random"""
+        return random.sample(self.members, min(k, len(self.members)))
+
+class SortedIndex:
+    """Keys kept sorted in blocks, read in order from any key.
+
+    A binary search over the blocks' largest keys finds the block a key
+    belongs in, so adding or removing one only shifts that block: O(log n
+    + SORTED_BLOCK_SIZE) however large the index grows, where one flat
+    sorted list would shift half of itself. Reading k keys from a starting
+    point costs O(log n + k).
+    """
+
+    def __init__(self, keys=()):
+        """keys, if given, must already be sorted"""
+        self.blocks = [keys[start:start + SORTED_BLOCK_SIZE] for start in range(0, len(keys), SORTED_BLOCK_SIZE)]
+        self.maxes = [block[-1] for block in self.blocks]  # Largest key of each block
+        self.size = len(keys)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, key):
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            self.size = 1
+            return
+        index = bisect_left(self.maxes, key)
+        if index == len(self.maxes):
+            index -= 1
+            block = self.blocks[index]
+            block.append(key)
+            self.maxes[index] = key
+        else:
+            block = self.blocks[index]
+            insort(block, key)
+        self.size += 1
+        if len(block) > 2 * SORTED_BLOCK_SIZE:
+            self.blocks[index:index + 1] = [block[:SORTED_BLOCK_SIZE], block[SORTED_BLOCK_SIZE:]]
+            self.maxes[index:index + 1] = [block[SORTED_BLOCK_SIZE - 1], block[-1]]
+
+    def discard(self, key):
+        index = bisect_left(self.maxes, key)
+        if index == len(self.maxes):
+            return
+        block = self.blocks[index]
+        position = bisect_left(block, key)
+        if position == len(block) or block[position] != key:
+            return
+        del block[position]
+        self.size -= 1
+        if not block:
+            del self.blocks[index]
+            del self.maxes[index]
+        elif position == len(block):
+            self.maxes[index] = block[-1]
+
+    def rank(self, key):
+        """Number of keys below key"""
+        index = bisect_left(self.maxes, key)
+        below = sum(len(block) for block in self.blocks[:index])
+        if index < len(self.blocks):
+            below += bisect_left(self.blocks[index], key)
+        return below
+
+    def count_between(self, low, high):
+        """Number of keys k with low <= k < high"""
+        return self.rank(high) - self.rank(low)
+
+    def ascending(self, start=None, inclusive=True):
+        """Keys from start upwards"""
+        if start is None:
+            return chain.from_iterable(self.blocks)
+        find = bisect_left if inclusive else bisect_right
+        index = find(self.maxes, start)
+        if index == len(self.blocks):
+            return iter(())
+        first = self.blocks[index]
+        return chain(islice(first, find(first, start), None),
+                     chain.from_iterable(islice(self.blocks, index + 1, None)))
+
+class ChangeIndex:
+    """Students with one status as (seq, username), in the order they changed.
+
+    Seqs only grow, so a change is an append. The entry it supersedes is
+    left where it is and skipped when read; StudentStore rebuilds its
+    change indexes once such stale entries outnumber the students.
+    """
+
+    def __init__(self, status):
+        self.status = status
+        self.seqs = array('q')
+        self.usernames = []
+
+    def __len__(self):
+        return len(self.usernames)
+
+    def add(self, seq, username):
+        self.seqs.append(seq)
+        self.usernames.append(username)
+
+    def is_live(self, records, username, seq):
+        record = records.get(username)
+        return record is not None and record.seq == seq and record.status == self.status
+
+    def descending(self, records, before=None):
+        """Current (seq, username) pairs below before, largest first.
+
+        records are the store's, against which stale entries are told
+        apart. Changes sharing a seq, as in one batch, are ordered by
+        username.
+        """
+        end = len(self.seqs) if before is None else bisect_right(self.seqs, before[0])
+        while end:
+            seq = self.seqs[end - 1]
+            start = bisect_left(self.seqs, seq, 0, end)
+            for username in sorted({
+                username for username in self.usernames[start:end] if self.is_live(records, username, seq)
+            }, reverse=True):
+                if before is None or (seq, username) < before:
+                    yield seq, username
+            end = start
+
+class StudentView:
+    """Read-only access to student records in the order they last changed.
+
+    Changed students always form a suffix, so the students changed after a
+    given seq can be read from the newest end without a full scan.
+    """
+
+    def __init__(self, records):
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, username):
+        return username in self.records
+
+    def get(self, username):
+        return self.records.get(username)
+
+    def items(self):
+        return self.records.items()
+
+    def changed_since(self, since):
+        """Yield (username, record) for changes after a seq, newest first"""
+        for username in reversed(self.records):
+            record = self.records[username]
+            if record.seq <= since:
+                break
+            yield username, record
+
+    def to_json(self, since=None):
+        """Encode every record, or only those changed after since, for JSON"""
+        items = self.records.items() if since is None else self.changed_since(since)
+        return {username: record.to_json() for username, record in items}
+
+# Appended to a prefix, sorts after every username starting with it
+PREFIX_END = '\U0010ffff'
+
+class StudentStore(StudentView):
+    """Latest record per student, with an index of who is present.
+
+    Updating a student moves it to the newest end of the records. Each
+    status also keeps its students sorted by name and in the order they
+    changed, so roster queries read a page straight off the indexes
+    instead of scanning every student.
+
+    Updates are the hot path and roster queries occasional, so a status
+    change only notes the student; the name indexes catch up on the next
+    query, and a student who flaps back and forth in between costs them
+    nothing.
+    """
+
+    def __init__(self):
+        super().__init__({})
+        self.present = PresentIndex()
+        self.by_name = {status: SortedIndex() for status in Status}
+        self.unfiled = {}  # username -> status it's filed under in by_name, None if new
+        self.by_update = {status: ChangeIndex(status) for status in Status}
+        self.change_entries = 0  # Across the change indexes, stale ones included
+
+    def set(self, username, status, last_update, seq, period=None):
+        """Store a new record for a student and move it to the newest end"""
+        records = self.records
+        old = records.pop(username, None)
+        records[username] = StudentRecord(status, last_update, seq, period)
+        # Only a change of status moves a student between name and present indexes
+        if old is None or old.status != status:
+            if username not in self.unfiled:
+                self.unfiled[username] = None if old is None else old.status
+            if status == Status.PRESENT:
+                self.present.add(username)
+            elif old is not None and old.status == Status.PRESENT:
+                self.present.discard(username)
+        self.by_update[status].add(seq, username)
+        self.change_entries += 1
+        if self.change_entries > 2 * len(records) + SORTED_BLOCK_SIZE:
+            self.rebuild_change_indexes()
+
+    def rebuild_change_indexes(self):
+        """Drop stale change entries; the records are already in change order"""
+        self.by_update = {status: ChangeIndex(status) for status in Status}
+        for username, record in self.records.items():
+            self.by_update[record.status].add(record.seq, username)
+        self.change_entries = len(self.records)
+
+    def file_names(self):
+        """Bring the name indexes up to date with the status changes since the last query"""
+        if len(self.unfiled) * 8 > len(self.records):
+            # Sorting everyone beats inserting this many one at a time
+            names = {status: [] for status in Status}
+            for username in sorted(self.records):
+                names[self.records[username].status].append(username)
+            self.by_name = {status: SortedIndex(names[status]) for status in Status}
+        else:
+            for username, filed in self.unfiled.items():
+                status = self.records[username].status
+                if status != filed:
+                    if filed is not None:
+                        self.by_name[filed].discard(username)
+                    self.by_name[status].add(username)
+        self.unfiled.clear()
+
+    def count(self, statuses, prefix=''):
+        """Number of students with one of the statuses and a name starting with prefix"""
+        self.file_names()
+        if not prefix:
+            return sum(len(self.by_name[status]) for status in statuses)
+        return sum(self.by_name[status].count_between(prefix, prefix + PREFIX_END) for status in statuses)
+
+    def query(self, statuses, prefix='', sort='name', after=None, limit=100):
+        """Get a page of students as ([(username, record)], more).
+
+        sort 'name' pages A to Z, continuing after the username after;
+        'updated' pages newest change first, continuing after the
+        (seq, username) pair after. A name sort costs O(log n + limit);
+        an update sort also skips stale change entries, and with a prefix,
+        non-matching students.
+        """
+        if sort == 'name':
+            self.file_names()
+            if after is not None and after >= prefix:
+                streams = [self.by_name[status].ascending(after, inclusive=False) for status in statuses]
+            else:
+                streams = [self.by_name[status].ascending(prefix) for status in statuses]
+            usernames = takewhile(lambda username: username.startswith(prefix), heapq.merge(*streams))
+        else:
+            streams = [self.by_update[status].descending(self.records, after) for status in statuses]
+            usernames = (
+                username for _, username in heapq.merge(*streams, reverse=True)
+                if username.startswith(prefix)
+            )
+        page = [(username, self.records[username]) for username in islice(usernames, limit + 1)]
+        return page[:limit], len(page) > limit
+
+    def view(self):
+        """Copy the records into a view later updates won't touch.
+
+        Records are replaced rather than mutated, so a shallow copy is enough.
+        """
+        return StudentView(dict(self.records))
@@ -0,0 +1,125 @@
+import json
+from bisect import bisect_right
+from datetime import datetime
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+def parse_clock(value):
+    """Seconds into the day for "HH:MM"; raises ValueError"""
+    try:
+        clock = datetime.strptime(value.strip(), '%H:%M')
+    except ValueError:
+        raise ValueError(f"Invalid time {value!r}, expected HH:MM") from None
+    return clock.hour * 3600 + clock.minute * 60
+
+def format_clock(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+def parse_days(value):
+    """Weekday numbers for "mon", "mon,wed" or "mon-fri"; raises ValueError"""
+    days = []
+    for part in value.lower().split(','):
+        names = [name.strip()[:3] for name in part.split('-', 1)]
+        if not all(name in WEEKDAYS for name in names):
+            raise ValueError(f"Invalid day {part.strip()!r}")
+        first, last = WEEKDAYS.index(names[0]), WEEKDAYS.index(names[-1])
+        if last < first:
+            raise ValueError(f"Day range {part} runs backwards")
+        days.extend(range(first, last + 1))
+    return days
+
+class Period:
+    """One timetable slot on one weekday; start and end are seconds into the day"""
+    __slots__ = ('weekday', 'start', 'end', 'subject')
+
+    def __init__(self, weekday, start, end, subject):
+        self.weekday = weekday
+        self.start = start
+        self.end = end
+        self.subject = subject
+
+    @property
+    def label(self):
+        """How attendance events name the period they happened in"""
+        return f"{self.subject} {format_clock(self.start)}-{format_clock(self.end)}"
+
+    def to_json(self):
+        return {
+            'day': WEEKDAYS[self.weekday],
+            'start': format_clock(self.start),
+            'end': format_clock(self.end),
+            'subject': self.subject
+        }
+
+class Timetable:
+    """A room's weekly timetable, indexed for "which period is on now".
+
+    Periods are kept per weekday sorted by start, with their starts in a
+    parallel list, and never overlap; the active period is the last one
+    starting at or before the time of day, if it hasn't ended yet, found
+    with one binary search. Timetables are never changed in place: an
+    edit builds a new one with the next version, so the encoded body can
+    be built once and handed to every reader.
+    """
+
+    def __init__(self, periods=(), version=0):
+        self.version = version
+        self.days = [[] for _ in WEEKDAYS]
+        for period in sorted(periods, key=lambda period: (period.weekday, period.start)):
+            day = self.days[period.weekday]
+            if day and day[-1].end > period.start:
+                raise ValueError(
+                    f"{WEEKDAYS[period.weekday]} {day[-1].label} overlaps {period.label}")
+            day.append(period)
+        self.starts = [[period.start for period in day] for day in self.days]
+        self.body = json.dumps({
+            'version': version,
+            'periods': [period.to_json() for day in self.days for period in day]
+        }, separators=(',', ':')).encode()
+
+    def __len__(self):
+        return sum(len(day) for day in self.days)
+
+    def active(self, when):
+        """Get the period in progress at epoch time when, or None"""
+        moment = datetime.fromtimestamp(when)
+        weekday = moment.weekday()
+        seconds = moment.hour * 3600 + moment.minute * 60 + moment.second
+        index = bisect_right(self.starts[weekday], seconds) - 1
+        if index >= 0 and seconds < self.days[weekday][index].end:
+            return self.days[weekday][index]
+        return None
+
+    def to_json(self):
+        return [period.to_json() for day in self.days for period in day]
+
+def parse_periods(data):
+    """Build periods from a POST /timetable body; raises ValueError.
+
+    Takes typed periods, {"periods": [{"day", "start", "end", "subject"}]},
+    or the dashboard's flat map, {"timetable": {"mon-fri 09:00-09:50": subject}},
+    where a key without days applies to every day.
+    """
+    if isinstance(data.get('periods'), list):
+        entries = [
+            (entry.get('day') or 'mon-sun', entry.get('start'), entry.get('end'), entry.get('subject'))
+            for entry in data['periods'] if isinstance(entry, dict)
+        ]
+    elif isinstance(data.get('timetable'), dict):
+        entries = []
+        for key, subject in data['timetable'].items():
+            days, _, times = key.strip().rpartition(' ')
+            start, _, end = times.partition('-')
+            entries.append((days or 'mon-sun', start, end, subject))
+    else:
+        raise ValueError("Missing periods")
+
+    periods = []
+    for days, start, end, subject in entries:
+        if not all(isinstance(value, str) for value in (days, start, end, subject)) or not subject.strip():
+            raise ValueError("Periods need a day, start, end and subject")
+        start, end = parse_clock(start), parse_clock(end)
+        if end <= start:
+            raise ValueError(f"Period {subject} ends before it starts")
+        periods.extend(Period(day, start, end, subject.strip()) for day in parse_days(days))
+    return periods
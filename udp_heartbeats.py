@@ -0,0 +1,141 @@
+import time
+import socket
+import struct
+import secrets
+import threading
+import traceback
+
+TOKEN_BYTES = 16
+# Heartbeat datagram: magic, version, session token, sequence number (23 bytes)
+BEAT = struct.Struct(f'!2sB{TOKEN_BYTES}sI')
+# Reply: magic, version, result, sequence number being answered (8 bytes)
+ACK = struct.Struct('!2sBBI')
+MAGIC = b'AH'
+VERSION = 1
+
+ACK_OK = 0
+ACK_UNKNOWN_SESSION = 1  # Server restarted or the session was replaced; open a new one
+ACK_STALE = 2  # Sequence number not newer than one already seen
+
+class HeartbeatSessions:
+    """Session tokens that let a client heartbeat with a single datagram.
+
+    A token is issued over HTTP and stands for one (room, client type,
+    username) key, so a datagram carries no names and needs no parsing
+    beyond a fixed struct. Each client holds one token at a time; opening
+    a new session revokes the old one. Sequence numbers must increase per
+    session, so a replayed or reordered datagram can't refresh presence.
+    Replies are smaller than requests, so the listener can't be used to
+    amplify traffic.
+
+    A token also lapses with the login session it was opened under, and
+    is closed when its client's heartbeat expires, so only live clients
+    hold one.
+    """
+
+    def __init__(self):
+        self.sessions = {}  # token -> [client key, last sequence number, login session or None]
+        self.tokens = {}  # client key -> token
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def open(self, key, login=None):
+        """Issue a fresh token for a client key, revoking its previous one"""
+        token = secrets.token_bytes(TOKEN_BYTES)
+        with self.lock:
+            self.sessions.pop(self.tokens.get(key), None)
+            self.tokens[key] = token
+            self.sessions[token] = [key, 0, login]
+        return token
+
+    def close(self, key):
+        """Revoke a client key's token, if it has one"""
+        with self.lock:
+            self.sessions.pop(self.tokens.pop(key, None), None)
+
+    def purge(self, now=None):
+        """Revoke the tokens whose login session has expired"""
+        if now is None:
+            now = time.time()
+        with self.lock:
+            for token, (key, _, login) in list(self.sessions.items()):
+                if login is not None and login.expires <= now:
+                    del self.sessions[token]
+                    del self.tokens[key]
+
+    def handle(self, datagram):
+        """Check a heartbeat datagram.
+
+        Returns (result, client key, reply); the key is None unless the
+        heartbeat should count, and the reply is None for datagrams that
+        aren't heartbeats at all.
+        """
+        if len(datagram) != BEAT.size:
+            return 'malformed', None, None
+        magic, version, token, seq = BEAT.unpack(datagram)
+        if magic != MAGIC or version != VERSION:
+            return 'malformed', None, None
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is not None and session[2] is not None and session[2].expires <= time.time():
+                # The login ran out; the client has to log in again for a new token
+                del self.sessions[token]
+                del self.tokens[session[0]]
+                session = None
+            if session is None:
+                return 'unknown', None, ACK.pack(MAGIC, VERSION, ACK_UNKNOWN_SESSION, seq)
+            if seq <= session[1]:
+                return 'stale', None, ACK.pack(MAGIC, VERSION, ACK_STALE, seq)
+            session[1] = seq
+            key = session[0]
+        return 'ok', key, ACK.pack(MAGIC, VERSION, ACK_OK, seq)
+
+class HeartbeatListener:
+    """Thread that answers heartbeat datagrams next to the Flask app"""
+
+    def __init__(self, sessions, on_datagram, host, port):
+        self.sessions = sessions
+        self.on_datagram = on_datagram
+        self.address = (host, port)
+        self.sock = None
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(self.address)
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            try:
+                datagram, address = self.sock.recvfrom(64)
+                result, key, reply = self.sessions.handle(datagram)
+                self.on_datagram(result, key)
+                if reply:
+                    self.sock.sendto(reply, address)
+            except Exception:
+                traceback.print_exc()
+
+class HeartbeatProtocol:
+    """The same listener as an asyncio datagram protocol, for the ASGI app"""
+
+    def __init__(self, sessions, on_datagram):
+        self.sessions = sessions
+        self.on_datagram = on_datagram
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, datagram, address):
+        result, key, reply = self.sessions.handle(datagram)
+        self.on_datagram(result, key)
+        if reply:
+            self.transport.sendto(reply, address)
+
+    def error_received(self, error):
+        pass  # ICMP errors from clients that went away
+
+    def connection_lost(self, error):
+        pass
@@ -0,0 +1,175 @@
+"""WiFi state for the student client, watched from one background thread.
+
+Callers read the cached connected/ssid attributes, which cost nothing, or
+register a listener that is called when they change, instead of running
+iwgetid or netsh themselves.
+
+On Linux the link state of wireless interfaces comes from sysfs, and a
+netlink socket subscribed to link changes wakes the monitor as soon as one
+goes up or down; iwgetid is only run to learn the SSID after a change.
+Elsewhere, netsh (Windows) is polled from the monitor thread, and other
+systems always count as connected.
+"""
+import os
+import socket
+import struct
+import platform
+import threading
+import subprocess
+
+SYS_NET = "/sys/class/net"
+RTMGRP_LINK = 1  # netlink multicast group for link up/down notifications
+NLMSG_HEADER = struct.Struct("=IHHII")  # length, type, flags, seq, pid
+IFINFO = struct.Struct("=BxHiII")  # family, device type, interface index, flags, change mask
+LINK_POLL_INTERVAL = 5  # seconds between sysfs reads when no netlink event arrives
+SUBPROCESS_POLL_INTERVAL = 5  # seconds between netsh/iwgetid runs where nothing cheaper exists
+
+def wireless_interfaces():
+    """Names of wireless interfaces, from sysfs; None if sysfs isn't there"""
+    if not os.path.isdir(SYS_NET):
+        return None
+    return sorted(
+        name for name in os.listdir(SYS_NET)
+        if os.path.isdir(os.path.join(SYS_NET, name, "wireless"))
+        or os.path.isdir(os.path.join(SYS_NET, name, "phy80211"))
+    )
+
+def link_state():
+    """Wireless interfaces that are up, as a tuple; None without sysfs.
+
+    A WiFi interface is "up" only once associated ("dormant" before).
+    """
+    names = wireless_interfaces()
+    if names is None:
+        return None
+    up = []
+    for name in names:
+        try:
+            with open(os.path.join(SYS_NET, name, "operstate")) as file:
+                if file.read().strip() == "up":
+                    up.append(name)
+        except OSError:
+            pass
+    return tuple(up)
+
+def interface_index(name):
+    try:
+        with open(os.path.join(SYS_NET, name, "ifindex")) as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return None
+
+def changed_interfaces(data):
+    """Interface indexes named by the link messages in one netlink read"""
+    indexes = set()
+    offset = 0
+    while offset + NLMSG_HEADER.size + IFINFO.size <= len(data):
+        length = NLMSG_HEADER.unpack_from(data, offset)[0]
+        indexes.add(IFINFO.unpack_from(data, offset + NLMSG_HEADER.size)[2])
+        if length < NLMSG_HEADER.size:
+            break
+        offset += (length + 3) & ~3
+    return indexes
+
+class WifiMonitor:
+    """Owns the client's view of the WiFi connection.
+
+    connected and ssid are only written by the monitor thread; listeners
+    are called there too, with (connected, ssid), on the first reading and
+    whenever either changes.
+    spawns counts subprocesses started, for measuring.
+    """
+
+    def __init__(self):
+        self.connected = False
+        self.ssid = None
+        self.spawns = 0
+        self.listeners = []
+        self.system = platform.system()
+        self.ready = threading.Event()  # Set once the first reading is in
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def update(self, connected, ssid):
+        changed = not self.ready.is_set() or (connected, ssid) != (self.connected, self.ssid)
+        self.connected, self.ssid = connected, ssid
+        self.ready.set()
+        if changed:
+            for callback in list(self.listeners):
+                callback(connected, ssid)
+
+    def run(self):
+        if self.system == "Linux" and link_state() is not None:
+            self.watch_links()
+        elif self.system in ("Linux", "Windows"):
+            while True:
+                self.update(*self.query_subprocess())
+                threading.Event().wait(SUBPROCESS_POLL_INTERVAL)
+        else:
+            self.update(True, None)
+
+    def watch_links(self):
+        """Re-read sysfs on every netlink link event, or every LINK_POLL_INTERVAL"""
+        events = None
+        try:
+            events = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            events.bind((0, RTMGRP_LINK))
+            events.settimeout(LINK_POLL_INTERVAL)
+        except (OSError, AttributeError):
+            events = None  # No netlink; sysfs alone, polled
+
+        state = None
+        while True:
+            woken = False
+            if events is not None and state is not None:
+                try:
+                    # Links come and go on other interfaces too (wired, VPN, containers)
+                    indexes = changed_interfaces(events.recv(65536))
+                    woken = any(interface_index(name) in indexes for name in wireless_interfaces())
+                except socket.timeout:
+                    pass
+                except OSError:
+                    events = None
+            elif state is not None:
+                threading.Event().wait(LINK_POLL_INTERVAL)
+
+            current = link_state() or ()
+            # The SSID can only change along with a link event, so that's
+            # the only time it's worth a subprocess
+            if current != state or (woken and current):
+                state = current
+                self.update(bool(current), self.read_ssid(current) if current else None)
+
+    def read_ssid(self, interfaces):
+        """SSID of the connection, or the interface name if iwgetid can't tell"""
+        try:
+            self.spawns += 1
+            result = subprocess.run(["iwgetid", "-r"], capture_output=True, text=True, timeout=5)
+            return result.stdout.strip() or interfaces[0]
+        except (OSError, subprocess.SubprocessError):
+            return interfaces[0]
+
+    def query_subprocess(self):
+        """(connected, ssid) from netsh or iwgetid, for systems without sysfs"""
+        self.spawns += 1
+        try:
+            if self.system == "Windows":
+                result = subprocess.run(
+                    ["netsh", "wlan", "show", "interfaces"],
+                    capture_output=True, text=True, timeout=5,
+                    creationflags=subprocess.CREATE_NO_WINDOW
+                )
+                for line in result.stdout.splitlines():
+                    if "SSID" in line and "BSSID" not in line:
+                        return True, line.split(":", 1)[1].strip()
+                return False, None
+            result = subprocess.run(["iwgetid", "-r"], capture_output=True, text=True, timeout=5)
+            ssid = result.stdout.strip()
+            return bool(ssid), ssid or None
+        except (OSError, subprocess.SubprocessError):
+            return False, None